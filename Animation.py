@@ -0,0 +1,55 @@
+from array import array
+
+class Animation():
+    def __init__(self, name, render, interval, params=None, key=None, period=None, cache=None, blendable=True):
+        self.name = name
+        # render(frame, buffer) draws frame number `frame` into a FrameBuffer
+        self.render = render
+        # Milliseconds between frames
+        self.interval = interval
+        # The request parameters the animation was started with
+        self.params = params if params is not None else {}
+        # Whether render draws whole frames that can be crossfaded. Fades only change the brightness, so they can't be
+        self.blendable = blendable
+
+        # Periodic animations give a cache key and their period in frames, so their first cycle can be recorded
+        self.key = key
+        self.period = period
+        self.cache = cache
+        self.cache_key = None
+        self.cycle = None
+        self.recording = None
+
+    """
+    Get ready to draw into the given buffer, replaying a cached cycle if one has already been recorded
+    """
+    def begin(self, buffer):
+        self.cycle = None
+        self.recording = None
+        if self.key is None or self.cache is None:
+            return
+        self.cache_key = self.key + (len(buffer),)
+        self.cycle = self.cache.get(self.cache_key)
+        if self.cycle is None and self.cache.fits(self.period * len(buffer) * buffer.pixels.itemsize):
+            self.recording = array('I')
+
+    """
+    Draw one frame into the buffer, from the cached cycle when there is one
+    """
+    def draw(self, frame, buffer):
+        if self.cycle is not None:
+            num_leds = len(buffer)
+            start = (frame % self.period) * num_leds
+            buffer.load(self.cycle[start:start + num_leds])
+            return
+
+        self.render(frame, buffer)
+        if self.recording is not None:
+            # Frames can be skipped by the scheduler, so only a gapless first cycle is recorded
+            if len(self.recording) != (frame % self.period) * len(buffer):
+                self.recording = None
+                return
+            self.recording.extend(buffer.pixels)
+            if len(self.recording) == self.period * len(buffer):
+                self.cache.put(self.cache_key, self.recording)
+                self.cycle, self.recording = self.recording, None
@@ -0,0 +1,60 @@
+from array import array
+
+class FrameBuffer():
+    def __init__(self, size):
+        self.size = size
+
+        # One packed 24-bit color (0x00RRGGBB) per LED, stored contiguously
+        self.pixels = array('I', [0]) * size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, pos):
+        return self.pixels[pos]
+
+    """
+    Set a single pixel, or a slice of pixels from any sequence of packed colors.
+    Slices are clamped to the buffer so the strip length never changes. A memoryview of packed colors (such as a
+    shared memory block) is copied in directly, without converting it to an array first.
+    """
+    def __setitem__(self, pos, value):
+        if isinstance(pos, slice):
+            start, stop, step = pos.indices(self.size)
+            if isinstance(value, memoryview) and step == 1:
+                count = min(stop - start, len(value))
+                if count > 0:
+                    with memoryview(self.pixels) as pixels:
+                        pixels[start:start + count] = value[:count]
+                return
+            if not isinstance(value, array):
+                value = array('I', value)
+            if step != 1:
+                self.pixels[start:stop:step] = value
+                return
+            count = min(stop - start, len(value))
+            if count > 0:
+                self.pixels[start:start + count] = value[:count]
+        else:
+            self.pixels[pos] = value
+
+    """
+    Set every pixel in the buffer to a single packed color
+    """
+    def fill(self, color, start=0, end=None):
+        if end is None or end > self.size:
+            end = self.size
+        if end > start:
+            self.pixels[start:end] = array('I', [color]) * (end - start)
+
+    """
+    Replace the whole buffer with a full frame of packed colors
+    """
+    def load(self, frame):
+        self[:] = frame
+
+    """
+    Return a copy of the current frame that won't change as the buffer is rendered into
+    """
+    def copy(self):
+        return array('I', self.pixels)
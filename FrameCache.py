@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+class FrameCache():
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        # Least recently used cycles are kept at the front
+        self._cycles = OrderedDict()
+        self._lock = threading.Lock()
+
+    """
+    Get the recorded frames of one animation cycle, or None if that cycle isn't cached
+    """
+    def get(self, key):
+        with self._lock:
+            cycle = self._cycles.get(key)
+            if cycle is None:
+                self.misses += 1
+                return None
+            self._cycles.move_to_end(key)
+            self.hits += 1
+            return cycle
+
+    """
+    Store the frames of one animation cycle as one flat array('I'), evicting older cycles to stay under the memory cap
+    """
+    def put(self, key, cycle):
+        nbytes = cycle.itemsize * len(cycle)
+        if nbytes > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._cycles:
+                old = self._cycles.pop(key)
+                self.size -= old.itemsize * len(old)
+            self._cycles[key] = cycle
+            self.size += nbytes
+            self.__evict()
+        return True
+
+    """
+    Check whether a cycle of the given size could be cached at all
+    """
+    def fits(self, nbytes):
+        return nbytes <= self.max_bytes
+
+    """
+    Change the memory cap, evicting cycles if the cache is now over it
+    """
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.__evict()
+
+    def clear(self):
+        with self._lock:
+            self._cycles.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._cycles)
+
+    def __evict(self):
+        while self.size > self.max_bytes and self._cycles:
+            _, cycle = self._cycles.popitem(last=False)
+            self.size -= cycle.itemsize * len(cycle)
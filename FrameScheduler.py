@@ -0,0 +1,111 @@
+import time
+
+class FrameScheduler():
+    def __init__(self):
+        self.reset(0)
+
+    """
+    Start timing a new animation that should draw a frame every interval milliseconds.
+    The first frame is due at start (a time.monotonic() value), or straight away if no start is given
+    """
+    def reset(self, interval, start=None):
+        self.interval = interval
+        self.period = interval / 1000.0
+        self.requested_fps = 1.0 / self.period if self.period > 0 else None
+
+        self.frame = 0
+        self.start = start if start is not None else time.monotonic()
+        self.deadline = self.start
+
+        self.frames = 0
+        self.late = 0
+        self.dropped = 0
+        self.achieved_fps = 0.0
+        self._window_start = self.start
+        self._window_frames = 0
+
+    """
+    The frame that should be drawn now. Frames whose deadlines have already passed are skipped, so the animation
+    stays on time instead of slowing down when drawing can't keep up
+    """
+    def next_frame(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self.period > 0:
+            behind = (now - self.deadline) / self.period
+            if behind >= 1:
+                skipped = int(behind)
+                self.frame += skipped
+                self.dropped += skipped
+                self.deadline = self.start + self.frame * self.period
+            elif behind >= 0.5:
+                self.late += 1
+        return self.frame
+
+    """
+    Record that the current frame has been drawn, and move the deadline on to the next one
+    """
+    def frame_done(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.frames += 1
+        self.frame += 1
+        self.deadline = self.start + self.frame * self.period
+
+        self._window_frames += 1
+        if now - self._window_start >= 1.0:
+            self.achieved_fps = self._window_frames / (now - self._window_start)
+            self._window_start = now
+            self._window_frames = 0
+
+    """
+    Seconds left until the next frame is due
+    """
+    def wait_time(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self.deadline - now)
+
+    """
+    Line the deadlines back up with the current time, so time spent paused isn't counted as dropped frames
+    """
+    def resync(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.start = now - self.frame * self.period
+        self.deadline = now
+        self._window_start = now
+        self._window_frames = 0
+
+    """
+    Draw frames with draw(frame) on their deadlines until the given LightThread is stopped
+    """
+    def run(self, draw, thread):
+        while not thread.stopped():
+            if thread.paused():
+                # Block until resumed or stopped, rather than polling
+                if not thread.wait_while_paused():
+                    return
+                self.resync()
+
+            # Wait for the frame's deadline. Wakes up early on stop or pause, so neither has to wait out the interval
+            wait = self.wait_time()
+            if wait > 0:
+                thread.sleep(wait)
+                if thread.stopped() or thread.paused():
+                    continue
+
+            draw(self.next_frame())
+            self.frame_done()
+
+    """
+    Requested and achieved frame rate, along with how many frames were drawn late or skipped
+    """
+    def stats(self):
+        return {
+            'requested_fps': self.requested_fps,
+            'achieved_fps': round(self.achieved_fps, 2),
+            'frames': self.frames,
+            'late_frames': self.late,
+            'dropped_frames': self.dropped
+        }
@@ -1,197 +1,370 @@
-import rpi_ws281x
 import threading
 import time
+from array import array
 from LightThread import LightThread
-from collections import deque
+from Animation import Animation
+from backends import ChainBackend, OutputBackend, create_backend
+from FrameBuffer import FrameBuffer
+from FrameCache import FrameCache
+from FrameScheduler import FrameScheduler
+from metrics import StripMetrics
+from colors import brightness_table, rgb_to_packed, translate_color
+from patterns import CompiledPattern, compile_pattern
+from timeline import Crossfade, compile_timeline
+import plugins
+
+# Use the vectorized renderers when NumPy is installed, and the pure-Python ones otherwise
+try:
+    import np_animations as animations
+except ImportError:
+    import animations
 
 class LEDStrip():
-    def __init__(self, LED_COUNT=60, LED_PIN=18, LED_FREQ_HZ=800000, LED_DMA=10, LED_INVERT=False, LED_BRIGHTNESS=255, LED_CHANNEL=0):
+    # Recorded cycles of periodic animations, shared by every strip
+    frame_cache = FrameCache()
+
+    def __init__(self, LED_COUNT=60, LED_PIN=18, LED_FREQ_HZ=800000, LED_DMA=10, LED_INVERT=False, LED_BRIGHTNESS=255, LED_CHANNEL=0, engine=None, backend='ws281x', chain=None):
         self.threadID = -1
         self.thread = None
-        
+        self.animation = None
+
+        # With a RenderEngine, one shared render thread draws every strip instead of a LightThread per strip
+        self.engine = engine
+
+        # Keeps every animation on this strip drawing on fixed-rate deadlines
+        self.scheduler = FrameScheduler()
+        # When set, the next animation's first frame is due at this time.monotonic() value instead of straight away
+        self.start_at = None
+        # When set, the next animation started over a running one blends in over this many milliseconds instead of cutting
+        self.crossfade = None
+        # Render, show, start and stop timings, reported by stats()
+        self.metrics = StripMetrics()
+
+        # Further outputs chained after this one, as {'LED_COUNT', 'LED_PIN', 'LED_DMA', 'LED_CHANNEL'}, make the strip longer
+        chain = chain or []
+        first_count = LED_COUNT
+        LED_COUNT += sum(output['LED_COUNT'] for output in chain)
         self.num_leds = LED_COUNT
         self.brightness = LED_BRIGHTNESS
         self.channel = LED_CHANNEL
         self.pin = LED_PIN
 
-        # Initialize the LED strip
-        self.strip = rpi_ws281x.PixelStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
-        self.strip.begin()
+        # Brightness is applied in software when a frame is packed for output, through a table per brightness level.
+        # The strip brightness, the level of a running fade and any segment levels multiply together, and the hardware
+        # always runs at full brightness
+        self.gamma = 1.0
+        self.fade_level = 255
+        # Brightness of ranges of pixels, relative to the strip brightness, by (start, end) slice
+        self.segment_levels = {}
+
+        # Layers of virtual strips drawn over this strip (see segments). While there are any, show() only marks the strip
+        # as changed, and the compositor pushes it with every layer on it once per frame that something changed. On a
+        # RenderEngine the engine's tick is the compositor, otherwise a compositor thread is started
+        self.layers = []
+        self.layers_changed = False
+        self.composite = FrameBuffer(LED_COUNT)
+        self.compositor = None
+        self.composite_interval = 10
+        # Pushes can come from the animation, the compositor and requests at once
+        self.push_lock = threading.Lock()
+
+        # While streaming, a DDP stream (see StreamServer) writes frames into the buffer from its own thread. It's only
+        # turned on by a command, and stopping the strip's animation turns it off, so any other command takes the strip
+        # back. The lock makes sure no streamed write lands after it's been turned off
+        self.streaming = False
+        self.stream_lock = threading.Lock()
+
+        # Initialize the LED strip's output: a backend name from backends.BACKENDS, or an OutputBackend to use as is
+        if not isinstance(backend, OutputBackend):
+            outputs = [create_backend(backend, first_count, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, 255, LED_CHANNEL)]
+            for output in chain:
+                outputs.append(create_backend(backend, output['LED_COUNT'], output['LED_PIN'], LED_FREQ_HZ, output['LED_DMA'], LED_INVERT, 255, output['LED_CHANNEL']))
+            backend = ChainBackend(outputs) if chain else outputs[0]
+        self.backend = backend
+        self.backend.begin()
+
+        # Animations render into the frame buffer, which reaches the hardware in one bulk copy per frame
+        self.buffer = FrameBuffer(LED_COUNT)
+        # The last frame pushed to the output, so show() can skip pushing the same thing again. Each push publishes a new
+        # array instead of writing into this one, so readers can hold on to it without a lock (see pixels())
+        self.shown = array('I', [0]) * LED_COUNT
+        # The buffer with brightness applied, written in place through a byte view
+        self.output = array('I', [0]) * LED_COUNT
+        self.output_bytes = memoryview(self.output).cast('B')
 
     """
     Set a given pixel to a given color
     """
     def set_pixel_color(self, pixel, color):
-        self.strip.setPixelColor(pixel, self.__translateColor(color))
-        #self.strip.show()
+        if 0 <= pixel < self.num_leds:
+            self.buffer[pixel] = self.__translateColor(color)
+
+    """
+    Streaming methods, used by StreamServer. start_streaming() stops any animation and hands the strip over to the
+    stream, and is run as a command. The others only write while the strip is streaming, and return whether they did
+    """
+    def start_streaming(self):
+        self.stop_thread()
+        with self.stream_lock:
+            self.streaming = True
+
+    def stop_streaming(self):
+        with self.stream_lock:
+            self.streaming = False
+
+    """
+    Write raw 8-bit RGB triplets into the buffer, starting at a given pixel
+    """
+    def stream_pixels(self, data, start=0):
+        with self.stream_lock:
+            if not self.streaming:
+                return False
+            pixels = rgb_to_packed(data)
+            self.buffer[start:start + len(pixels)] = pixels
+            return True
+
+    def stream_show(self):
+        with self.stream_lock:
+            if not self.streaming:
+                return False
+            self.show()
+            return True
+
+    """
+    Load a whole frame of packed colors and show it, for streams written through the render worker's shared memory
+    """
+    def stream_frame(self, pixels):
+        with self.stream_lock:
+            if not self.streaming:
+                return False
+            self.buffer.load(pixels)
+            self.show()
+            return True
 
     """
     Set all pixels to a given color
     """
     def set_all_pixels(self, color):
-        for i in range(self.num_leds):
-            self.strip.setPixelColor(i, self.__translateColor(color))
+        self.buffer.fill(self.__translateColor(color))
 
     def set_color(self,color):
         self.set_all_pixels(color)
-        self.strip.show()
+        self.show()
 
     """
     Turn off all LEDs in the strip
     """
     def clear(self):
         self.set_all_pixels("#000000")
-        self.strip.show()
+        self.show()
+
+    """
+    Apply brightness to the frame buffer, copy it to the output in one bulk copy and latch it onto the LEDs. Pushing
+    a frame costs wire time for every LED, so if the frame is the same as the last one pushed, nothing is sent.
+    A strip with layers is pushed by its compositor instead
+    """
+    def show(self):
+        if self.layers:
+            self.mark_changed()
+        else:
+            self.__push()
+
+    """
+    Layer handling methods, used by virtual strips drawn over this one
+    """
+    def add_layer(self, layer):
+        # Replaced rather than changed, so the compositor can read the list without a lock
+        self.layers = self.layers + [layer]
+        if self.engine is None and self.compositor is None:
+            self.compositor = LightThread(target=self.__composite_loop, daemon=True)
+            self.compositor.start()
+        self.mark_changed()
+
+    def remove_layer(self, layer):
+        self.layers = [other for other in self.layers if other is not layer]
+        if self.layers:
+            # What the layer covered shows the strip's own frame again
+            self.mark_changed()
+            return
+        if self.compositor is not None:
+            self.compositor.stop()
+            self.compositor.join()
+            self.compositor = None
+        self.layers_changed = False
+        self.__push()
+
+    """
+    Record that a layer or the strip's own frame has changed, so the compositor pushes the strip on its next frame
+    """
+    def mark_changed(self):
+        self.layers_changed = True
+        if self.engine is not None:
+            self.engine.composite(self)
+
+    """
+    Push the strip with its layers, if anything has changed since the compositor last pushed it
+    """
+    def composite_layers(self):
+        if not self.layers_changed:
+            return
+        self.layers_changed = False
+        self.__push()
+
+    """
+    Release the strip's output, and take its layers off other strips if it's a virtual strip
+    """
+    def close(self):
+        self.stop_thread()
+        self.backend.close()
 
     """
     Set the strip to a color, and fade it from a min_brightness to a max brightness over an interval, and then do the reverse.
+    The levels scale the strip's brightness rather than replacing it. The fade replaces any running animation
     """
     def fade(self, color, min_brightness, max_brightness, interval):
+        self.stop_thread()
         self.set_all_pixels(color)
-        self.__fadeBrightness(min_brightness,max_brightness,interval)
+        params = {'color': color, 'min_brightness': min_brightness, 'max_brightness': max_brightness, 'interval': interval}
+        self.start_animation(Animation('fade', self.__fadeBrightness(min_brightness, max_brightness), interval, params, blendable=False))
+
     """
     Cycle through a rainbow of colors, stepping over given interval (default 10) with a given speed out of 1 second (default 20)
     """
     def cycle_rainbow(self, interval = 10, speed = 20):
-        current_thread = threading.current_thread()
-        while not current_thread.stopped():
-            while not current_thread.paused():
-                for j in range(256 * interval):
-                    for i in range(self.strip.numPixels()):
-                        if(current_thread.stopped()):
-                            return
-                        self.strip.setPixelColor(i, self.__wheel((int(i * 256 / self.strip.numPixels()) + j) & 255))
-                    self.strip.show()
-                    if(current_thread.stopped()):
-                        return
-                    time.sleep(speed / 1000.0)
-
-    """
-    Set a strip to a given pattern.
+        # The wheel repeats every 256 frames whatever the interval, so the renderer only needs the frame number
+        render = animations.rainbow(self.num_leds)
+        params = {'interval': interval, 'speed': speed}
+        self.restart_animation(Animation('rainbow', render, speed, params, ('rainbow',), 256, self.frame_cache))
+
+    """
+    Set a strip to a given pattern, either a pattern payload or one already compiled with patterns.compile_pattern
     """
     def set_pattern(self, pattern):
-        # Set the color of each LED to the corresponding color in the pattern
-        for color_position in pattern:
-            color = color_position['color']
-            if 'start' in color_position and 'end' in color_position:
-                # Set the color of a range of LEDs
-                start, end = color_position['start'], color_position['end']
-                for i in range(start, end + 1):
-                    self.set_pixel_color(i,color)
-            else:
-                # Set the color of a single LED
-                position = color_position['position']
-                self.set_pixel_color(position,color)
-        self.strip.show()
+        if not isinstance(pattern, CompiledPattern):
+            pattern = compile_pattern(pattern, self.num_leds)
+        pattern.apply(self.buffer)
+        self.show()
 
     """
     Run a single cluster of color across the strip against a given background color.
     """
     def color_wipe(self, bg_color, wipe_color, pixels, interval, seamless):
-        current_thread = threading.current_thread()
-
-        pixels = min(pixels, self.strip.numPixels())
-
-        counter = 0
-        
-        # Loop indefinitely
-        while not current_thread.stopped():
-            while not current_thread.paused():
-                # Set the background color for all LEDs
-                for i in range(self.strip.numPixels()):
-                    self.set_pixel_color(i, bg_color)
-                # Set the wipe color for the specified number of pixels
-                for i in range(pixels):
-                    if seamless:
-                        self.set_pixel_color((i+counter)%self.strip.numPixels(), wipe_color)
-                    else:
-                        self.set_pixel_color((i+counter), wipe_color)
-                    if current_thread.stopped(): 
-                        return
-                    # Increment the counter variable
-                counter = (counter + 1) % self.strip.numPixels()
-
-                self.strip.show()
-
-                if current_thread.stopped(): 
-                    return
-
-                # Wait for the specified interval
-                time.sleep(interval / 1000.0)
+        params = {'bg_color': bg_color, 'wipe_color': wipe_color, 'pixels': pixels, 'interval': interval, 'seamless': seamless}
+        bg_color, wipe_color = self.__translateColor(bg_color), self.__translateColor(wipe_color)
+        render = animations.color_wipe(self.num_leds, bg_color, wipe_color, pixels, seamless)
+        key = ('color_wipe', bg_color, wipe_color, pixels, seamless)
+        self.restart_animation(Animation('color_wipe', render, interval, params, key, self.num_leds, self.frame_cache))
 
     """"
     Run multiple clusters of evenly-spcaed LEDs across the strip against a given background color.
     """                
     def cluster_run(self, bg_color, cluster_color, cluster_size, cluster_space, interval):
-        current_thread = threading.current_thread()
-        
-        clusters = (self.strip.numPixels() + cluster_space) // (cluster_size + cluster_space)
-
-        strip_colors = [bg_color for i in range(self.strip.numPixels())]
-
-        for i in range(clusters):
-            for j in range(cluster_size):
-                strip_colors[(i*(cluster_size +cluster_space))+j] = cluster_color
-        
-        while not current_thread.stopped():
-            while not current_thread.paused():
-                for i in range(len(strip_colors)):
-                    self.set_pixel_color(i,strip_colors[i])
-                self.strip.show()
-                strip_colors = deque(strip_colors)
-                strip_colors.rotate(1)
-                strip_colors = list(strip_colors)
-                if current_thread.stopped(): 
-                    return
-                    
-                # Wait for the specified interval
-                time.sleep(interval / 1000.0)
-
-    """
-    Set a pattern for the LED strip, then fade from a min brighness to a max and back on an interval
+        params = {'bg_color': bg_color, 'cluster_color': cluster_color, 'cluster_size': cluster_size, 'cluster_space': cluster_space, 'interval': interval}
+        bg_color, cluster_color = self.__translateColor(bg_color), self.__translateColor(cluster_color)
+        render = animations.cluster_run(self.num_leds, bg_color, cluster_color, cluster_size, cluster_space)
+
+        # When the clusters tile the strip exactly, the frames repeat after one cluster width instead of the whole strip
+        period = self.num_leds
+        if self.num_leds % (cluster_size + cluster_space) == 0:
+            period = cluster_size + cluster_space
+        key = ('cluster_run', bg_color, cluster_color, cluster_size, cluster_space)
+        self.restart_animation(Animation('cluster_run', render, interval, params, key, period, self.frame_cache))
+
+    """
+    Set a pattern for the LED strip, then fade from a min brighness to a max and back on an interval. As with fade(), the
+    levels scale the strip's brightness and the fade replaces any running animation
     """
     def fadePattern(self, pattern, min_brightness, max_brightness, interval):
+        self.stop_thread()
+
         # First, set the pattern of the LED Strip
         self.set_pattern(pattern)
-        
+
         #Then, fade using the given parameters
-        self.__fadeBrightness(min_brightness,max_brightness,interval)
+        params = {'min_brightness': min_brightness, 'max_brightness': max_brightness, 'interval': interval}
+        self.start_animation(Animation('fade_pattern', self.__fadeBrightness(min_brightness, max_brightness), interval, params, blendable=False))
 
     """
     Blink the entire strip between two colors on an interval
     """
     def blink(self, colors, interval):
-        current_thread = threading.current_thread()
+        params = {'colors': colors, 'interval': interval}
+        colors = [self.__translateColor(color) for color in colors]
+        self.restart_animation(Animation('blink', animations.blink(colors), interval, params, ('blink', tuple(colors)), len(colors), self.frame_cache))
 
-        colorFlip = False
-        
-        counter = 0
+    """
+    Play a timeline of keyframes (see timeline.compile_timeline), drawing a frame every interval milliseconds.
+    Looping timelines are periodic, so their frames are recorded into the frame cache on the first pass
+    """
+    def timeline(self, keyframes, interval, loop=True):
+        params = {'keyframes': keyframes, 'interval': interval, 'loop': loop}
+        timeline = compile_timeline(keyframes, self.num_leds, interval, loop)
+        self.restart_animation(Animation('timeline', timeline.render, interval, params, timeline.key, timeline.period, self.frame_cache if loop else None))
 
-        while not current_thread.stopped():
-            while not current_thread.paused():
-                self.set_all_pixels(colors[counter])
-                self.strip.show()
-                if current_thread.stopped(): return
-                counter = (counter + 1) % len(colors)
-                time.sleep(interval/1000.0) 
+    """
+    Run an animation plugin (see plugins) with its parameters, drawing a frame every interval milliseconds. Plugins
+    that declare a period have their first cycle recorded into the frame cache
+    """
+    def start_plugin(self, name, params, interval):
+        render, period = plugins.get(name).create(self.num_leds, params, interval)
+        key = plugins.plugin_key(name, params) + (interval,) if period else None
+        self.restart_animation(Animation(name, render, interval, dict(params, interval=interval), key, period, self.frame_cache if period else None))
 
     """
-    Sets the brightness for the strip, but does not affect the colors
+    Sets the brightness for the strip, but does not affect the colors. Fades and segment brightness are relative to it
     """
     def set_brightness(self,brightness):
-        self.strip.setBrightness(brightness)
-        self.strip.show()
+        self.brightness = brightness
+        self.show()
+
+    """
+    Set the brightness of the pixels from start up to (not including) end, relative to the strip brightness.
+    A single pixel is a segment one pixel long
+    """
+    def set_segment_brightness(self, start, end, brightness):
+        start, end = max(start, 0), min(end, self.num_leds)
+        if start >= end:
+            return
+        if brightness >= 255:
+            self.segment_levels.pop((start, end), None)
+        else:
+            self.segment_levels[(start, end)] = brightness
+        self.show()
+
+    def clear_segment_brightness(self):
+        self.segment_levels = {}
+        self.show()
 
     """
-    Thread handling methods
+    Gamma correction applied along with brightness. 1.0 scales channels linearly, and around 2.2 makes fades look even
+    """
+    def set_gamma(self, gamma):
+        self.gamma = gamma
+        self.show()
+
+    """
+    Thread handling methods. In engine mode, stop_thread takes the strip off the render engine instead
     """
     def stop_thread(self):
+        # Whatever is stopping the animation is taking the strip over from a stream too
+        if self.streaming:
+            self.stop_streaming()
+        if self.animation is None and self.thread is None:
+            return
+        started = time.perf_counter()
+        if self.engine is not None and self.animation is not None:
+            self.engine.remove(self)
+            self.animation = None
         if self.thread is not None:
             self.thread.pause()
             self.thread.stop()
             self.thread.join()
             self.thread = None
             self.threadID = -1
+            self.animation = None
+        # A stopped fade leaves the strip at its normal brightness
+        self.fade_level = 255
+        self.metrics.stop.observe(time.perf_counter() - started)
 
     def start_thread(self, function, *args, **kwargs):
         if self.thread is None:
@@ -208,44 +381,203 @@ class LEDStrip():
 
     def get_thread(self):
         return self.thread
+
+    """
+    Animation handling methods. An animation only declares how to draw each frame, and the strip's scheduler decides when
+    """
+    def start_animation(self, animation):
+        if self.thread is not None or self.animation is not None:
+            print("That strip is already running something!")
+            return None
+        started = time.perf_counter()
+        self.animation = animation
+        self.scheduler.reset(animation.interval, self.start_at)
+        self.start_at = None
+        if self.engine is not None:
+            animation.begin(self.buffer)
+            self.engine.add(self)
+            runner = self.engine
+        else:
+            runner = self.start_thread(self.__run, args=(animation,))
+        self.metrics.start.observe(time.perf_counter() - started)
+        return runner
+
+    def restart_animation(self, animation):
+        crossfade, self.crossfade = self.crossfade, None
+        previous = self.animation
+        if crossfade and previous is not None and previous.blendable and animation.blendable and not self.paused():
+            # Keep the old animation moving from where it got to while the new one blends in over it
+            previous_frame = self.scheduler.frame
+            self.stop_thread()
+            return self.start_animation(Crossfade(previous, previous_frame, animation, crossfade))
+        self.stop_thread()
+        return self.start_animation(animation)
+
+    def get_animation(self):
+        return self.animation
+
+    """
+    Line the first frame of the next animation up with other strips, by giving it a time.monotonic() start time
+    """
+    def schedule_start(self, start):
+        self.start_at = start
+
+    """
+    Blend the next animation in over the running one for a number of milliseconds, instead of cutting straight to it
+    """
+    def schedule_crossfade(self, duration):
+        self.crossfade = duration
+
+    """
+    Name and parameters of the running animation as plain data, or None when nothing is running
+    """
+    def animation_state(self):
+        animation = self.animation
+        if animation is None:
+            return None
+        return {'name': animation.name, 'params': animation.params}
+
+    """
+    Pause and resume the running animation, whether it runs on its own thread or on the render engine
+    """
+    def pause(self):
+        if self.engine is not None:
+            self.engine.pause(self)
+        elif self.thread is not None:
+            self.thread.pause()
+
+    def resume(self):
+        if self.engine is not None:
+            self.engine.resume(self)
+        elif self.thread is not None:
+            self.thread.resume()
+
+    def paused(self):
+        if self.engine is not None:
+            return self.engine.paused(self)
+        return self.thread is not None and self.thread.paused()
+
+    """
+    Draw one frame of an animation into the buffer, without showing it
+    """
+    def draw_frame(self, animation, frame):
+        started = time.perf_counter()
+        animation.draw(frame, self.buffer)
+        self.metrics.render.observe(time.perf_counter() - started)
+
+    """
+    Draw one frame of an animation into the buffer and show it
+    """
+    def render_frame(self, animation, frame):
+        self.draw_frame(animation, frame)
+        self.show()
+
+    """
+    What the strip is set up as and showing, as plain data for /strips. Only reads attributes that are replaced whole,
+    so polling it never waits on the render loop or slows it down
+    """
+    def state(self):
+        return {
+            'num_leds': self.num_leds,
+            'pin': self.pin,
+            'channel': self.channel,
+            'backend': type(self.backend).__name__,
+            'animation': self.animation_state(),
+            'paused': self.paused(),
+            'streaming': self.streaming,
+            'brightness': self.brightness,
+            'gamma': self.gamma,
+            'segment_brightness': [{'start': start, 'end': end - 1, 'brightness': level} for (start, end), level in list(self.segment_levels.items())],
+            'layers': len(self.layers)
+        }
+
+    """
+    The frame last pushed to the output, with brightness applied, as packed colors. It's never written to again.
+    Layers changed since the compositor last ran are pushed first, so a frame a segment has just drawn is included
+    """
+    def pixels(self):
+        if self.layers_changed:
+            self.composite_layers()
+        return self.shown
+
+    """
+    Timings and frame rate of the strip as plain data, for /stats and /metrics
+    """
+    def stats(self):
+        stats = self.metrics.snapshot()
+        stats['animation'] = self.animation.name if self.animation is not None else None
+        stats['paused'] = self.paused()
+        stats['scheduler'] = self.scheduler.stats()
+        return stats
     """
     Translates a color from a given hexcode color (#FFFFFF) to a rpi_ws281x color that can be used to set a pixel
     """
     def __translateColor(self, color):
-        r, g, b = int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
-        return rpi_ws281x.Color(r,g,b)
+        return translate_color(color)
 
     """
-    Generate rainbow colors across 0-255 positions. Private method
+    Animation thread target: draws frames on the scheduler's deadlines until the thread is stopped. Private method
     """
-    def __wheel(self, pos):
-        if pos < 85:
-            return rpi_ws281x.Color(pos * 3, 255 - pos * 3, 0)
-        elif pos < 170:
-            pos -= 85
-            return rpi_ws281x.Color(255 - pos * 3, 0, pos * 3)
-        else:
-            pos -= 170
-            return rpi_ws281x.Color(0, pos * 3, 255 - pos * 3)
-
-    def __fadeBrightness(self, min_brightness, max_brightness, interval):
-        strip = self.strip
-        current_thread = threading.current_thread()
-
-        # Loop indefinitely
-        while not current_thread.stopped():
-            while not current_thread.paused():
-                # Fade in the LEDs
-                for i in range(min_brightness, max_brightness + 1):
-                    if current_thread.stopped(): return
-                    strip.setBrightness(i)
-                    strip.show()
-                    time.sleep(interval / 1000.0)
-
-                # Fade out the LEDs
-                for i in range(max_brightness, min_brightness - 1, -1):
-                    if current_thread.stopped(): return
-                    strip.setBrightness(i)
-                    strip.show()
-                    time.sleep(interval / 1000.0)
-            if current_thread.stopped(): return
+    def __run(self, animation):
+        animation.begin(self.buffer)
+        self.scheduler.run(lambda frame: self.render_frame(animation, frame), threading.current_thread())
+
+    """
+    Push the frame buffer, with every layer and brightness applied, unless it's the same as the last frame pushed. Private method
+    """
+    def __push(self):
+        with self.push_lock:
+            frame = self.__pack()
+            if frame == self.shown:
+                self.metrics.skipped_shows += 1
+                return
+            started = time.perf_counter()
+            self.backend.show(frame)
+            self.shown = array('I', frame)
+            self.metrics.show.observe(time.perf_counter() - started)
+
+    """
+    Compositor thread target, without a RenderEngine: pushes the strip with its layers every composite_interval
+    milliseconds that something has changed, until the last layer is removed. Private method
+    """
+    def __composite_loop(self):
+        scheduler = FrameScheduler()
+        scheduler.reset(self.composite_interval)
+        scheduler.run(lambda frame: self.composite_layers(), threading.current_thread())
+
+    """
+    Composite any layers over the frame buffer, then scale every channel by its brightness table into the output frame.
+    A segment is scaled again from the unscaled frame with its own table. Returns the unscaled frame at full brightness. Private method
+    """
+    def __pack(self):
+        frame = self.buffer.pixels
+        layers = self.layers
+        if layers:
+            self.composite.load(frame)
+            for layer in layers:
+                layer.apply(self.composite)
+            frame = self.composite.pixels
+
+        level = self.brightness * self.fade_level / 255.0
+        if level >= 255 and self.gamma == 1.0 and not self.segment_levels:
+            return frame
+
+        raw = frame.tobytes()
+        self.output_bytes[:] = raw.translate(brightness_table(int(round(level)), self.gamma))
+        for (start, end), segment_level in list(self.segment_levels.items()):
+            table = brightness_table(int(round(level * segment_level / 255.0)), self.gamma)
+            self.output_bytes[start * 4:end * 4] = raw[start * 4:end * 4].translate(table)
+        return self.output
+
+    """
+    Render function for fades: the frame is already in the buffer, and each frame steps the fade level up from
+    min_brightness to max_brightness and back down again, which only swaps the brightness table used by show(). Private method
+    """
+    def __fadeBrightness(self, min_brightness, max_brightness):
+        levels = list(range(min_brightness, max_brightness + 1)) + list(range(max_brightness, min_brightness - 1, -1))
+        if not levels:
+            levels = [min_brightness]
+
+        def render(frame, buffer):
+            self.fade_level = levels[frame % len(levels)]
+        return render
@@ -7,17 +7,41 @@ class LightThread(threading.Thread):
         self._stop_event = threading.Event()
         self._pause_event = threading.Event()
 
+        # Notified whenever the thread is stopped, paused or resumed, so waiting threads wake up straight away
+        self._state_changed = threading.Condition()
+
     def stop(self): 
-        self._stop_event.set()
+        with self._state_changed:
+            self._stop_event.set()
+            self._state_changed.notify_all()
 
     def stopped(self):
         return self._stop_event.is_set()
 
     def pause(self):
-        self._pause_event.set()
+        with self._state_changed:
+            self._pause_event.set()
+            self._state_changed.notify_all()
 
     def resume(self):
-        self._pause_event.clear()
+        with self._state_changed:
+            self._pause_event.clear()
+            self._state_changed.notify_all()
 
     def paused(self):
-        return self._pause_event.is_set()
\ No newline at end of file
+        return self._pause_event.is_set()
+
+    """
+    Sleep for up to timeout seconds, returning early if the thread is stopped or paused
+    """
+    def sleep(self, timeout):
+        with self._state_changed:
+            self._state_changed.wait_for(lambda: self.stopped() or self.paused(), timeout)
+
+    """
+    Block while the thread is paused, without using any CPU. Returns False if the thread was stopped instead of resumed
+    """
+    def wait_while_paused(self):
+        with self._state_changed:
+            self._state_changed.wait_for(lambda: self.stopped() or not self.paused())
+        return not self.stopped()
@@ -0,0 +1,120 @@
+import threading
+import time
+
+class RenderEngine(threading.Thread):
+    def __init__(self, max_fps=None, slack=0.002):
+        super(RenderEngine, self).__init__(name='RenderEngine', daemon=True)
+        # Upper bound on ticks per second, so the engine's CPU use stays predictable however fast strips ask to run
+        self.min_tick = 1.0 / max_fps if max_fps else 0.0
+        # Strips due within this many seconds of each other are drawn and pushed in the same tick
+        self.slack = slack
+
+        self._strips = {}
+        # Strips with layers that have changed (see LEDStrip.mark_changed), pushed once each at the end of a tick
+        self._changed = set()
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+
+        self.ticks = 0
+        self.busy_time = 0.0
+        self.started_at = time.monotonic()
+
+    """
+    Start drawing a strip's current animation. The strip's scheduler should already be reset for it
+    """
+    def add(self, strip):
+        with self._cond:
+            self._strips[strip] = False
+            self._cond.notify()
+
+    """
+    Stop drawing a strip. Waits for any tick in progress, so the strip is never drawn after this returns
+    """
+    def remove(self, strip):
+        with self._cond:
+            self._strips.pop(strip, None)
+            self._cond.notify()
+
+    """
+    Push a strip with layers on it once its changes are in. Changes made by a tick are pushed at the end of it,
+    together, and changes made outside a tick wake the engine to push them
+    """
+    def composite(self, strip):
+        with self._cond:
+            self._changed.add(strip)
+            self._cond.notify()
+
+    def pause(self, strip):
+        with self._cond:
+            if strip in self._strips:
+                self._strips[strip] = True
+
+    def resume(self, strip):
+        with self._cond:
+            if strip in self._strips:
+                self._strips[strip] = False
+                strip.scheduler.resync()
+                self._cond.notify()
+
+    def paused(self, strip):
+        return self._strips.get(strip, False)
+
+    def stop(self):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        last_tick = 0.0
+        while not self.stopped():
+            with self._cond:
+                now = time.monotonic()
+                if self._changed:
+                    self.__composite()
+                running = [strip for strip, paused in self._strips.items() if not paused]
+                if not running:
+                    self._cond.wait()
+                    continue
+
+                # Sleep until the earliest deadline, or until a strip is added, removed or resumed
+                next_deadline = max(min(strip.scheduler.deadline for strip in running), last_tick + self.min_tick)
+                if next_deadline > now:
+                    self._cond.wait(next_deadline - now)
+                    continue
+
+                self.__tick(running, now)
+                last_tick = now
+                self.busy_time += time.monotonic() - now
+
+    """
+    Draw every strip that is due into its buffer first, then push all of them, so their frames land together
+    """
+    def __tick(self, running, now):
+        due = [strip for strip in running if strip.scheduler.deadline <= now + self.slack]
+        for strip in due:
+            strip.draw_frame(strip.animation, strip.scheduler.next_frame(now))
+        for strip in due:
+            strip.show()
+            strip.scheduler.frame_done()
+        # Virtual strips drawn this tick have written their layers, so every strip they're on is pushed just once
+        self.__composite()
+        self.ticks += 1
+
+    def __composite(self):
+        changed, self._changed = self._changed, set()
+        for strip in changed:
+            strip.composite_layers()
+
+    """
+    Tick count and the share of time the engine has spent drawing
+    """
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            'strips': len(self._strips),
+            'ticks': self.ticks,
+            'load': round(self.busy_time / elapsed, 4) if elapsed > 0 else 0.0
+        }
@@ -0,0 +1,391 @@
+import itertools
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+from colors import rgb_to_packed
+from LEDStrip import LEDStrip
+from RenderEngine import RenderEngine
+from patterns import CompiledPattern
+from segments import LayerBackend, create_virtual_strip
+
+"""
+Runs every LEDStrip in a dedicated worker process, so animation timing doesn't depend on how busy the web process is.
+
+The web process holds a RemoteStrip for each strip. Method calls on it are sent to the worker over a command queue,
+and frame data (compiled patterns) is written into a shared memory block for the strip instead of being pickled. The
+worker draws patterns into the strip's buffer straight from that block, without copying it out first.
+
+A call that the worker doesn't answer, because it has died or is stuck, raises WorkerError instead of waiting forever.
+
+Streamed frames (see StreamServer) don't wait on the worker either. They're written into a second shared memory block
+for the strip, with one half holding the frame being received while the worker shows the other, and the worker is only
+sent which half to show, without an answer.
+
+Reads of what a strip is showing (state() and pixels(), for /strips and the live feeds) don't go through the worker at
+all. The worker publishes a snapshot of each strip whenever it changes, at most SNAPSHOT_FPS times a second and straight
+after every call, and the RemoteStrip answers from the last one.
+"""
+
+# Longest a call waits for the worker to answer, in seconds, and how often it checks the worker is still running
+CALL_TIMEOUT = 10
+LIVENESS_INTERVAL = 0.5
+
+# Most times a second the worker publishes each strip's snapshot
+SNAPSHOT_FPS = 30
+
+class WorkerError(Exception):
+    def __init__(self, message):
+        super(WorkerError, self).__init__(message)
+        self.message = message
+
+class RenderWorker():
+    def __init__(self, render_mode='threads', engine_max_fps=None, frame_cache_bytes=None):
+        # Fork before the web server starts any threads, so the worker starts from a clean copy of this process
+        context = multiprocessing.get_context('fork')
+        self._commands = context.Queue()
+        self._replies = context.Queue()
+        self.process = context.Process(target=_worker_main, args=(self._commands, self._replies, render_mode, engine_max_fps, frame_cache_bytes), name='RenderWorker', daemon=True)
+
+        self._call_ids = itertools.count()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # RemoteStrip of every strip in the worker, by name, to keep their snapshots up to date
+        self._strips = {}
+        self._reader = threading.Thread(target=self.__read_replies, name='RenderWorkerReplies', daemon=True)
+
+    def start(self):
+        self.process.start()
+        self._reader.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    """
+    Ask the worker to shut down, clearing and releasing every strip it still owns
+    """
+    def stop(self, timeout=5):
+        self._commands.put(None)
+        self.process.join(timeout)
+
+    """
+    Create a strip in the worker process and return the RemoteStrip that controls it
+    """
+    def add_strip(self, name, *config, backend='ws281x', chain=None):
+        num_leds = config[0] + sum(output['LED_COUNT'] for output in chain or [])
+        strip = RemoteStrip(self, name, num_leds, config[1], config[6])
+        self._strips[name] = strip
+        try:
+            self.call(name, '__add__', (config, backend, chain, strip.frame_memory.name, strip.stream_memory.name))
+        except Exception:
+            self._strips.pop(name)
+            strip.close()
+            raise
+        return strip
+
+    """
+    Create a virtual strip over strips the worker already owns (see segments), and return the RemoteStrip that controls it
+    """
+    def add_virtual_strip(self, name, spans):
+        strip = RemoteStrip(self, name, sum(span['end'] - span['start'] + 1 for span in spans), None, None)
+        self._strips[name] = strip
+        try:
+            self.call(name, '__add_virtual__', (spans, strip.frame_memory.name, strip.stream_memory.name))
+        except Exception:
+            self._strips.pop(name)
+            strip.close()
+            raise
+        return strip
+
+    def remove_strip(self, strip):
+        try:
+            self.call(strip.name, '__remove__')
+        finally:
+            self._strips.pop(strip.name, None)
+            strip.close()
+
+    """
+    Call a method on one of the worker's strips and wait for its result. Errors in the worker are raised here, and
+    WorkerError is raised if the worker has stopped or doesn't answer within timeout seconds
+    """
+    def call(self, name, method, args=(), frame_args=None, kwargs=None, timeout=CALL_TIMEOUT):
+        if not self.process.is_alive():
+            raise WorkerError('The render worker is not running')
+        call_id = next(self._call_ids)
+        done = threading.Event()
+        with self._pending_lock:
+            self._pending[call_id] = [done, None, None]
+
+        self._commands.put((call_id, name, method, args, frame_args, kwargs or {}))
+        waited = 0
+        while not done.wait(LIVENESS_INTERVAL):
+            waited += LIVENESS_INTERVAL
+            if not self.process.is_alive() or waited >= timeout:
+                with self._pending_lock:
+                    self._pending.pop(call_id, None)
+                if not self.process.is_alive():
+                    raise WorkerError('The render worker stopped while running ' + method + ' on ' + name)
+                raise WorkerError('The render worker took more than ' + str(timeout) + ' seconds to run ' + method + ' on ' + name)
+
+        with self._pending_lock:
+            _, result, error = self._pending.pop(call_id)
+        if error is not None:
+            raise RuntimeError(error)
+        return result
+
+    """
+    Call a method on one of the worker's strips without waiting for it to run or answer. Errors in the worker are
+    printed there. Raises WorkerError if the worker has stopped
+    """
+    def post(self, name, method, args=()):
+        if not self.process.is_alive():
+            raise WorkerError('The render worker is not running')
+        self._commands.put((None, name, method, args, None, {}))
+
+    def __read_replies(self):
+        while True:
+            call_id, result, error = self._replies.get()
+            if call_id is None:
+                # A snapshot the worker published: the strip's name, and its state and pixels
+                strip = self._strips.get(result)
+                if strip is not None:
+                    strip.snapshot = error
+                continue
+            with self._pending_lock:
+                pending = self._pending.get(call_id)
+                if pending is None:
+                    continue
+                pending[1], pending[2] = result, error
+            pending[0].set()
+
+class RemoteStrip():
+    def __init__(self, worker, name, num_leds, pin, channel):
+        self.worker = worker
+        self.name = name
+        self.num_leds = num_leds
+        self.pin = pin
+        self.channel = channel
+
+        # The web process writes whole frames here, and the worker draws them into the strip's buffer from here
+        self.frame_memory = shared_memory.SharedMemory(create=True, size=max(num_leds, 1) * 4)
+        self._frame = self.frame_memory.buf.cast('I')
+        self._frame_lock = threading.Lock()
+
+        # Two frames of packed colors for a stream: the one being received, and the one last sent to the worker to show
+        self.stream_memory = shared_memory.SharedMemory(create=True, size=max(num_leds, 1) * 4 * 2)
+        self._stream = self.stream_memory.buf.cast('I')
+        self._stream_half = 0
+
+        # (state, pixels) the worker last published for the strip
+        self.snapshot = ({}, array('I', [0]) * num_leds)
+
+    def set_pattern(self, pattern):
+        self.__call_with_frame('set_pattern', pattern)
+
+    def fadePattern(self, pattern, min_brightness, max_brightness, interval):
+        self.__call_with_frame('fadePattern', pattern, min_brightness, max_brightness, interval)
+
+    """
+    What the strip is set up as and showing, from the worker's last snapshot, so it never waits on the worker
+    """
+    def state(self):
+        self.__check_worker()
+        return dict(self.snapshot[0])
+
+    """
+    The frame the strip last pushed, from the worker's last snapshot. The same array until the frame changes
+    """
+    def pixels(self):
+        self.__check_worker()
+        return self.snapshot[1]
+
+    """
+    Write a streamed frame into shared memory while the last snapshot says the strip is streaming. The worker checks
+    again when it shows the frame, so one that arrives after a command has taken the strip back is never shown
+    """
+    def stream_pixels(self, data, start=0):
+        if not self.snapshot[0].get('streaming'):
+            return False
+        pixels = rgb_to_packed(data)[:max(self.num_leds - start, 0)]
+        first = self._stream_half * self.num_leds + start
+        self._stream[first:first + len(pixels)] = pixels
+        return True
+
+    """
+    Have the worker show the frame written so far, and carry on receiving into the other half, starting from a copy of
+    this frame so a stream that only sends the pixels that changed still works
+    """
+    def stream_show(self):
+        if not self.snapshot[0].get('streaming'):
+            return False
+        half, self._stream_half = self._stream_half, 1 - self._stream_half
+        self.worker.post(self.name, '__stream__', (half,))
+        self._stream[self._stream_half * self.num_leds:(self._stream_half + 1) * self.num_leds] = self._stream[half * self.num_leds:(half + 1) * self.num_leds]
+        return True
+
+    """
+    The worker's Animation objects stay in the worker, so this returns animation_state() instead
+    """
+    def get_animation(self):
+        return self.worker.call(self.name, 'animation_state')
+
+    """
+    Every other LEDStrip method is forwarded to the worker as is
+    """
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.worker.call(self.name, method, args, kwargs=kwargs)
+
+    def close(self):
+        self._frame.release()
+        self.frame_memory.close()
+        self.frame_memory.unlink()
+        self._stream.release()
+        self.stream_memory.close()
+        self.stream_memory.unlink()
+
+    def __check_worker(self):
+        if not self.worker.is_alive():
+            raise WorkerError('The render worker is not running')
+
+    """
+    Send a call whose first argument is a compiled pattern, passing its pixels through shared memory. Private method
+    """
+    def __call_with_frame(self, method, pattern, *args):
+        with self._frame_lock:
+            self._frame[:len(pattern.pixels)] = pattern.pixels
+            self.worker.call(self.name, method, args, (pattern.spans, pattern.key))
+
+"""
+Worker process main loop: owns the hardware, and runs each command against its strip in the order it was sent
+"""
+def _worker_main(commands, replies, render_mode, engine_max_fps, frame_cache_bytes):
+    if frame_cache_bytes is not None:
+        LEDStrip.frame_cache.set_max_bytes(frame_cache_bytes)
+    engine = None
+    if render_mode == 'engine':
+        engine = RenderEngine(engine_max_fps)
+        engine.start()
+
+    strips = {}
+    frames = {}
+    streams = {}
+    # (state, pixels) last published for each strip
+    published = {}
+    next_snapshot = time.monotonic()
+    while True:
+        if time.monotonic() >= next_snapshot:
+            for name, strip in strips.items():
+                _publish(replies, name, strip, published)
+            next_snapshot = time.monotonic() + 1.0 / SNAPSHOT_FPS
+        try:
+            command = commands.get(timeout=max(next_snapshot - time.monotonic(), 0))
+        except queue.Empty:
+            continue
+        if command is None:
+            break
+        call_id, name, method, args, frame_args, kwargs = command
+        if method == '__stream__':
+            # Sent without waiting for an answer, so none is given, and the next snapshot shows the frame
+            _show_stream(strips.get(name), streams.get(name), *args)
+            continue
+        # Removing a virtual strip changes the strips it was drawn over, and it's gone after the call
+        changed = _changed_by(name, strips)
+        try:
+            if method == '__add__':
+                config, backend, chain, memory_name, stream_memory_name = args
+                strips[name] = LEDStrip(*config, engine=engine, backend=backend, chain=chain)
+                frames[name] = _attach_frame_memory(memory_name)
+                streams[name] = _attach_frame_memory(stream_memory_name)
+                result = None
+            elif method == '__add_virtual__':
+                spans, memory_name, stream_memory_name = args
+                strips[name] = create_virtual_strip(spans, strips, engine)
+                frames[name] = _attach_frame_memory(memory_name)
+                streams[name] = _attach_frame_memory(stream_memory_name)
+                result = None
+            elif method == '__remove__':
+                strip = strips.pop(name)
+                strip.close()
+                frames.pop(name).close()
+                streams.pop(name).close()
+                published.pop(name, None)
+                result = None
+            else:
+                strip = strips[name]
+                if frame_args is not None:
+                    # Rebuild the compiled pattern around the pixels the web process left in shared memory, reading
+                    # them in place. The web process holds the block until the call returns, and patterns are only
+                    # drawn during the call, so the view is released straight after
+                    spans, key = frame_args
+                    with frames[name].buf.cast('I') as pixels:
+                        result = getattr(strip, method)(CompiledPattern(pixels, spans, key), *args, **kwargs)
+                else:
+                    result = getattr(strip, method)(*args, **kwargs)
+                # Threads and animations can't leave the worker, only plain data can
+                try:
+                    pickle.dumps(result)
+                except Exception:
+                    result = None
+            reply = (call_id, result, None)
+        except Exception as e:
+            reply = (call_id, None, repr(e))
+        # Published ahead of the reply, so the caller never reads a snapshot from before its call
+        for changed_name in dict.fromkeys(changed + _changed_by(name, strips)):
+            if changed_name in strips:
+                _publish(replies, changed_name, strips[changed_name], published)
+        replies.put(reply)
+
+    # Newest first, so virtual strips come off the strips they're drawn over before those are cleared
+    for name, strip in reversed(list(strips.items())):
+        strip.stop_thread()
+        strip.clear()
+        strip.close()
+    for memory in list(frames.values()) + list(streams.values()):
+        memory.close()
+
+"""
+Show one half of a strip's stream memory, if the strip is still there and streaming
+"""
+def _show_stream(strip, memory, half):
+    if strip is None:
+        return
+    try:
+        with memory.buf.cast('I') as pixels:
+            strip.stream_frame(pixels[half * strip.num_leds:(half + 1) * strip.num_leds])
+    except Exception as e:
+        print('Error while showing a streamed frame: ' + repr(e))
+
+"""
+Send the web process a strip's state and the frame it last pushed, if either has changed since they were last sent
+"""
+def _publish(replies, name, strip, published):
+    state, shown = strip.state(), strip.pixels()
+    last = published.get(name)
+    if last is not None and last[1] is shown and last[0] == state:
+        return
+    published[name] = (state, shown)
+    replies.put((None, name, (state, shown)))
+
+"""
+Names of the strips a call on a strip can change: the strip, and the strips it's drawn over if it's a virtual strip
+"""
+def _changed_by(name, strips):
+    if name not in strips:
+        return []
+    backend = strips[name].backend
+    spanned = [strip for strip, _ in backend.spans] if isinstance(backend, LayerBackend) else []
+    return [name] + [other for other, strip in strips.items() if strip in spanned]
+
+"""
+Open a shared memory block the web process created for a strip's frames
+"""
+def _attach_frame_memory(memory_name):
+    memory = shared_memory.SharedMemory(name=memory_name)
+    # The web process created the block and unlinks it, so the worker mustn't track it too
+    resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
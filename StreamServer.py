@@ -0,0 +1,166 @@
+import socket
+import struct
+import threading
+import time
+
+# DDP header flags
+DDP_VERSION_MASK = 0xC0
+DDP_VERSION_1 = 0x40
+DDP_FLAG_TIMECODE = 0x10
+DDP_FLAG_QUERY = 0x02
+DDP_FLAG_PUSH = 0x01
+
+DDP_HEADER = struct.Struct('>BBBBIH')
+
+"""
+Per-strip counters for streamed frames. A frame is dropped when it never gets shown: the next frame starts before its
+push arrives, or the strip isn't streaming yet when it does
+"""
+class StreamStats():
+    def __init__(self):
+        self.packets = 0
+        self.frames = 0
+        self.dropped_frames = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        # When the frame being received started arriving, the offset of its last packet, and whether it can be shown
+        self.frame_started = None
+        self.frame_offset = None
+        self.frame_written = True
+
+    def as_dict(self):
+        return {
+            'packets': self.packets,
+            'frames': self.frames,
+            'dropped_frames': self.dropped_frames,
+            'last_latency_ms': round(self.last_latency * 1000, 3),
+            'avg_latency_ms': round(self.total_latency / self.frames * 1000, 3) if self.frames else 0.0,
+            'max_latency_ms': round(self.max_latency * 1000, 3)
+        }
+
+"""
+Listens for raw RGB frames in DDP (Distributed Display Protocol) packets over UDP, and writes them straight into
+the target strip's frame buffer. A packet's destination id picks the strip, its data offset picks the first pixel,
+and the packet with the push flag set shows the frame.
+
+A stream only writes to a strip that's streaming (see LEDStrip.start_streaming). The first packet for a strip that
+isn't queues a stream command on the strip's CommandQueue, so the stream takes over between commands rather than in
+the middle of one, and frames are dropped until it has run. Any other command takes the strip back, until the next
+packet queues the stream command again.
+"""
+class StreamServer(threading.Thread):
+    def __init__(self, port=4048, host='0.0.0.0'):
+        super(StreamServer, self).__init__(name='StreamServer', daemon=True)
+        self.address = (host, port)
+        self.socket = None
+
+        # (strip, CommandQueue) by destination id, with the stream's counters and its queued stream command
+        self._strips = {}
+        self._stats = {}
+        self._takeovers = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    """
+    Route packets for a DDP destination id to a strip, taking the strip over through its CommandQueue
+    """
+    def register(self, stream_id, strip, command_queue):
+        with self._lock:
+            self._strips[stream_id] = (strip, command_queue)
+            self._stats[stream_id] = StreamStats()
+            self._takeovers[stream_id] = None
+
+    def unregister(self, stream_id):
+        with self._lock:
+            self._strips.pop(stream_id, None)
+            self._stats.pop(stream_id, None)
+            self._takeovers.pop(stream_id, None)
+
+    """
+    The lowest destination id that isn't routed to a strip yet. DDP reserves 0, and uses 1 for the default output
+    """
+    def free_id(self):
+        with self._lock:
+            stream_id = 1
+            while stream_id in self._strips:
+                stream_id += 1
+            return stream_id
+
+    def stats(self):
+        with self._lock:
+            return {stream_id: stats.as_dict() for stream_id, stats in self._stats.items()}
+
+    def stop(self):
+        self._stop_event.set()
+        if self.socket is not None:
+            self.socket.close()
+
+    def run(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(self.address)
+        while not self._stop_event.is_set():
+            try:
+                packet = self.socket.recv(65536)
+            except OSError:
+                return
+            received = time.monotonic()
+            try:
+                self.handle_packet(packet, received)
+            except Exception as e:
+                print(f'Error while handling a stream packet: {e}')
+
+    def handle_packet(self, packet, received):
+        if len(packet) < DDP_HEADER.size:
+            return
+        flags, sequence, data_type, stream_id, offset, length = DDP_HEADER.unpack_from(packet)
+        if flags & DDP_VERSION_MASK != DDP_VERSION_1 or flags & DDP_FLAG_QUERY:
+            return
+
+        header_size = DDP_HEADER.size + (4 if flags & DDP_FLAG_TIMECODE else 0)
+        data = packet[header_size:header_size + length]
+
+        with self._lock:
+            route = self._strips.get(stream_id)
+            stats = self._stats.get(stream_id)
+        if route is None:
+            return
+        strip, command_queue = route
+
+        stats.packets += 1
+        # Packets of a frame come in order of their offsets, so one that doesn't come after the last means a new frame
+        # has started, and the one before it never got its push
+        if stats.frame_started is not None and offset <= stats.frame_offset:
+            stats.dropped_frames += 1
+            stats.frame_started = None
+        if stats.frame_started is None:
+            stats.frame_started = received
+            stats.frame_written = True
+        stats.frame_offset = offset
+
+        if not strip.stream_pixels(data, offset // 3):
+            stats.frame_written = False
+            self.__take_over(stream_id, command_queue)
+
+        if flags & DDP_FLAG_PUSH:
+            shown = stats.frame_written and strip.stream_show()
+            if shown:
+                latency = time.monotonic() - stats.frame_started
+                stats.frames += 1
+                stats.last_latency = latency
+                stats.total_latency += latency
+                stats.max_latency = max(stats.max_latency, latency)
+            else:
+                stats.dropped_frames += 1
+            stats.frame_started = None
+
+    """
+    Queue the command that hands a strip over to its stream, unless one is already waiting to run. Private method
+    """
+    def __take_over(self, stream_id, command_queue):
+        with self._lock:
+            ticket = self._takeovers.get(stream_id)
+            if stream_id not in self._takeovers or (ticket is not None and not ticket.finished.is_set()):
+                return
+            self._takeovers[stream_id] = command_queue.submit('stream', {})
@@ -0,0 +1,110 @@
+"""
+Pure-Python frame renderers for the built-in animations.
+
+Each factory takes the strip length and the animation's (already packed) colors, and returns a
+render(frame, buffer) function that draws frame number `frame` into a FrameBuffer.
+np_animations provides the same factories backed by NumPy, and is used instead when it can be imported.
+"""
+from array import array
+from functools import lru_cache
+from colors import WHEEL
+
+"""
+Rainbow spread across the whole strip, moving one wheel position per frame
+"""
+def rainbow(num_leds):
+    offsets = [int(i * 256 / num_leds) for i in range(num_leds)]
+    # Doubling the wheel lets the shifted index skip the & 255 on every pixel
+    wheel = WHEEL * 2
+
+    def render(frame, buffer):
+        shift = frame & 255
+        buffer[:] = [wheel[offset + shift] for offset in offsets]
+    return render
+
+"""
+A single run of wipe_color moving along a bg_color background
+"""
+def color_wipe(num_leds, bg_color, wipe_color, pixels, seamless):
+    pixels = min(pixels, num_leds)
+
+    def render(frame, buffer):
+        counter = frame % num_leds
+        buffer.fill(bg_color)
+        buffer.fill(wipe_color, counter, counter + pixels)
+        if seamless and counter + pixels > num_leds:
+            buffer.fill(wipe_color, 0, counter + pixels - num_leds)
+    return render
+
+"""
+Evenly spaced clusters of cluster_color rotating along a bg_color background
+"""
+def cluster_run(num_leds, bg_color, cluster_color, cluster_size, cluster_space):
+    base = array('I', cluster_frame(num_leds, bg_color, cluster_color, cluster_size, cluster_space))
+
+    def render(frame, buffer):
+        shift = frame % num_leds
+        buffer.load(base[num_leds - shift:] + base[:num_leds - shift])
+    return render
+
+"""
+The whole strip stepping through a list of colors
+"""
+def blink(colors):
+    def render(frame, buffer):
+        buffer.fill(colors[frame % len(colors)])
+    return render
+
+"""
+Mix two frames of packed colors into a buffer, with weight/256 of end and the rest of start. Every channel byte is
+scaled through a table, then both whole frames are added as one big integer each: the two scaled bytes never sum past
+255, so no channel carries into the next and a single addition mixes every pixel at once
+"""
+def blend(start, end, weight, buffer):
+    size = len(start) * start.itemsize
+    start = int.from_bytes(start.tobytes().translate(_weight_table(256 - weight)), 'little')
+    end = int.from_bytes(end.tobytes().translate(_weight_table(weight)), 'little')
+    mixed = array('I')
+    mixed.frombytes((start + end).to_bytes(size, 'little'))
+    buffer.load(mixed)
+
+@lru_cache(maxsize=257)
+def _weight_table(weight):
+    return bytes(value * weight >> 8 for value in range(256))
+
+"""
+Composite a layer of packed colors onto a buffer, starting at pixel `start`, with a blend mode:
+replace, over (black in the layer lets the buffer show through), add (saturating), max or multiply
+"""
+def composite(mode, pixels, buffer, start):
+    end = start + len(pixels)
+    if mode == 'replace':
+        buffer[start:end] = pixels
+        return
+    base = buffer.pixels[start:end]
+    if mode == 'over':
+        buffer[start:end] = [pixel if pixel else below for pixel, below in zip(pixels, base)]
+        return
+
+    top, bottom = pixels.tobytes(), base.tobytes()
+    if mode == 'add':
+        mixed = bytes(a + b if a + b < 256 else 255 for a, b in zip(top, bottom))
+    elif mode == 'max':
+        mixed = bytes(map(max, top, bottom))
+    else:
+        mixed = bytes(a * b // 255 for a, b in zip(top, bottom))
+    layer = array('I')
+    layer.frombytes(mixed)
+    buffer[start:end] = layer
+
+"""
+The first frame of a cluster run, as a list of packed colors
+"""
+def cluster_frame(num_leds, bg_color, cluster_color, cluster_size, cluster_space):
+    clusters = (num_leds + cluster_space) // (cluster_size + cluster_space)
+
+    strip_colors = [bg_color] * num_leds
+    for i in range(clusters):
+        start = i * (cluster_size + cluster_space)
+        strip_colors[start:start + cluster_size] = [cluster_color] * cluster_size
+    return strip_colors
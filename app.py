@@ -1,50 +1,273 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import threading
-from LightThread import LightThread
+import atexit
+import fcntl
+import os
 from LEDStrip import LEDStrip
+from RenderEngine import RenderEngine
+from RenderWorker import RenderWorker, WorkerError
+from StreamServer import StreamServer
 import signal
 import jsonschema
 import route_schemas as rschema
 import json
-import requests
+import time
+import commands
+import segments
+import scenes
+import scheduler
+import feeds
+import plugins
+from queue import Empty
+from resources import ResourcePool, ResourceError
+from colors import packed_to_rgb
+import metrics
 
 app = Flask(__name__)
 CORS(app)
 
 PORT_NUM = 5000
 
+#Threads serving requests when the server is started with serve()
+SERVER_THREADS = 8
+
+#Longest a SIGTERM waits for queued commands to run before the strips are torn down, in seconds
+DRAIN_TIMEOUT = 5
+
+#File locked by the one process that owns the strips' hardware, unless init.json sets a "lock_file"
+LOCK_FILE = os.path.join(os.environ.get('TMPDIR', '/tmp'), 'led-server.lock')
+
+#How far ahead a synchronized batch schedules its animations' first frame, so every strip is ready in time
+BATCH_SYNC_DELAY = 0.05
+
 Strips = {}
 
+#Pins, DMA channels and PWM/PCM/SPI peripherals held by each strip's outputs
+Resources = ResourcePool()
+
+#Command queue of every strip, by strip name. Commands run in order on the queue's thread, not the request's
+Queues = {}
+
+#Longest a request with a wait parameter waits for its command to run, in seconds
+MAX_WAIT = 30
+
+#Live feed of every strip, by strip name, at up to FEED_FPS frames a second. Idle feeds send a comment every
+#FEED_KEEPALIVE seconds so proxies keep the connection open
+Feeds = {}
+FEED_FPS = 15
+FEED_KEEPALIVE = 15
+
+#Each open event stream holds a server thread, so only this many can be open at once, leaving the other threads for
+#the rest of the API. serve() takes it from the "max_event_streams" server setting, or half the threads
+MAX_EVENT_STREAMS = SERVER_THREADS // 2
+Event_stream_slots = threading.BoundedSemaphore(MAX_EVENT_STREAMS)
+
+#Virtual strips, by name, with the names of the strips they're drawn over
+Segments = {}
+
+#Shared render thread for every strip, when init.json sets "render_mode": "engine"
+Engine = None
+
+#Worker process that owns the strips, when init.json sets "render_process": true
+Worker = None
+
+#UDP listener for DDP pixel streams, when init.json sets a "stream_port"
+Stream = None
+#DDP destination id of each strip, by strip name
+Stream_ids = {}
+
+#Scenes saved on disk, in init.json's "scene_file" (scenes.bin by default)
+Scenes = None
+
+#Jobs that run commands and recall scenes at set times, kept in init.json's "schedule_file" (schedule.json by default)
+Schedule = None
+
+#Open lock file while this process owns the hardware
+Hardware_lock = None
+#Whether the strips have been loaded, and whether the server is shutting down and turning requests away
+Started = False
+Draining = False
+Lifecycle_lock = threading.RLock()
+
 """
 Helper functions:
 """
 
-def setup_strip(STRIP_NAME, LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_BRIGHTNESS, LED_INVERT, LED_CHANNEL):
+def setup_strip(STRIP_NAME, LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_BRIGHTNESS, LED_INVERT, LED_CHANNEL, BACKEND='ws281x', GAMMA=1.0, CHAIN=None):
     global Strips
-    if len(Strips) >= 3:
-        raise ValueError
     if STRIP_NAME in Strips:
         raise KeyError
-    for strip in Strips:
-        if LED_PIN == Strips[strip].pin:
-            raise IndexError
-    print("\t" + STRIP_NAME + " added on pin " + str(LED_PIN))
-    Strips[STRIP_NAME] = LEDStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_BRIGHTNESS, LED_INVERT, LED_CHANNEL)
+    #Every output of the strip needs its own pin, peripheral and DMA channel. Raises ResourceError on a conflict
+    outputs = [(LED_PIN, LED_DMA, LED_CHANNEL)] + [(output['LED_PIN'], output['LED_DMA'], output['LED_CHANNEL']) for output in CHAIN or []]
+    Resources.claim(STRIP_NAME, outputs)
+    try:
+        if Worker is not None:
+            Strips[STRIP_NAME] = Worker.add_strip(STRIP_NAME, LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_BRIGHTNESS, LED_INVERT, LED_CHANNEL, backend=BACKEND, chain=CHAIN)
+        else:
+            Strips[STRIP_NAME] = LEDStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_BRIGHTNESS, LED_INVERT, LED_CHANNEL, engine=Engine, backend=BACKEND, chain=CHAIN)
+    except Exception:
+        Resources.release(STRIP_NAME)
+        raise
+    print("\t" + STRIP_NAME + " added on pin " + ", ".join(str(output[0]) for output in outputs))
+    if GAMMA != 1.0:
+        Strips[STRIP_NAME].set_gamma(GAMMA)
+    register_strip(STRIP_NAME)
+
+def setup_segment(STRIP_NAME, SPANS):
+    global Strips
+    if STRIP_NAME in Strips:
+        raise KeyError
+    segments.check_spans(SPANS, Strips)
+    if Worker is not None:
+        Strips[STRIP_NAME] = Worker.add_virtual_strip(STRIP_NAME, SPANS)
+    else:
+        Strips[STRIP_NAME] = segments.create_virtual_strip(SPANS, Strips, Engine)
+    Segments[STRIP_NAME] = [span['strip'] for span in SPANS]
+    print("\t" + STRIP_NAME + " added over " + ", ".join(Segments[STRIP_NAME]))
+    register_strip(STRIP_NAME)
+
+def register_strip(STRIP_NAME):
+    Queues[STRIP_NAME] = commands.CommandQueue(STRIP_NAME, Strips[STRIP_NAME])
+    Feeds[STRIP_NAME] = feeds.StripFeed(STRIP_NAME, Strips[STRIP_NAME], FEED_FPS)
+    if Stream is not None:
+        Stream_ids[STRIP_NAME] = Stream.free_id()
+        Stream.register(Stream_ids[STRIP_NAME], Strips[STRIP_NAME], Queues[STRIP_NAME])
+        print("\t" + STRIP_NAME + " streams on DDP id " + str(Stream_ids[STRIP_NAME]))
 
 def teardown_strip(target_strip_name):
     global Strips
     if target_strip_name not in Strips:
         raise KeyError
+    #Virtual strips drawn over this strip are removed with it
+    for name in [name for name, spanned in Segments.items() if target_strip_name in spanned]:
+        teardown_strip(name)
+    Segments.pop(target_strip_name, None)
+    Queues.pop(target_strip_name).stop()
+    Feeds.pop(target_strip_name).close()
     target_strip = Strips.pop(target_strip_name)
-    target_strip.clear()
-    target_strip.stop_thread()
+    if target_strip_name in Stream_ids:
+        Stream.unregister(Stream_ids.pop(target_strip_name))
+    if Worker is not None and not Worker.is_alive():
+        #A stopped worker has already let go of the strip, so only the web process's side of it is left to close
+        target_strip.close()
+    else:
+        target_strip.stop_thread()
+        target_strip.clear()
+        if Worker is not None:
+            Worker.remove_strip(target_strip)
+        else:
+            target_strip.close()
+    Resources.release(target_strip_name)
     print("\t " + target_strip_name + " removed")
 
 def get_strip(strip_name):
     global Strips
     return Strips[strip_name]
 
+"""
+Queue a validated command on its strip and acknowledge it straight away, with 202 and the command's id. Given a wait
+(in seconds, from the wait query parameter unless passed in), respond once the command has run instead, with 201 or
+its error. Commands that haven't run by then are still acknowledged with 202
+"""
+def submit(command, data, wait=None):
+    #The strip can be removed between a route finding it and its command being queued
+    try:
+        ticket = Queues[data['target_strip']].submit(command, data)
+    except KeyError:
+        return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")}), 400
+    if wait is None:
+        wait = parse_wait(request.args.get('wait'))
+    if wait and ticket.wait(wait):
+        if isinstance(ticket.exception, WorkerError):
+            return jsonify({'error': ticket.error, 'command_id': ticket.command_id}), 503
+        if ticket.status == 'failed':
+            return jsonify({'error': ticket.error, 'command_id': ticket.command_id}), 400
+        return jsonify({'status': 'success', 'command_id': ticket.command_id}), 201
+    return jsonify({'status': ticket.status, 'command_id': ticket.command_id}), 202
+
+"""
+Acknowledge several queued commands the way submit acknowledges one: with 202 and their ids straight away, or given a
+wait, once they've all run, with 201 or the error of the first one that failed, its index and how many were applied.
+fields are added to the response
+"""
+def submit_response(tickets, wait=None, fields={}):
+    command_ids = [ticket.command_id for ticket in tickets]
+    if wait is None:
+        wait = parse_wait(request.args.get('wait'))
+    deadline = time.monotonic() + wait
+    if wait and all(ticket.wait(max(deadline - time.monotonic(), 0)) for ticket in tickets):
+        failed = [index for index, ticket in enumerate(tickets) if ticket.status == 'failed']
+        if failed:
+            ticket = tickets[failed[0]]
+            response = dict(fields, error=ticket.error, index=failed[0], applied=len(tickets) - len(failed), command_ids=command_ids)
+            return jsonify(response), 503 if isinstance(ticket.exception, WorkerError) else 400
+        return jsonify(dict(fields, status='success', applied=len(tickets), command_ids=command_ids)), 201
+    return jsonify(dict(fields, status='queued', command_ids=command_ids)), 202
+
+def parse_wait(wait):
+    if wait is None or wait.lower() in ('', '0', 'false'):
+        return 0
+    if wait.lower() == 'true':
+        return MAX_WAIT
+    try:
+        return min(max(float(wait), 0), MAX_WAIT)
+    except ValueError:
+        return MAX_WAIT
+
+"""
+A render worker that has stopped or stopped answering makes any route that needs it unavailable, instead of an error
+"""
+@app.errorhandler(WorkerError)
+def worker_unavailable(e):
+    return jsonify({'error': e.message}), 503
+
+"""
+Start the app on the first request when a server imported it directly, like flask run, and turn requests away while
+it can't start or is shutting down
+"""
+@app.before_request
+def check_lifecycle():
+    if not Started:
+        try:
+            create_app()
+        except Exception as e:
+            return jsonify({'error': 'The server could not start: ' + str(e)}), 503
+    if Draining:
+        return jsonify({'error': 'The server is shutting down'}), 503
+
+#The scene routes can't be used if the scene file couldn't be opened on startup
+@app.before_request
+def check_scenes():
+    if Scenes is None and request.url_rule is not None and request.url_rule.rule.startswith('/scene'):
+        return jsonify({'error': 'Scenes are not available, see the startup log'}), 503
+
+"""
+Request timing, recorded against the route that handled each request
+"""
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    if request.url_rule is not None and 'request_started' in g:
+        metrics.route(request.url_rule.rule.lstrip('/')).request.observe(time.perf_counter() - g.request_started)
+    return response
+
+"""
+Timings and frame rates of every strip, along with per-route request and validation timings
+"""
+def collect_stats():
+    strips = {}
+    for name, strip in list(Strips.items()):
+        try:
+            strips[name] = strip.stats()
+        except Exception:
+            # The strip was removed while its stats were being read
+            strips[name] = None
+    return strips, metrics.route_snapshots()
+
 """
 Routes:
 """
@@ -54,9 +277,7 @@ def set_color():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.color_schema)
-        jsonschema.validate(data,rschema.brightness_schema)
+        rschema.validate(data, 'setcolor')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -64,22 +285,9 @@ def set_color():
     #Return an error if the strip doesn't exist
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
-    
-    #Stop any animation that's running on the strip
-    target_strip.stop_thread()
-    
-    #Get data from the payload
-    color = data['color']
-    brightness = data['brightness']
-
-    #Set the LEDStrip pixels to the given color
-    target_strip.set_color(color)
 
-    #Update LED strip brightness
-    target_strip.set_brightness(brightness)
-
-    # Send a response to the client
-    return jsonify({'status': 'success'}), 201
+    #Set the LED strip to the given color
+    return submit('setcolor', data)
 
 #Sets the LED strip to a given pattern
 @app.route('/setpattern', methods=['POST'])
@@ -87,9 +295,7 @@ def set_pattern():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.pattern_schema)
-        jsonschema.validate(data,rschema.brightness_schema)
+        rschema.validate(data, 'setpattern')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -97,22 +303,9 @@ def set_pattern():
     #Return an error if the strip doesn't exist
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
-    
-    #Stop any animation that's running on the strip
-    target_strip.stop_thread()
-
-    # Read from the request payload
-    pattern = data['pattern']
-    brightness = data['brightness']
 
     #Set the LED strip to the given pattern
-    target_strip.set_pattern(pattern)
-
-    #Update LED strip brightness
-    target_strip.set_brightness(brightness)
-
-    # Send a response to the client
-    return jsonify({'status': 'success'}), 201
+    return submit('setpattern', data)
 
 #Sets the LED strip to wheel through the rainbow
 @app.route('/startrainbow', methods=['POST'])
@@ -120,10 +313,7 @@ def start_rainbow():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.start_rainbow_schema)
-        jsonschema.validate(data,rschema.speed_schema)
-        jsonschema.validate(data,rschema.brightness_schema)
+        rschema.validate(data, 'startrainbow')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -131,20 +321,9 @@ def start_rainbow():
     #Return an error if the strip doesn't exist
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
-    
-    #Read from the request payload
-    color_interval = data['color_interval']
-    speed = data['speed']
-    brightness = data['brightness']
-
-    # Start the rainbow cycle in a new thread
-    target_strip.restart_thread(target_strip.cycle_rainbow, args=(color_interval,speed))
 
-    #Update LED strip brightness
-    target_strip.set_brightness(brightness)
-
-    # Send a response to the client
-    return jsonify({'status': 'success'}), 201
+    #Start the rainbow cycle in a new thread
+    return submit('startrainbow', data)
 
 #Clear the LED strip and turn all LEDs off
 @app.route('/clear', methods=['POST'])
@@ -152,7 +331,7 @@ def clear():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
+        rschema.validate(data, 'clear')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -161,14 +340,8 @@ def clear():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Stop any animations running on the strip
-    target_strip.stop_thread()
-
-    #Clear the LED strip
-    target_strip.clear()
-
-    # Send a response to the client
-    return jsonify({'status': 'success'}), 201
+    #Stop any animations running on the strip, and clear it
+    return submit('clear', data)
 
 #Sends a color across the LED strip
 @app.route('/colorwipe', methods=['POST'])
@@ -176,10 +349,7 @@ def color_wipe():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.color_wipe_schema)
-        jsonschema.validate(data,rschema.speed_schema)
-        jsonschema.validate(data,rschema.brightness_schema)
+        rschema.validate(data, 'colorwipe')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -188,22 +358,8 @@ def color_wipe():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Read from request payload
-    bg_color = data['bg_color']
-    wipe_color = data['wipe_color']
-    pixels = data['pixels']
-    speed = data['speed']
-    seamless = data['seamless']
-    brightness = data['brightness']
-
     #Start the color wipe in a new thread
-    target_strip.restart_thread(target_strip.color_wipe, args=(bg_color, wipe_color, pixels, speed, seamless))
-
-    #Update LED strip brightness
-    target_strip.set_brightness(brightness)
-
-    #Send a response to the client
-    return jsonify({'status': 'success'}), 201
+    return submit('colorwipe', data)
 
 
 @app.route('/clusterrun', methods=['POST'])
@@ -211,10 +367,7 @@ def cluster_run():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.cluster_run_schema)
-        jsonschema.validate(data,rschema.brightness_schema)
-        jsonschema.validate(data,rschema.speed_schema)
+        rschema.validate(data, 'clusterrun')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -223,29 +376,18 @@ def cluster_run():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Read from request payload
-    bg_color = data['bg_color']
-    cluster_color = data['cluster_color']
-    cluster_spacing = data['cluster_spacing']
-    cluster_size = data['cluster_size']
-    brightness = data['brightness']
-    speed = data['speed']
-    
-    target_strip.restart_thread(target_strip.cluster_run, args=(bg_color,cluster_color,cluster_size,cluster_spacing,speed))
-    target_strip.set_brightness(brightness)
-
-    #Send a response to the client
-    return jsonify({'status': 'success'}), 201    
-#Fades a color in and out on the whole strip
+    #Start the cluster run in a new thread
+    return submit('clusterrun', data)
+
+#Fades a color in and out on the whole strip. min_brightness and max_brightness are out of the strip's brightness (set
+#by /setbrightness), not absolute: at brightness 128, max_brightness 255 peaks at half the LEDs' output. A fade is an
+#animation of its own, so it replaces whatever animation was running and can't be run over one or crossfaded into
 @app.route('/fadecolor', methods=['POST'])
 def fade_color():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.color_schema)
-        jsonschema.validate(data,rschema.fade_brightness_schema)
-        jsonschema.validate(data,rschema.speed_schema)
+        rschema.validate(data, 'fadecolor')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -254,28 +396,17 @@ def fade_color():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Read the request payload
-    color = data['color']
-    min_brightness = data['min_brightness']
-    max_brightness = data['max_brightness']
-    speed = data['speed']
-
     #Start the fade animation in a new thread
-    target_strip.restart_thread(target_strip.fade,args=(color,min_brightness,max_brightness,speed))
-
-    #Send a response to the client
-    return jsonify({'status': 'success'}), 201
+    return submit('fadecolor', data)
 
-#Fades a pattern of colors in and out
+#Fades a pattern of colors in and out. Like /fadecolor, the levels are out of the strip's brightness and the fade
+#replaces any running animation
 @app.route('/fadepattern',methods=['POST'])
 def fade_pattern():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.pattern_schema)
-        jsonschema.validate(data,rschema.fade_brightness_schema)
-        jsonschema.validate(data,rschema.speed_schema)
+        rschema.validate(data, 'fadepattern')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -284,17 +415,8 @@ def fade_pattern():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Read the request payload
-    pattern = data['pattern']
-    min_brightness = data['min_brightness']
-    max_brightness = data['max_brightness']
-    speed = data['speed']
-
     #Start the fade animation in a new thread
-    target_strip.restart_thread(target_strip.fadePattern, args=(pattern,min_brightness,max_brightness,speed))
-    
-    #Send a response to the client
-    return jsonify({'status': 'success'}), 201
+    return submit('fadepattern', data)
 
 #Blink the LED strip between a given array of colors
 @app.route('/blink',methods=['POST'])
@@ -302,10 +424,7 @@ def blink():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.color_array_schema)
-        jsonschema.validate(data,rschema.speed_schema)
-        jsonschema.validate(data,rschema.brightness_schema)
+        rschema.validate(data, 'blink')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -314,19 +433,41 @@ def blink():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Read the request payload
-    colors = data['colors']
-    speed = data['speed']
-    brightness = data['brightness']
-
     #Start the blink animation
-    target_strip.restart_thread(target_strip.blink,args=(colors, speed))
+    return submit('blink', data)
 
-    #Set the brightness of the LED strip
-    target_strip.set_brightness(brightness)
+#Every animation plugin that can be run
+@app.route('/plugins', methods=['GET'])
+def list_plugins():
+    return jsonify(plugins.names()), 200
 
-    #Send a response to the client
-    return jsonify({'status': 'success'}), 201
+#The parameter schema of an animation plugin
+@app.route('/plugins/<plugin_name>', methods=['GET'])
+def plugin_schema(plugin_name):
+    try:
+        return jsonify(plugins.get(plugin_name).schema), 200
+    except KeyError:
+        return jsonify({'error': ('Plugin ' + plugin_name + " doesn't exist!")}), 404
+
+#Run an animation plugin, with the plugin's own parameters alongside target_strip, speed, brightness and crossfade
+@app.route('/plugins/<plugin_name>', methods=['POST'])
+def run_plugin(plugin_name):
+    try:
+        #Validate the request payload, and the plugin's parameters against its schema
+        if not isinstance(request.json, dict):
+            raise jsonschema.ValidationError('The payload must be a JSON object')
+        data = dict(request.json, plugin=plugin_name)
+        rschema.validate(data, 'plugin')
+        target_strip = get_strip(data['target_strip'])
+    #Return an error if validation fails
+    except jsonschema.ValidationError as e:
+        return jsonify({"error": e.message}), 400
+    #Return an error if the strip doesn't exist
+    except KeyError:
+        return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
+
+    #Start the plugin's animation
+    return submit('plugin', data)
 
 #Pause a running animation.
 @app.route('/pause',methods=['POST'])
@@ -334,7 +475,7 @@ def pause():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
+        rschema.validate(data, 'pause')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -343,18 +484,8 @@ def pause():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Get the target strip's thread
-    thread = target_strip.get_thread()
-
-    #Check to see if the thread is actually running something
-    if thread is not None:
-        if not thread.paused():
-            thread.pause()
-            return jsonify({'status': 'success'}), 201
-        else:
-            return jsonify({'error': 'Animation is already paused'}), 400
-    else:
-        return jsonify({'error': 'No animation found'}), 400
+    #Run the command, returning an error if the strip isn't in the right state for it. It's quick, so always wait for it
+    return submit('pause', data, MAX_WAIT)
 
 #Resume a paused animation
 @app.route('/resume',methods=['POST'])
@@ -362,7 +493,7 @@ def resume():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
+        rschema.validate(data, 'resume')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -371,27 +502,34 @@ def resume():
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
 
-    #Get the target strip's thread
-    thread = target_strip.get_thread()
+    #Run the command, returning an error if the strip isn't in the right state for it. It's quick, so always wait for it
+    return submit('resume', data, MAX_WAIT)
 
-    #Check to see if the thread is actually running something
-    if thread is not None:
-        if thread.paused():
-            thread.resume()
-            return jsonify({'status': 'success'}), 201
-        else:
-            return jsonify({'error': 'Animation is not paused'}), 400
-    else:
-        return jsonify({'error': 'No animation found'}), 400
+#Play a timeline of colors and patterns, easing from each keyframe into the next
+@app.route('/timeline', methods=['POST'])
+def timeline():
+    try:
+        #Validate the request payload
+        data = request.json
+        rschema.validate(data, 'timeline')
+        target_strip = get_strip(data['target_strip'])
+    #Return an error if validation fails
+    except jsonschema.ValidationError as e:
+        return jsonify({"error": e.message}), 400
+    #Return an error if the strip doesn't exist
+    except KeyError:
+        return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
+
+    #Start the timeline
+    return submit('timeline', data)
 
-#Set the brightness of the LED strip. Not really effective on fade animations
+#Set the brightness of the LED strip, or of a range of its pixels. Fades are relative to it
 @app.route('/setbrightness', methods=['POST'])
 def set_brightness():
     try:
         #Validate the request payload
         data = request.json
-        jsonschema.validate(data,rschema.base_schema)
-        jsonschema.validate(data,rschema.brightness_schema)
+        rschema.validate(data, 'setbrightness')
         target_strip = get_strip(data['target_strip'])
     #Return an error if validation fails
     except jsonschema.ValidationError as e:
@@ -399,23 +537,292 @@ def set_brightness():
     #Return an error if the strip doesn't exist
     except KeyError:
         return jsonify({'error': ('Strip ' + data['target_strip'] + " doesn't exist!")  }), 400
-        
-    #Get the target strip's thread
-    thread = target_strip.get_thread()
-    
-    #Read the request payload
-    brightness = data['brightness']
 
     #Set the strip brightness
-    target_strip.set_brightness(brightness)
+    return submit('setbrightness', data)
 
-    #Send a response to the client
-    return jsonify({'status': 'success'}), 201
+#Frame counts, dropped frames and latency for every strip's DDP stream
+@app.route('/streamstats', methods=['GET'])
+def stream_stats():
+    if Stream is None:
+        return jsonify({'error': 'Streaming is not enabled'}), 400
+    stats = Stream.stats()
+    return jsonify({name: dict(stats[stream_id], stream_id=stream_id) for name, stream_id in Stream_ids.items() if stream_id in stats}), 200
+
+"""
+Put strips back into their state in a scene, all of them or only the named ones, by queueing each strip's command after
+the ones already queued on it. Returns the names of the strips the scene sets and the Tickets of their commands. Strips
+in the scene that don't exist any more are skipped
+"""
+def recall_scene(scene_name, strip_names=None):
+    states = Scenes.load(scene_name)
+    targets = [name for name in states if name in Strips and (strip_names is None or name in strip_names)]
+    entries = []
+    for strip_name in targets:
+        entries.append((Queues[strip_name], states[strip_name][0], scenes.payload(strip_name, states[strip_name], Strips[strip_name].num_leds)))
+    tickets = commands.submit_all(entries)
+    Scenes.set_last(scene_name, targets)
+    return targets, tickets
+
+"""
+Show every strip's last scene again, on startup
+"""
+def restore_scenes():
+    by_scene = {}
+    for strip_name, scene_name in Scenes.last().items():
+        by_scene.setdefault(scene_name, []).append(strip_name)
+    for scene_name, strip_names in by_scene.items():
+        targets, tickets = recall_scene(scene_name, strip_names)
+        for strip_name, ticket in zip(targets, tickets):
+            ticket.wait(MAX_WAIT)
+            if ticket.status == 'failed':
+                print("\tCould not restore " + strip_name + " to scene " + scene_name + ": " + ticket.error)
+            else:
+                print("\t" + strip_name + " restored to scene " + scene_name)
+
+#Names and tags of the saved scenes, or only of the ones with the tag given in the query string
+@app.route('/scenes', methods=['GET'])
+def list_scenes():
+    return jsonify(Scenes.list(request.args.get('tag'))), 200
+
+#Each strip's command and payload in a saved scene
+@app.route('/scene/<scene_name>', methods=['GET'])
+def get_scene(scene_name):
+    try:
+        states = Scenes.load(scene_name)
+    except KeyError:
+        return jsonify({'error': 'No scene with that name'}), 404
+    return jsonify({strip_name: {'command': command, 'data': data} for strip_name, (command, data, _) in states.items()}), 200
+
+#Save what strips are showing as a scene, every strip or only the ones listed, replacing any scene with that name
+@app.route('/scene/<scene_name>', methods=['PUT'])
+def save_scene(scene_name):
+    data = request.get_json(silent=True) or {}
+    try:
+        rschema.validate(data, 'savescene')
+    except jsonschema.ValidationError as e:
+        return jsonify({"error": e.message}), 400
+    strip_names = data.get('strips', list(Strips))
+    for strip_name in strip_names:
+        if strip_name not in Strips:
+            return jsonify({'error': ('Strip ' + strip_name + " doesn't exist!")}), 400
+
+    #Let queued commands run first, so the scene has the strips' latest state. A strip that keeps getting new commands
+    #could keep its queue from ever emptying, so this waits MAX_WAIT seconds at most
+    deadline = time.monotonic() + MAX_WAIT
+    for strip_name in strip_names:
+        if not Queues[strip_name].drain(max(deadline - time.monotonic(), 0)):
+            return jsonify({'error': ('Strip ' + strip_name + ' is still running queued commands, try again')}), 503
+    states = {}
+    for strip_name in strip_names:
+        state = commands.get_state(Strips[strip_name])
+        if state is not None:
+            states[strip_name] = scenes.capture(state[0], state[1], Strips[strip_name].num_leds)
+    if not states:
+        return jsonify({'error': 'None of those strips are showing anything to save'}), 400
+    Scenes.save(scene_name, states, data.get('tags', []))
+    return jsonify({'status': 'success', 'strips': list(states)}), 201
+
+#Recall a saved scene onto every strip in it, or only the ones listed. Acknowledged like /batch
+@app.route('/scene/<scene_name>', methods=['POST'])
+def recall(scene_name):
+    data = request.get_json(silent=True) or {}
+    try:
+        rschema.validate(data, 'recallscene')
+        targets, tickets = recall_scene(scene_name, data.get('strips'))
+    except jsonschema.ValidationError as e:
+        return jsonify({"error": e.message}), 400
+    except KeyError:
+        return jsonify({'error': 'No scene with that name'}), 404
+    return submit_response(tickets, fields={'strips': targets})
+
+@app.route('/scene/<scene_name>', methods=['DELETE'])
+def delete_scene(scene_name):
+    try:
+        Scenes.delete(scene_name)
+    except KeyError:
+        return jsonify({'error': 'No scene with that name'}), 404
+    return jsonify({'status': 'success'}), 200
+
+"""
+Run a scheduled job: recall its scene, or queue its command on its strip
+"""
+def run_job(job):
+    if 'scene' in job:
+        recall_scene(job['scene'])
+        return
+    command = job['command']
+    if command['target_strip'] not in Queues:
+        print('Scheduled job ' + str(job['id']) + ' skipped: strip ' + command['target_strip'] + " doesn't exist")
+        return
+    Queues[command['target_strip']].submit(command['command'], command)
+
+#Every scheduled job, with when it next runs
+@app.route('/schedule', methods=['GET'])
+def list_jobs():
+    return jsonify(Schedule.list()), 200
+
+#Schedule a command or a scene on a cron expression, or some minutes before or after sunrise or sunset
+@app.route('/schedule', methods=['POST'])
+def add_job():
+    try:
+        rschema.validate(request.json, 'schedule')
+        if 'command' in request.json:
+            rschema.validate(request.json['command'], request.json['command']['command'])
+            get_strip(request.json['command']['target_strip'])
+        elif Scenes is None or request.json['scene'] not in Scenes:
+            return jsonify({'error': 'No scene with that name'}), 400
+        job = Schedule.add(request.json)
+    except jsonschema.ValidationError as e:
+        return jsonify({"error": e.message}), 400
+    except KeyError:
+        return jsonify({'error': ('Strip ' + request.json['command']['target_strip'] + " doesn't exist!")}), 400
+    except scheduler.ScheduleError as e:
+        return jsonify({"error": e.message}), 400
+    return jsonify(job), 201
+
+@app.route('/schedule/<int:job_id>', methods=['DELETE'])
+def remove_job(job_id):
+    try:
+        Schedule.remove(job_id)
+    except KeyError:
+        return jsonify({'error': 'No job with that id'}), 404
+    return jsonify({'status': 'success'}), 200
+
+"""
+A strip's state for /strips: what it's showing, the hardware it holds, and the strips a virtual strip is drawn over
+"""
+def strip_state(strip_name, claims):
+    state = Strips[strip_name].state()
+    state['resources'] = sorted(resource for resource, owner in claims.items() if owner == strip_name)
+    if strip_name in Segments:
+        state['spans_strips'] = Segments[strip_name]
+    return state
+
+#Every strip's configuration and what it's showing
+@app.route('/strips', methods=['GET'])
+def list_strips():
+    claims = Resources.claims()
+    return jsonify({strip_name: strip_state(strip_name, claims) for strip_name in list(Strips)}), 200
+
+#One strip's configuration and what it's showing. With pixels=true the frame it last showed is included as hex colors,
+#and with format=binary only that frame is sent, as raw RGB triplets
+@app.route('/strips/<strip_name>', methods=['GET'])
+def get_strip_state(strip_name):
+    try:
+        target_strip = get_strip(strip_name)
+    except KeyError:
+        return jsonify({'error': ('Strip ' + strip_name + " doesn't exist!")}), 404
+    if request.args.get('format') == 'binary':
+        return Response(packed_to_rgb(target_strip.pixels()), mimetype='application/octet-stream')
+    state = strip_state(strip_name, Resources.claims())
+    if request.args.get('pixels', '').lower() in ('1', 'true'):
+        state['pixels'] = ['#%06x' % pixel for pixel in target_strip.pixels()]
+    return jsonify(state), 200
+
+#Live feed of a strip as Server-Sent Events: its state whenever it changes, and its frames as keyframes or as deltas of
+#the pixels that changed
+@app.route('/strips/<strip_name>/events', methods=['GET'])
+def strip_events(strip_name):
+    if strip_name not in Feeds:
+        return jsonify({'error': ('Strip ' + strip_name + " doesn't exist!")}), 404
+    feed = Feeds[strip_name]
+    if not Event_stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many event streams are open, try again later'}), 503
+
+    def stream():
+        subscriber = feed.subscribe()
+        try:
+            while True:
+                try:
+                    message = subscriber.get(FEED_KEEPALIVE)
+                except Empty:
+                    yield b': keepalive\n\n'
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            feed.unsubscribe(subscriber)
+    response = Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    #The slot is given back when the server closes the response, even if the client left before it was sent
+    response.call_on_close(Event_stream_slots.release)
+    return response
+
+#Status of a queued command, by the command id it was acknowledged with
+@app.route('/command/<int:command_id>', methods=['GET'])
+def command_status(command_id):
+    ticket = commands.get_ticket(command_id)
+    if ticket is None:
+        return jsonify({'error': 'No command with that id'}), 404
+    return jsonify(ticket.state()), 200
+
+#Pins, DMA channels and peripherals in use, and the strip holding each
+@app.route('/resources', methods=['GET'])
+def resources():
+    return jsonify(Resources.claims()), 200
+
+#Performance stats for every strip and route as JSON
+@app.route('/stats', methods=['GET'])
+def stats():
+    strips, routes = collect_stats()
+    data = {'strips': strips, 'routes': routes}
+    if Engine is not None:
+        data['engine'] = Engine.stats()
+    return jsonify(data), 200
+
+#The same stats in the Prometheus text format, for scraping
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    strips, routes = collect_stats()
+    return Response(metrics.prometheus_text(strips, routes), mimetype='text/plain; version=0.0.4'), 200
+
+#Run an ordered list of commands across any number of strips in one request. Every command is validated before any is
+#queued, so an invalid one rejects the whole batch. So does a pause or resume that would fail given the strip's state
+#and the batch's commands before it: the strips' queues are emptied first, and the batch is refused with the command's
+#index and nothing applied. Anything else is checked only when it runs, and the batch isn't atomic once it's queued: a
+#command that fails then (a worker error, say) doesn't undo the commands before it or stop the ones after it, and with
+#?wait the response gives its index and how many commands were applied
+@app.route('/batch', methods=['POST'])
+def batch():
+    try:
+        #Validate the request payload
+        data = request.json
+        rschema.validate(data, 'batch')
+    #Return an error if validation fails
+    except jsonschema.ValidationError as e:
+        return jsonify({"error": e.message}), 400
+
+    #Validate every command and check its strip exists before queueing any of them
+    for index, command in enumerate(data['commands']):
+        try:
+            rschema.validate(command, command['command'])
+            get_strip(command['target_strip'])
+        except jsonschema.ValidationError as e:
+            return jsonify({"error": e.message, 'index': index}), 400
+        except KeyError:
+            return jsonify({'error': ('Strip ' + command['target_strip'] + " doesn't exist!"), 'index': index}), 400
+
+    #With sync, every animation in the batch has its first frame on the same deadline
+    start = time.monotonic() + BATCH_SYNC_DELAY if data.get('sync', False) else None
+
+    #Queue the commands in order on their strips' queues, after what's already queued there and without any other
+    #command getting in between
+    try:
+        tickets = commands.submit_all([(Queues[command['target_strip']], command['command'], command) for command in data['commands']], start, check=True, timeout=MAX_WAIT)
+    except KeyError as e:
+        return jsonify({'error': ('Strip ' + e.args[0] + " doesn't exist!")}), 400
+    except commands.CommandError as e:
+        if e.index is None:
+            return jsonify({'error': e.message + ', try again'}), 503
+        return jsonify({'error': e.message, 'index': e.index, 'applied': 0}), 400
+
+    return submit_response(tickets)
 
 @app.route('/addstrip', methods=['POST'])
 def add_strip():
     try:
-        jsonschema.validate(request.json,rschema.add_strip_schema)
+        rschema.validate(request.json, 'addstrip')
         strip_name = request.json["STRIP_NAME"]
         led_count = request.json["LED_COUNT"]
         led_pin = request.json["LED_PIN"]
@@ -424,21 +831,36 @@ def add_strip():
         led_invert = request.json["LED_INVERT"]
         led_brightness = request.json["LED_BRIGHTNESS"]
         led_channel = request.json["LED_CHANNEL"]
-        setup_strip(strip_name, led_count, led_pin, led_freq_hz, led_dma, led_invert, led_brightness, led_channel)
+        backend = request.json.get("BACKEND", "ws281x")
+        gamma = request.json.get("GAMMA", 1.0)
+        chain = request.json.get("CHAIN")
+        setup_strip(strip_name, led_count, led_pin, led_freq_hz, led_dma, led_invert, led_brightness, led_channel, backend, gamma, chain)
     except jsonschema.ValidationError as e:
         return jsonify({"error": e.message}), 400
-    except ValueError:
-        return jsonify({"error": "You cannot add more three LED strips!"}), 400
+    except ResourceError as e:
+        return jsonify({"error": e.message}), 400
+    except KeyError:
+        return jsonify({"error": "An LED strip with that name already exists!"}), 400
+    return jsonify({'status': 'success'}), 201
+
+#Add a virtual strip over ranges of one or more strips. It takes every command a strip does, under its own name
+@app.route('/addsegment', methods=['POST'])
+def add_segment():
+    try:
+        rschema.validate(request.json, 'addsegment')
+        setup_segment(request.json["STRIP_NAME"], request.json["spans"])
+    except jsonschema.ValidationError as e:
+        return jsonify({"error": e.message}), 400
+    except segments.SegmentError as e:
+        return jsonify({"error": e.message}), 400
     except KeyError:
         return jsonify({"error": "An LED strip with that name already exists!"}), 400
-    except IndexError:
-        return jsonify({"error":"An LED strip is already using that pin!"}), 400
     return jsonify({'status': 'success'}), 201
 
 @app.route('/removestrip',methods=['POST'])
 def remove_strip():
     try:
-        jsonschema.validate(request.json,rschema.base_schema)
+        rschema.validate(request.json, 'removestrip')
         target_strip = request.json["target_strip"]
         teardown_strip(target_strip)
     except jsonschema.ValidationError as e:
@@ -448,31 +870,145 @@ def remove_strip():
     return jsonify({'status': 'success'}), 201
 
 """
-Clear the strip when the program ends from ctrl-c or on pi shutdown
+Application lifecycle. The process that calls create_app owns the hardware: it loads the strips from init.json, and
+tears them down (stopping and clearing every strip) on exit. serve() also tears them down on SIGTERM, ctrl-c and SIGHUP,
+while other servers keep their own signal handling. If anything fails to start, whatever did start is shut down again
+and the error is raised, and the app isn't marked started. A lock file stops a second
+process from driving the same pins and DMA channels, so under gunicorn run a single worker with threads:
+    gunicorn -w 1 --threads 8 'app:create_app()'
+or start the threaded server built in with `python app.py`
 """
-def end_signal_handler(signal, frame):
-    global Strips
+def create_app(config_path='init.json'):
+    global Started, Draining
+    with Lifecycle_lock:
+        if Started:
+            return app
+        with open(config_path, 'r') as f:
+            init_strips = json.load(f)
+        acquire_hardware(init_strips.get('lock_file', LOCK_FILE))
+        try:
+            __load_strips(init_strips)
+        except Exception:
+            # Let go of whatever did start, so a later attempt starts from nothing
+            shutdown(0)
+            Draining = False
+            raise
+        atexit.register(shutdown)
+        # Only marked started once everything is up, so requests never see a half-started app
+        Started = True
+    return app
+
+"""
+Lock the hardware for this process, raising RuntimeError if another process already has it
+"""
+def acquire_hardware(lock_file):
+    global Hardware_lock
+    Hardware_lock = open(lock_file, 'a+')
     try:
-        # Clean up resources here
-        for strip in list(Strips):
-            print("\tRemoving " + strip)
-            teardown_strip(strip)
-    except Exception as e:
-        # Log the error
-        print(f'Error while cleaning up resources: {e}')
-    finally:
-        # Exit the app
-        exit(0)
+        fcntl.flock(Hardware_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        Hardware_lock.close()
+        Hardware_lock = None
+        raise RuntimeError('Another process already owns the LED strips (' + lock_file + '). Run a single server process.')
+
+"""
+Turn new requests away, give queued commands up to drain_timeout seconds to run, then stop and clear every strip
+and release the hardware. Safe to call more than once
+"""
+def shutdown(drain_timeout=DRAIN_TIMEOUT):
+    global Draining, Worker, Stream, Scenes, Schedule, Hardware_lock
+    with Lifecycle_lock:
+        if Draining:
+            return
+        Draining = True
+        if Schedule is not None:
+            Schedule.stop()
+            Schedule = None
+        deadline = time.monotonic() + drain_timeout
+        for queue in list(Queues.values()):
+            queue.drain(max(deadline - time.monotonic(), 0))
+        try:
+            for strip in reversed(list(Strips)):
+                if strip in Strips:
+                    print("\tRemoving " + strip)
+                    teardown_strip(strip)
+        except Exception as e:
+            print(f'Error while cleaning up resources: {e}')
+        finally:
+            if Stream is not None:
+                Stream.stop()
+                Stream = None
+            if Worker is not None:
+                Worker.stop()
+                Worker = None
+            if Scenes is not None:
+                Scenes.close()
+                Scenes = None
+            if Hardware_lock is not None:
+                Hardware_lock.close()
+                Hardware_lock = None
 
-signal.signal(signal.SIGHUP,end_signal_handler)
-signal.signal(signal.SIGINT, end_signal_handler)
+"""
+Clear the strips when the program ends from SIGTERM, ctrl-c or on pi shutdown
+"""
+def end_signal_handler(signal, frame):
+    shutdown()
+    exit(0)
+
+"""
+Serve the app from this process with a pool of request threads, so a slow request never holds up the others.
+Uses waitress when it's installed, and Werkzeug's threaded server otherwise
+"""
+def serve(config_path='init.json'):
+    global Event_stream_slots
+    create_app(config_path)
+    # Only when this module runs the server: under another server, like gunicorn, its own handlers stay in charge
+    signal.signal(signal.SIGTERM, end_signal_handler)
+    signal.signal(signal.SIGHUP, end_signal_handler)
+    signal.signal(signal.SIGINT, end_signal_handler)
+    with open(config_path, 'r') as f:
+        server = json.load(f).get('server', {})
+    host = server.get('host', '0.0.0.0')
+    port = server.get('port', PORT_NUM)
+    threads = server.get('threads', SERVER_THREADS)
+    Event_stream_slots = threading.BoundedSemaphore(server.get('max_event_streams', max(threads // 2, 1)))
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        waitress_serve = None
+    if waitress_serve is not None:
+        waitress_serve(app, host=host, port=port, threads=threads)
+    else:
+        app.run(host=host, port=port, threaded=True, use_reloader=False)
 
 """
 Load initial strip congfiguration from init.json
 """
-def __load_strips():
-    with open('init.json', 'r') as f:
-        init_strips =  json.load(f)
+def __load_strips(init_strips):
+    global Engine, Worker, Stream
+    # Memory cap for the recorded frames of periodic animations, shared by every strip
+    frame_cache_bytes = None
+    if 'frame_cache_mb' in init_strips:
+        frame_cache_bytes = int(init_strips['frame_cache_mb'] * 1024 * 1024)
+    render_mode = init_strips.get('render_mode', 'threads')
+    engine_max_fps = init_strips.get('engine_max_fps')
+
+    if init_strips.get('render_process', False):
+        # The worker process owns the hardware and does all the rendering, this process only serves requests
+        Worker = RenderWorker(render_mode, engine_max_fps, frame_cache_bytes)
+        Worker.start()
+    else:
+        if frame_cache_bytes is not None:
+            LEDStrip.frame_cache.set_max_bytes(frame_cache_bytes)
+        # Optionally drive every strip from one render thread, capped at engine_max_fps ticks per second
+        if render_mode == 'engine':
+            Engine = RenderEngine(engine_max_fps)
+            Engine.start()
+
+    # Optionally accept raw RGB frames over UDP, in DDP packets
+    if 'stream_port' in init_strips:
+        Stream = StreamServer(init_strips['stream_port'])
+        Stream.start()
     try:
         for strip in init_strips['strips']:
             strip_name = strip["STRIP_NAME"]
@@ -483,24 +1019,50 @@ def __load_strips():
             led_invert = strip["LED_INVERT"]
             led_brightness = strip["LED_BRIGHTNESS"]
             led_channel = strip["LED_CHANNEL"]
+            # Optional output backend, so the server can run against a simulated strip without the hardware
+            backend = strip.get("BACKEND", "ws281x")
+            # Optional gamma correction applied with brightness, e.g. 2.2 for even-looking fades
+            gamma = strip.get("GAMMA", 1.0)
+            # Optional further outputs chained after the first, each with its own LED_COUNT, LED_PIN, LED_DMA and LED_CHANNEL
+            chain = strip.get("CHAIN")
             print("\tLoading " + strip_name + " on pin " + str(led_pin) + "...")
-            setup_strip(strip_name, led_count, led_pin, led_freq_hz, led_dma, led_invert, led_brightness, led_channel)
+            setup_strip(strip_name, led_count, led_pin, led_freq_hz, led_dma, led_invert, led_brightness, led_channel, backend, gamma, chain)
+        # Virtual strips over ranges of the strips above, each running its own effects
+        for segment in init_strips.get('segments', []):
+            rschema.validate(segment, 'addsegment')
+            print("\tLoading " + segment["STRIP_NAME"] + "...")
+            setup_segment(segment["STRIP_NAME"], segment["spans"])
     except jsonschema.ValidationError as e:
         print("\n" + e.message)
         print("Please update init.json to resolve this error.")
-        return
-    except ValueError:
-        print("\nYou cannot add more three LED strips!")
+    except ResourceError as e:
+        print("\n" + e.message)
         print("Please update init.json to resolve this error.")
-        return
     except KeyError:
         print("\nAn LED strip with that name already exists!")
         print("Please update init.json to resolve this error.")
-        return
-    except IndexError:
-        print("\nAn LED strip is already using that pin!")
+    except segments.SegmentError as e:
+        print("\n" + e.message)
         print("Please update init.json to resolve this error.")
-        return
 
-__load_strips()
+    # Scenes and the schedule are set up even when a strip failed to load, for the strips that did
+    __load_stores(init_strips)
+
+def __load_stores(init_strips):
+    global Scenes, Schedule
+    try:
+        # Scenes saved by /scene. Every strip comes back to the last one it showed
+        Scenes = scenes.SceneStore(init_strips.get('scene_file', 'scenes.bin'))
+        restore_scenes()
+    except scenes.SceneError as e:
+        print("\n" + e.message)
+        print("Please update init.json to resolve this error.")
+    # Jobs scheduled by /schedule. Sun jobs need the "location" as {"latitude", "longitude"} in degrees
+    location = init_strips.get('location')
+    if location is not None:
+        location = (location['latitude'], location['longitude'])
+    Schedule = scheduler.Scheduler(init_strips.get('schedule_file', 'schedule.json'), run_job, location)
+    Schedule.start()
 
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,162 @@
+"""
+Output backends: where a strip's frames go once they're rendered. LEDStrip only ever talks to a backend, so the
+same animations can drive real ws281x hardware, a simulator that records what would have been shown, or nothing at all.
+
+A backend takes whole frames of packed 0x00RRGGBB colors in show(), plus the hardware brightness (0-255).
+"""
+import ctypes
+import time
+from array import array
+from collections import deque
+
+class OutputBackend():
+    def __init__(self, num_leds, brightness=255):
+        self.num_leds = num_leds
+        self.brightness = brightness
+
+    def begin(self):
+        pass
+
+    """
+    Copy a frame of packed colors to the output and latch it onto the LEDs
+    """
+    def show(self, pixels):
+        raise NotImplementedError
+
+    def set_brightness(self, brightness):
+        self.brightness = brightness
+
+    def get_brightness(self):
+        return self.brightness
+
+    def close(self):
+        pass
+
+"""
+Real WS281x strips, driven through rpi_ws281x. The library is only imported when one of these is created,
+so the simulated and null backends run on machines without it
+"""
+class Ws281xBackend(OutputBackend):
+    def __init__(self, num_leds, pin=18, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0):
+        super(Ws281xBackend, self).__init__(num_leds, brightness)
+        import rpi_ws281x
+        self.strip = rpi_ws281x.PixelStrip(num_leds, pin, freq_hz, dma, invert, brightness, channel)
+        self.leds = None
+
+    def begin(self):
+        self.strip.begin()
+        # Address of the channel's LED buffer, which the driver allocates in begin(). Frames are copied straight into it
+        # in one memmove, instead of one library call per pixel. None on library versions that don't expose it
+        self.leds = None
+        try:
+            import _rpi_ws281x
+            self.leds = int(_rpi_ws281x.ws2811_channel_t_leds_get(self.strip._channel))
+        except (ImportError, AttributeError, TypeError):
+            pass
+
+    def show(self, pixels):
+        if self.leds:
+            address, length = pixels.buffer_info()
+            ctypes.memmove(self.leds, address, min(length, self.num_leds) * pixels.itemsize)
+        else:
+            self.strip[0:self.num_leds] = pixels
+        self.strip.show()
+
+    def set_brightness(self, brightness):
+        self.brightness = brightness
+        self.strip.setBrightness(brightness)
+
+"""
+Stands in for a strip by recording every frame it's shown, with the time it was shown and the brightness it was shown at.
+Only the last max_frames frames are kept. With wire_time set, each show() also takes as long as sending the frame
+down a real strip would (30us per LED at 800kHz), so timing behaves like it does on hardware
+"""
+class SimulatedBackend(OutputBackend):
+    WS281X_TIME_PER_LED = 30e-6
+
+    def __init__(self, num_leds, pin=18, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0, max_frames=1024, wire_time=False):
+        super(SimulatedBackend, self).__init__(num_leds, brightness)
+        self.pixels = array('I', [0]) * num_leds
+        # (time.monotonic() when shown, brightness, frame) for the most recent frames
+        self.frames = deque(maxlen=max_frames)
+        self.wire_time = num_leds * self.WS281X_TIME_PER_LED * (800000 / freq_hz) if wire_time else 0.0
+        self.shows = 0
+
+    def show(self, pixels):
+        shown_at = time.monotonic()
+        self.pixels[:] = pixels[:self.num_leds]
+        if self.frames.maxlen != 0:
+            self.frames.append((shown_at, self.brightness, array('I', self.pixels)))
+        self.shows += 1
+        if self.wire_time:
+            time.sleep(self.wire_time)
+
+    """
+    Seconds between each recorded frame and the one before it
+    """
+    def frame_intervals(self):
+        times = [frame[0] for frame in self.frames]
+        return [later - earlier for earlier, later in zip(times, times[1:])]
+
+    def last_frame(self):
+        return self.frames[-1][2] if self.frames else None
+
+    def clear_frames(self):
+        self.frames.clear()
+        self.shows = 0
+
+"""
+Accepts frames and throws them away. Used to measure render cost on its own
+"""
+class NullBackend(OutputBackend):
+    def __init__(self, num_leds, pin=18, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0):
+        super(NullBackend, self).__init__(num_leds, brightness)
+        self.shows = 0
+
+    def show(self, pixels):
+        self.shows += 1
+
+"""
+Several outputs chained behind one strip: each frame is split across them in order, so one strip can be longer than
+any single output can drive. Each output starts sending its part as soon as it's shown, so they transmit side by side
+"""
+class ChainBackend(OutputBackend):
+    def __init__(self, outputs):
+        self.outputs = outputs
+        super(ChainBackend, self).__init__(sum(output.num_leds for output in outputs))
+
+    def begin(self):
+        for output in self.outputs:
+            output.begin()
+
+    def show(self, pixels):
+        offset = 0
+        for output in self.outputs:
+            output.show(pixels[offset:offset + output.num_leds])
+            offset += output.num_leds
+
+    def set_brightness(self, brightness):
+        self.brightness = brightness
+        for output in self.outputs:
+            output.set_brightness(brightness)
+
+    def close(self):
+        for output in self.outputs:
+            output.close()
+
+"""
+Every backend a strip can be configured with, by name
+"""
+BACKENDS = {
+    'ws281x': Ws281xBackend,
+    'simulated': SimulatedBackend,
+    'null': NullBackend
+}
+
+"""
+Create a backend by name, from the same settings an LEDStrip takes
+"""
+def create_backend(name, num_leds, pin=18, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0):
+    if name not in BACKENDS:
+        raise ValueError('Unknown output backend: ' + str(name))
+    return BACKENDS[name](num_leds, pin, freq_hz, dma, invert, brightness, channel)
@@ -0,0 +1,149 @@
+"""
+Measures how fast every animation renders and shows a frame at strip lengths from 30 to 5000 LEDs, with no hardware:
+strips use the null output backend, so only the render path is timed.
+
+For each animation and length it prints the median and 99th percentile frame latency and the frame rate that allows,
+both rendering every frame ("render") and replaying a cached cycle ("cached"). Animations that aren't periodic, like the
+fades, can't be cached and only get a render row. With --live, each animation also runs
+on its own thread against a simulated strip that takes as long to show a frame as real WS281x LEDs, and the frame rate
+it actually achieved is printed.
+
+Exits with status 1 if any animation can't render at --min-fps, so it can be run as a regression check in CI.
+
+Run from the repository root:  python benchmarks/bench_render.py [--sizes 30,150,600] [--min-fps 60] [--live]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from LEDStrip import LEDStrip, animations
+from backends import NullBackend, SimulatedBackend
+
+SIZES = [30, 150, 600, 1500, 5000]
+
+PATTERN = [{'color': '#ff0000', 'start': 0, 'end': 9}, {'color': '#00ff00', 'position': 12}, {'color': '#0000ff', 'start': 20, 'end': 4999}]
+
+"""
+Each animation, started on a strip with a given frame interval in milliseconds
+"""
+ANIMATIONS = {
+    'rainbow': lambda strip, interval: strip.cycle_rainbow(1, interval),
+    'color_wipe': lambda strip, interval: strip.color_wipe('#000000', '#0000ff', 5, interval, True),
+    'cluster_run': lambda strip, interval: strip.cluster_run('#000000', '#ff8800', 3, 7, interval),
+    'blink': lambda strip, interval: strip.blink(['#ff0000', '#00ff00', '#0000ff'], interval),
+    'fade': lambda strip, interval: strip.fade('#ff8800', 0, 255, interval),
+    'fade_pattern': lambda strip, interval: strip.fadePattern(PATTERN, 0, 255, interval)
+}
+
+"""
+Stands in for a RenderEngine so an animation can be started on a strip without any thread drawing it
+"""
+class HeldEngine():
+    def add(self, strip):
+        pass
+
+    def remove(self, strip):
+        pass
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+"""
+Time render_frame() for a number of frames, returning per-frame latencies in seconds
+"""
+def time_frames(strip, animation, frames):
+    animation.begin(strip.buffer)
+    latencies = []
+    clock = time.perf_counter
+    for frame in range(frames):
+        start = clock()
+        strip.render_frame(animation, frame)
+        latencies.append(clock() - start)
+    return latencies
+
+"""
+Frame latencies of an animation on a strip of a given size, either rendered or replayed from its cached cycle. Returns
+None for a cached run of an animation that can't be cached
+"""
+def bench_render(name, size, frames, cached):
+    LEDStrip.frame_cache.clear()
+    strip = LEDStrip(size, engine=HeldEngine(), backend=NullBackend(size))
+    ANIMATIONS[name](strip, 10)
+    animation = strip.get_animation()
+    if cached:
+        if animation.cache is None or animation.period is None:
+            # Not periodic, so there's no cycle to replay
+            strip.stop_thread()
+            return None
+        # Play one full cycle first, so the timed frames all come from the cache
+        time_frames(strip, animation, animation.period)
+    else:
+        animation.cache = None
+    latencies = time_frames(strip, animation, frames)
+    strip.stop_thread()
+    return latencies
+
+"""
+Run an animation on its own thread against a simulated strip, returning the achieved frame rate and its 99th percentile frame interval
+"""
+def bench_live(name, size, interval, duration):
+    LEDStrip.frame_cache.clear()
+    backend = SimulatedBackend(size, max_frames=100000, wire_time=True)
+    strip = LEDStrip(size, backend=backend)
+    ANIMATIONS[name](strip, interval)
+    time.sleep(duration)
+    strip.stop_thread()
+    intervals = backend.frame_intervals()
+    if not intervals:
+        return 0.0, 0.0
+    return len(intervals) / sum(intervals), percentile(intervals, 0.99)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES), help='comma-separated strip lengths')
+    parser.add_argument('--animations', default=','.join(ANIMATIONS), help='comma-separated animation names')
+    parser.add_argument('--frames', type=int, default=300, help='frames timed per animation and length')
+    parser.add_argument('--min-fps', type=float, default=None, help='fail if any animation renders slower than this')
+    parser.add_argument('--live', action='store_true', help='also run each animation on a thread against a simulated strip')
+    parser.add_argument('--interval', type=int, default=10, help='frame interval in milliseconds for --live')
+    parser.add_argument('--duration', type=float, default=1.0, help='seconds each --live run lasts')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    names = args.animations.split(',')
+    print('renderers: ' + animations.__name__)
+    print('%-13s %6s %7s %12s %12s %11s' % ('animation', 'leds', 'mode', 'p50 (us)', 'p99 (us)', 'max fps'))
+
+    failures = []
+    for name in names:
+        for size in sizes:
+            for cached in (False, True):
+                latencies = bench_render(name, size, args.frames, cached)
+                if latencies is None:
+                    continue
+                p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+                fps = len(latencies) / sum(latencies)
+                mode = 'cached' if cached else 'render'
+                print('%-13s %6d %7s %12.1f %12.1f %11.0f' % (name, size, mode, p50 * 1e6, p99 * 1e6, fps))
+                if args.min_fps is not None and fps < args.min_fps:
+                    failures.append('%s at %d LEDs (%s): %.0f fps' % (name, size, mode, fps))
+
+    if args.live:
+        print('\nlive, %d ms interval (%.0f fps requested)' % (args.interval, 1000.0 / args.interval))
+        print('%-13s %6s %12s %18s' % ('animation', 'leds', 'achieved fps', 'p99 interval (ms)'))
+        for name in names:
+            for size in sizes:
+                fps, p99 = bench_live(name, size, args.interval, args.duration)
+                print('%-13s %6d %12.1f %18.2f' % (name, size, fps, p99 * 1e3))
+
+    if failures:
+        print('\nBelow %.0f fps:' % args.min_fps)
+        for failure in failures:
+            print('\t' + failure)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares the per-request cost of validating route payloads with jsonschema.validate, the way routes used to,
+against the validators compiled once in route_schemas.
+
+Run from the repository root:  python benchmarks/bench_validation.py
+"""
+import os
+import sys
+import timeit
+import jsonschema
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import route_schemas as rschema
+
+PAYLOADS = {
+    'setcolor': {'target_strip': 'desk_strip', 'color': '#ff8800', 'brightness': 100},
+    'setpattern': {
+        'target_strip': 'desk_strip',
+        'pattern': [{'color': '#ff0000', 'start': 0, 'end': 9}, {'color': '#00ff00', 'position': 12}] * 10,
+        'brightness': 100
+    },
+    'colorwipe': {'target_strip': 'desk_strip', 'bg_color': '#000000', 'wipe_color': '#0000ff', 'pixels': 5, 'speed': 20, 'seamless': True, 'brightness': 100},
+    'blink': {'target_strip': 'desk_strip', 'colors': ['#ff0000', '#00ff00', '#0000ff'], 'speed': 500, 'brightness': 100},
+    'pause': {'target_strip': 'desk_strip'}
+}
+
+def per_call_us(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+def main(number=200):
+    print('%-14s %16s %16s %9s' % ('route', 'validate (us)', 'compiled (us)', 'speedup'))
+    for route, payload in PAYLOADS.items():
+        schemas = rschema.route_schemas[route]
+
+        def uncompiled():
+            for schema in schemas:
+                jsonschema.validate(payload, schema)
+
+        def compiled():
+            rschema.validate(payload, route)
+
+        before = per_call_us(uncompiled, number)
+        after = per_call_us(compiled, number)
+        print('%-14s %16.1f %16.1f %8.1fx' % (route, before, after, before / after))
+
+if __name__ == '__main__':
+    main()
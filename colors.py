@@ -0,0 +1,71 @@
+"""
+Color helpers shared by the animation renderers. Colors are packed the same way rpi_ws281x.Color packs them (0x00RRGGBB)
+"""
+import sys
+from array import array
+from functools import lru_cache
+
+def pack_color(red, green, blue):
+    return (red << 16) | (green << 8) | blue
+
+"""
+Translates a color from a given hexcode color (#FFFFFF) to a packed color that can be used to set a pixel.
+Requests keep reusing the same handful of colors, so recent translations are memoized
+"""
+@lru_cache(maxsize=1024)
+def translate_color(color):
+    return pack_color(int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16))
+
+"""
+Generate rainbow colors across 0-255 positions
+"""
+def wheel(pos):
+    if pos < 85:
+        return pack_color(pos * 3, 255 - pos * 3, 0)
+    elif pos < 170:
+        pos -= 85
+        return pack_color(255 - pos * 3, 0, pos * 3)
+    else:
+        pos -= 170
+        return pack_color(0, pos * 3, 255 - pos * 3)
+
+# Every wheel position, precomputed once so renderers only ever index into it
+WHEEL = [wheel(pos) for pos in range(256)]
+
+"""
+Table taking each 8-bit channel value to its value at a brightness level (0-255), gamma corrected. Tables are bytes,
+so a whole frame of packed colors is scaled at once with bytes.translate, and each table is only ever worked out once.
+The unused top byte of a packed color is 0, and every table leaves 0 as 0
+"""
+@lru_cache(maxsize=1024)
+def brightness_table(level, gamma=1.0):
+    scale = min(max(level, 0), 255) / 255.0
+    return bytes(int(round(255 * ((value / 255.0) * scale) ** gamma)) for value in range(256))
+
+"""
+Convert raw 8-bit RGB triplets (as sent by streaming clients) into an array of packed colors, without a per-pixel loop:
+each channel is moved into place with one strided slice copy
+"""
+def rgb_to_packed(data):
+    count = len(data) // 3
+    data = bytes(data[:count * 3])
+    packed = bytearray(count * 4)
+    if sys.byteorder == 'little':
+        packed[0::4], packed[1::4], packed[2::4] = data[2::3], data[1::3], data[0::3]
+    else:
+        packed[1::4], packed[2::4], packed[3::4] = data[0::3], data[1::3], data[2::3]
+    pixels = array('I')
+    pixels.frombytes(packed)
+    return pixels
+
+"""
+Convert packed colors back into raw 8-bit RGB triplets, the reverse of rgb_to_packed
+"""
+def packed_to_rgb(pixels):
+    packed = pixels.tobytes()
+    data = bytearray(len(pixels) * 3)
+    if sys.byteorder == 'little':
+        data[0::3], data[1::3], data[2::3] = packed[2::4], packed[1::4], packed[0::4]
+    else:
+        data[0::3], data[1::3], data[2::3] = packed[1::4], packed[2::4], packed[3::4]
+    return bytes(data)
@@ -0,0 +1,359 @@
+"""
+The action behind each strip route, run against a strip with a payload that has already been validated.
+The routes, /batch and anything else that drives strips share these, so a command behaves the same wherever it comes from.
+"""
+import itertools
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from patterns import compile_pattern
+import plugins
+
+# Each strip's commands are run one at a time by its CommandQueue, and different strips' commands run side by side.
+# These only guard the last state of each strip, and queueing a batch so nothing lands between its commands
+_states_lock = threading.Lock()
+_submit_lock = threading.RLock()
+
+class CommandError(Exception):
+    def __init__(self, message, index=None):
+        super(CommandError, self).__init__(message)
+        self.message = message
+        # Position of the command in a batch, when it was refused as part of one
+        self.index = index
+
+#Sets the entire LED strip to a given color
+def set_color(target_strip, data):
+    #Stop any animation that's running on the strip
+    target_strip.stop_thread()
+
+    #Set the LEDStrip pixels to the given color
+    target_strip.set_color(data['color'])
+
+    #Update LED strip brightness
+    target_strip.set_brightness(data['brightness'])
+
+#Sets the LED strip to a given pattern
+def set_pattern(target_strip, data):
+    #Stop any animation that's running on the strip
+    target_strip.stop_thread()
+
+    #Set the LED strip to the given pattern, compiled into a per-pixel frame
+    target_strip.set_pattern(get_pattern(target_strip, data))
+
+    #Update LED strip brightness
+    target_strip.set_brightness(data['brightness'])
+
+#The pattern in a payload, compiled for the strip. Payloads recalled from a scene already carry it compiled
+def get_pattern(target_strip, data):
+    if 'compiled_pattern' in data:
+        return data['compiled_pattern']
+    return compile_pattern(data['pattern'], target_strip.num_leds)
+
+#Blend the animation a command starts in over the running one, when the payload asks for a crossfade
+def schedule_crossfade(target_strip, data):
+    if 'crossfade' in data:
+        target_strip.schedule_crossfade(data['crossfade'])
+
+#Sets the LED strip to wheel through the rainbow
+def start_rainbow(target_strip, data):
+    schedule_crossfade(target_strip, data)
+    target_strip.cycle_rainbow(data['color_interval'], data['speed'])
+    target_strip.set_brightness(data['brightness'])
+
+#Clear the LED strip and turn all LEDs off
+def clear(target_strip, data):
+    target_strip.stop_thread()
+    target_strip.clear()
+
+#Sends a color across the LED strip
+def color_wipe(target_strip, data):
+    schedule_crossfade(target_strip, data)
+    target_strip.color_wipe(data['bg_color'], data['wipe_color'], data['pixels'], data['speed'], data.get('seamless', False))
+    target_strip.set_brightness(data['brightness'])
+
+#Runs evenly spaced clusters of color along the LED strip
+def cluster_run(target_strip, data):
+    schedule_crossfade(target_strip, data)
+    target_strip.cluster_run(data['bg_color'], data['cluster_color'], data['cluster_size'], data['cluster_spacing'], data['speed'])
+    target_strip.set_brightness(data['brightness'])
+
+#Fades a color in and out on the whole strip
+def fade_color(target_strip, data):
+    target_strip.fade(data['color'], data['min_brightness'], data['max_brightness'], data['speed'])
+
+#Fades a pattern of colors in and out
+def fade_pattern(target_strip, data):
+    pattern = get_pattern(target_strip, data)
+    target_strip.fadePattern(pattern, data['min_brightness'], data['max_brightness'], data['speed'])
+
+#Blink the LED strip between a given array of colors
+def blink(target_strip, data):
+    schedule_crossfade(target_strip, data)
+    target_strip.blink(data['colors'], data['speed'])
+    target_strip.set_brightness(data['brightness'])
+
+#Play a timeline of keyframes, easing from each one into the next
+def timeline(target_strip, data):
+    schedule_crossfade(target_strip, data)
+    target_strip.timeline(data['keyframes'], data['speed'], data.get('loop', True))
+
+#Run an animation plugin, with the parameters its schema declares
+def plugin(target_strip, data):
+    schedule_crossfade(target_strip, data)
+    target_strip.start_plugin(data['plugin'], plugins.params(data), data['speed'])
+    target_strip.set_brightness(data['brightness'])
+
+#Pause a running animation
+def pause(target_strip, data):
+    error = pause_error('pause', target_strip.get_animation() is not None, target_strip.paused())
+    if error is not None:
+        raise CommandError(error)
+    target_strip.pause()
+
+#Resume a paused animation
+def resume(target_strip, data):
+    error = pause_error('resume', target_strip.get_animation() is not None, target_strip.paused())
+    if error is not None:
+        raise CommandError(error)
+    target_strip.resume()
+
+#Why pausing or resuming a strip with or without a running animation, paused or not, would fail, or None if it wouldn't
+def pause_error(command, running, paused):
+    if not running:
+        return 'No animation found'
+    if command == 'pause' and paused:
+        return 'Animation is already paused'
+    if command == 'resume' and not paused:
+        return 'Animation is not paused'
+    return None
+
+#Set the brightness of the LED strip, or of the pixels from start to end when they're given. Fades are relative to it
+def set_brightness(target_strip, data):
+    if 'start' in data:
+        target_strip.set_segment_brightness(data['start'], data['end'] + 1, data['brightness'])
+    else:
+        target_strip.set_brightness(data['brightness'])
+
+#Hand the strip over to a DDP stream, stopping any animation. Queued by the stream server rather than a route, so the
+#stream only takes the strip over between commands
+def stream(target_strip, data):
+    target_strip.start_streaming()
+
+"""
+Every command that can be run against a strip, by route name
+"""
+COMMANDS = {
+    'setcolor': set_color,
+    'setpattern': set_pattern,
+    'startrainbow': start_rainbow,
+    'clear': clear,
+    'colorwipe': color_wipe,
+    'clusterrun': cluster_run,
+    'fadecolor': fade_color,
+    'fadepattern': fade_pattern,
+    'blink': blink,
+    'timeline': timeline,
+    'plugin': plugin,
+    'pause': pause,
+    'resume': resume,
+    'setbrightness': set_brightness,
+    'stream': stream
+}
+
+"""
+Commands that leave an animation running, and ones that stop any animation and leave the strip still
+"""
+ANIMATION_COMMANDS = {'startrainbow', 'colorwipe', 'clusterrun', 'fadecolor', 'fadepattern', 'blink', 'timeline', 'plugin'}
+STILL_COMMANDS = {'setcolor', 'setpattern', 'clear'}
+
+"""
+Commands that set what a strip is showing, so the last one run on a strip describes its state (see scenes)
+"""
+STATE_COMMANDS = {'setcolor', 'setpattern', 'startrainbow', 'clear', 'colorwipe', 'clusterrun', 'fadecolor', 'fadepattern', 'blink', 'timeline', 'plugin'}
+
+# The last state command run on each strip, with its payload
+_states = weakref.WeakKeyDictionary()
+
+"""
+Run a command against a strip. Raises CommandError if the strip is in the wrong state for it
+"""
+def run(command, target_strip, data):
+    COMMANDS[command](target_strip, data)
+    with _states_lock:
+        if command in STATE_COMMANDS:
+            _states[target_strip] = (command, data)
+        elif command == 'setbrightness' and 'start' not in data and target_strip in _states:
+            # A new brightness for the whole strip carries over into the state it's showing
+            state_command, state_data = _states[target_strip]
+            if 'brightness' in state_data:
+                _states[target_strip] = (state_command, dict(state_data, brightness=data['brightness']))
+
+"""
+The last state command run on a strip, as (command, payload), or None if nothing has set what it's showing
+"""
+def get_state(target_strip):
+    with _states_lock:
+        return _states.get(target_strip)
+
+"""
+A command waiting in, or taken off, a strip's CommandQueue. Its status goes from queued to running to done or failed
+"""
+class Ticket():
+    def __init__(self, command_id, command, strip_name):
+        self.command_id = command_id
+        self.command = command
+        self.strip_name = strip_name
+        self.status = 'queued'
+        self.error = None
+        # The exception a failed command raised, other than a CommandError
+        self.exception = None
+        self.finished = threading.Event()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def state(self):
+        state = {'command_id': self.command_id, 'command': self.command, 'target_strip': self.strip_name, 'status': self.status}
+        if self.error is not None:
+            state['error'] = self.error
+        return state
+
+# The most recent tickets, by command id, so clients can look up commands they didn't wait for
+MAX_TICKETS = 1024
+_tickets = OrderedDict()
+_tickets_lock = threading.Lock()
+_command_ids = itertools.count(1)
+
+def get_ticket(command_id):
+    with _tickets_lock:
+        return _tickets.get(command_id)
+
+def _new_ticket(command, strip_name):
+    with _tickets_lock:
+        ticket = Ticket(next(_command_ids), command, strip_name)
+        _tickets[ticket.command_id] = ticket
+        while len(_tickets) > MAX_TICKETS:
+            _tickets.popitem(last=False)
+    return ticket
+
+"""
+Runs the commands sent to one strip in order, on a thread of its own, so a request only has to queue its command
+instead of waiting for a running animation to stop or a frame to be pushed
+"""
+class CommandQueue():
+    def __init__(self, strip_name, target_strip):
+        self.strip_name = strip_name
+        self.target_strip = target_strip
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self.__run, name='Commands-' + strip_name, daemon=True)
+        self._thread.start()
+
+    """
+    Queue a command with its validated payload, returning the Ticket that tracks it. Given a time.monotonic() start
+    time, an animation the command starts has its first frame then (see LEDStrip.schedule_start)
+    """
+    def submit(self, command, data, start=None):
+        with _submit_lock:
+            ticket = _new_ticket(command, self.strip_name)
+            self._queue.put((ticket, data, start))
+        return ticket
+
+    """
+    Block until every command queued so far has been run, or timeout seconds have passed. Returns whether it emptied
+    """
+    def drain(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    """
+    Stop after the command being run, failing any still queued instead of running them
+    """
+    def stop(self):
+        self.__fail_queued()
+        self._queue.put(None)
+        self._thread.join()
+
+    def __run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            ticket, data, start = item
+            ticket.status = 'running'
+            try:
+                if start is None:
+                    run(ticket.command, self.target_strip, data)
+                else:
+                    self.target_strip.schedule_start(start)
+                    try:
+                        run(ticket.command, self.target_strip, data)
+                    finally:
+                        self.target_strip.schedule_start(None)
+                ticket.status = 'done'
+            except CommandError as e:
+                ticket.status, ticket.error = 'failed', e.message
+            except Exception as e:
+                ticket.status, ticket.error, ticket.exception = 'failed', getattr(e, 'message', repr(e)), e
+            ticket.finished.set()
+            self._queue.task_done()
+
+        self._queue.task_done()
+        # Anything queued after stop was asked for never runs either
+        self.__fail_queued()
+
+    def __fail_queued(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                ticket, _, _ = item
+                ticket.status, ticket.error = 'failed', 'Strip was removed'
+                ticket.finished.set()
+            self._queue.task_done()
+
+"""
+Queue several commands, each on its own strip's CommandQueue, as (queue, command, payload). No other command is queued
+on any strip in between, so each strip runs its share of them back to back. Returns their Tickets, in order.
+
+With check, pauses and resumes are checked against the state the commands before them will leave their strip in, and
+nothing is queued if one would fail: a CommandError with its index is raised instead. To check against the strips'
+real state, their queues are emptied first, waiting up to timeout seconds. A CommandError without an index means
+a queue didn't empty in time
+"""
+def submit_all(entries, start=None, check=False, timeout=None):
+    with _submit_lock:
+        if check and any(command in ('pause', 'resume') for _, command, _ in entries):
+            _check_pauses(entries, timeout)
+        return [command_queue.submit(command, data, start) for command_queue, command, data in entries]
+
+def _check_pauses(entries, timeout):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # Whether each strip has an animation running, and whether it's paused, as the batch goes along
+    states = {}
+    for index, (command_queue, command, _) in enumerate(entries):
+        if command_queue not in states:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not command_queue.drain(remaining):
+                raise CommandError('Strip ' + command_queue.strip_name + ' is still running queued commands')
+            state = command_queue.target_strip.state()
+            states[command_queue] = (state['animation'] is not None, state['paused'])
+        running, paused = states[command_queue]
+        if command in ANIMATION_COMMANDS:
+            states[command_queue] = (True, False)
+        elif command in STILL_COMMANDS:
+            states[command_queue] = (False, False)
+        elif command in ('pause', 'resume'):
+            error = pause_error(command, running, paused)
+            if error is not None:
+                raise CommandError(error, index)
+            states[command_queue] = (running, command == 'pause')
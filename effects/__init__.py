@@ -0,0 +1,9 @@
+"""
+Animation plugins (see plugins). Each module here is a plugin named after the module, with:
+
+    SCHEMA                    JSON schema of the plugin's parameters
+    create(num_leds, **params) -> render(frame_index, t, buffer), drawing one frame into a FrameBuffer
+    period(num_leds, **params) -> frames in one cycle, optional, for animations that repeat
+
+Modules starting with an underscore aren't plugins.
+"""
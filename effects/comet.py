@@ -0,0 +1,39 @@
+"""
+A comet with a fading tail, travelling the length of the strip every `seconds` seconds
+"""
+from colors import pack_color, translate_color
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'color': {
+            'type': 'string',
+            'pattern': '^#[0-9a-fA-F]{6}$'
+        },
+        'tail': {
+            'type': 'integer',
+            'minimum': 1
+        },
+        'seconds': {
+            'type': 'number',
+            'exclusiveMinimum': 0
+        }
+    },
+    'required': ['color'],
+    'additionalProperties': False
+}
+
+def create(num_leds, color, tail=10, seconds=2.0):
+    color = translate_color(color)
+    red, green, blue = color >> 16 & 0xff, color >> 8 & 0xff, color & 0xff
+    # The comet's head first, then its tail getting dimmer
+    shades = [pack_color(red * (tail - i) // tail, green * (tail - i) // tail, blue * (tail - i) // tail) for i in range(tail)]
+
+    def render(frame_index, t, buffer):
+        head = int((t % seconds) / seconds * num_leds)
+        buffer.fill(0)
+        for i, shade in enumerate(shades):
+            if head - i < 0:
+                break
+            buffer[head - i] = shade
+    return render
@@ -0,0 +1,38 @@
+"""
+Every few pixels lit in one color, stepping along the strip a pixel per frame like a theatre marquee
+"""
+from array import array
+from colors import translate_color
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'color': {
+            'type': 'string',
+            'pattern': '^#[0-9a-fA-F]{6}$'
+        },
+        'bg_color': {
+            'type': 'string',
+            'pattern': '^#[0-9a-fA-F]{6}$'
+        },
+        'spacing': {
+            'type': 'integer',
+            'minimum': 2,
+            'maximum': 64
+        }
+    },
+    'required': ['color'],
+    'additionalProperties': False
+}
+
+def create(num_leds, color, bg_color='#000000', spacing=3):
+    color, bg_color = translate_color(color), translate_color(bg_color)
+
+    def render(frame_index, t, buffer):
+        offset = frame_index % spacing
+        buffer.fill(bg_color)
+        buffer[offset::spacing] = array('I', [color]) * len(range(offset, num_leds, spacing))
+    return render
+
+def period(num_leds, color, bg_color='#000000', spacing=3):
+    return spacing
@@ -0,0 +1,171 @@
+"""
+Live Server-Sent Events feeds of what each strip is showing, for previews.
+
+A strip's feed runs a thread of its own while anyone is subscribed. At most `fps` times a second it reads the frame the
+strip last pushed, which LEDStrip publishes copy-on-write, so the render loop does no extra work however many clients
+are watching. An unchanged frame is the same array as last time and costs nothing. A changed one is sent as a delta of
+only the runs of pixels that changed, or whole as a keyframe when most of it changed. State changes (a new animation,
+pausing, brightness) are sent as their own events. Each message is encoded once and the same bytes are handed to every
+subscriber.
+"""
+import json
+import queue
+import threading
+
+# A subscriber that falls this many messages behind is skipped ahead to a keyframe of the latest frame
+MAX_BACKLOG = 32
+
+class Subscriber():
+    def __init__(self):
+        self.messages = queue.Queue(MAX_BACKLOG)
+
+    """
+    The next message to send, or None once the feed has ended. Raises queue.Empty after timeout seconds without one
+    """
+    def get(self, timeout):
+        return self.messages.get(timeout=timeout)
+
+class StripFeed():
+    def __init__(self, strip_name, target_strip, fps=15):
+        self.strip_name = strip_name
+        self.target_strip = target_strip
+        self.interval = 1.0 / fps
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # The last frame sent and its frame number, and the last state sent, as JSON and as its encoded event
+        self._frame = None
+        self._count = 0
+        self._state_key = None
+        self._state = None
+
+    """
+    Add a subscriber, which starts with the current state and a keyframe
+    """
+    def subscribe(self):
+        subscriber = Subscriber()
+        with self._lock:
+            if self._state is None:
+                self._state_key, self._state = self.__encode_state()
+            if self._frame is None:
+                self._frame = self.target_strip.pixels()
+            subscriber.messages.put(self._state)
+            subscriber.messages.put(self.__keyframe(self._frame))
+            self.subscribers = self.subscribers + [subscriber]
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.__run, name='Feed-' + self.strip_name, daemon=True)
+                self._thread.start()
+        return subscriber
+
+    """
+    Remove a subscriber, stopping the feed's thread when it was the last
+    """
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers = [other for other in self.subscribers if other is not subscriber]
+            if self.subscribers or self._thread is None:
+                return
+            self._stop.set()
+            thread, self._thread = self._thread, None
+            self._frame = self._state_key = self._state = None
+        thread.join()
+
+    """
+    End the feed for every subscriber, with a final removed event
+    """
+    def close(self):
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        removed = _event('removed', {'target_strip': self.strip_name})
+        for subscriber in subscribers:
+            self.__send(subscriber, removed, True)
+            self.__send(subscriber, None, False)
+
+    def __run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.__publish()
+            except Exception as e:
+                print('Feed for ' + self.strip_name + ' failed: ' + repr(e))
+
+    """
+    Send any change in state, and the latest frame if it's a different one from the last sent
+    """
+    def __publish(self):
+        with self._lock:
+            subscribers = self.subscribers
+            state, message = self.__encode_state()
+            if state != self._state_key:
+                self._state_key, self._state = state, message
+                for subscriber in subscribers:
+                    self.__send(subscriber, message, False)
+
+            frame = self.target_strip.pixels()
+            if frame is self._frame:
+                return
+            previous, self._frame = self._frame, frame
+            self._count += 1
+            keyframe = None
+            message = self.__delta(previous, frame)
+            if message is None:
+                message = keyframe = self.__keyframe(frame)
+            for subscriber in subscribers:
+                if not self.__send(subscriber, message, False):
+                    # Too far behind to follow the deltas: start it again from the state and a keyframe
+                    keyframe = keyframe or self.__keyframe(frame)
+                    self.__send(subscriber, self._state, True)
+                    self.__send(subscriber, keyframe, False)
+
+    def __encode_state(self):
+        state = json.dumps(dict(self.target_strip.state(), target_strip=self.strip_name), sort_keys=True)
+        return state, ('event: state\ndata: ' + state + '\n\n').encode('utf-8')
+
+    def __keyframe(self, frame):
+        return _event('keyframe', {'frame': self._count, 'pixels': ['#%06x' % pixel for pixel in frame]})
+
+    """
+    A delta event with the runs of pixels that differ from the previous frame, or None when a keyframe is smaller
+    """
+    def __delta(self, previous, frame):
+        if previous is None or len(previous) != len(frame):
+            return None
+        changes = []
+        start = None
+        for index, (old, new) in enumerate(zip(previous, frame)):
+            if old != new:
+                if start is None:
+                    start = index
+            elif start is not None:
+                changes.append([start, ['#%06x' % pixel for pixel in frame[start:index]]])
+                start = None
+        if start is not None:
+            changes.append([start, ['#%06x' % pixel for pixel in frame[start:]]])
+        if sum(len(run) for _, run in changes) * 2 > len(frame):
+            return None
+        return _event('delta', {'frame': self._count, 'changes': changes})
+
+    """
+    Queue a message for a subscriber without waiting. With reset, anything it hasn't been sent yet is dropped first.
+    Returns False if it's too far behind to take it
+    """
+    def __send(self, subscriber, message, reset):
+        if reset:
+            try:
+                while True:
+                    subscriber.messages.get_nowait()
+            except queue.Empty:
+                pass
+        try:
+            subscriber.messages.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+def _event(name, data):
+    return ('event: ' + name + '\ndata: ' + json.dumps(data, separators=(',', ':')) + '\n\n').encode('utf-8')
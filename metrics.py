@@ -0,0 +1,137 @@
+"""
+Instrumentation for strips and routes, served by /stats as JSON and by /metrics in the Prometheus text format.
+
+Timings go into RingHistograms: a fixed array of the most recent samples, written in place, so recording a sample
+in the render loop never allocates or grows anything. Quantiles are worked out from the samples only when scraped.
+"""
+import threading
+from array import array
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+class RingHistogram():
+    def __init__(self, size=1024):
+        self.size = size
+        self.samples = array('d', [0.0]) * size
+        self.index = 0
+        # Lifetime totals, which keep counting after old samples are overwritten
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples[self.index] = value
+        self.index += 1
+        if self.index == self.size:
+            self.index = 0
+        self.count += 1
+        self.sum += value
+
+    """
+    Count, sum, quantiles and maximum of the samples, for reporting. Quantiles only cover the most recent samples
+    """
+    def snapshot(self):
+        count, total = self.count, self.sum
+        samples = sorted(self.samples[:min(count, self.size)])
+        summary = {'count': count, 'sum': total}
+        for quantile in QUANTILES:
+            summary['p' + str(int(quantile * 100))] = samples[min(len(samples) - 1, int(len(samples) * quantile))] if samples else 0.0
+        summary['max'] = samples[-1] if samples else 0.0
+        return summary
+
+"""
+Timings of one strip: drawing frames into the buffer, pushing them to the output, and starting and stopping animations
+"""
+class StripMetrics():
+    def __init__(self):
+        self.render = RingHistogram()
+        self.show = RingHistogram()
+        self.start = RingHistogram(64)
+        self.stop = RingHistogram(64)
+        # show() calls that pushed nothing, because the frame and brightness were the same as the last push
+        self.skipped_shows = 0
+
+    def snapshot(self):
+        return {
+            'skipped_shows': self.skipped_shows,
+            'render_seconds': self.render.snapshot(),
+            'show_seconds': self.show.snapshot(),
+            'start_seconds': self.start.snapshot(),
+            'stop_seconds': self.stop.snapshot()
+        }
+
+"""
+Timings of one route: the whole request, and validating its payload
+"""
+class RouteMetrics():
+    def __init__(self):
+        self.request = RingHistogram(256)
+        self.validation = RingHistogram(256)
+
+    def snapshot(self):
+        return {
+            'request_seconds': self.request.snapshot(),
+            'validation_seconds': self.validation.snapshot()
+        }
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+"""
+The metrics of a route, by route name (the URL rule without its leading slash)
+"""
+def route(name):
+    metrics = _routes.get(name)
+    if metrics is None:
+        with _routes_lock:
+            metrics = _routes.setdefault(name, RouteMetrics())
+    return metrics
+
+def route_snapshots():
+    return {name: metrics.snapshot() for name, metrics in list(_routes.items())}
+
+"""
+Render /stats data (strip and route snapshots) in the Prometheus text exposition format
+"""
+def prometheus_text(strips, routes):
+    lines = []
+
+    def summary(name, help_text, label, snapshots, key):
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s summary' % name)
+        for value, stats in snapshots.items():
+            if stats is None:
+                continue
+            histogram = stats[key]
+            labels = '%s="%s"' % (label, _escape(value))
+            for quantile in QUANTILES:
+                lines.append('%s{%s,quantile="%s"} %r' % (name, labels, quantile, histogram['p' + str(int(quantile * 100))]))
+            lines.append('%s_sum{%s} %r' % (name, labels, histogram['sum']))
+            lines.append('%s_count{%s} %d' % (name, labels, histogram['count']))
+
+    def sample(name, help_text, metric_type, label, values):
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, metric_type))
+        for value, number in values.items():
+            if number is not None:
+                lines.append('%s{%s="%s"} %r' % (name, label, _escape(value), number))
+
+    summary('ledstrip_render_seconds', 'Time to draw one frame into the frame buffer.', 'strip', strips, 'render_seconds')
+    summary('ledstrip_show_seconds', 'Time to push one frame to the output.', 'strip', strips, 'show_seconds')
+    summary('ledstrip_animation_start_seconds', 'Time to start an animation, including its thread.', 'strip', strips, 'start_seconds')
+    summary('ledstrip_animation_stop_seconds', 'Time to stop an animation and join its thread.', 'strip', strips, 'stop_seconds')
+
+    sample('ledstrip_skipped_shows_total', 'Pushes skipped because the frame had not changed.', 'counter', 'strip', {name: stats['skipped_shows'] for name, stats in strips.items() if stats is not None})
+
+    schedulers = {name: stats['scheduler'] for name, stats in strips.items() if stats is not None}
+    sample('ledstrip_requested_fps', 'Frame rate the running animation asks for.', 'gauge', 'strip', {name: s['requested_fps'] for name, s in schedulers.items()})
+    sample('ledstrip_achieved_fps', 'Frame rate the running animation is achieving.', 'gauge', 'strip', {name: s['achieved_fps'] for name, s in schedulers.items()})
+    sample('ledstrip_frames_total', 'Frames drawn since the running animation started.', 'counter', 'strip', {name: s['frames'] for name, s in schedulers.items()})
+    sample('ledstrip_late_frames_total', 'Frames drawn more than half an interval late since the running animation started.', 'counter', 'strip', {name: s['late_frames'] for name, s in schedulers.items()})
+    sample('ledstrip_dropped_frames_total', 'Frames skipped to catch up since the running animation started.', 'counter', 'strip', {name: s['dropped_frames'] for name, s in schedulers.items()})
+
+    summary('ledstrip_request_seconds', 'Time to handle a request.', 'route', routes, 'request_seconds')
+    summary('ledstrip_validation_seconds', 'Time to validate a request payload.', 'route', routes, 'validation_seconds')
+    return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,96 @@
+"""
+NumPy frame renderers for the built-in animations.
+
+Same factories and render(frame, buffer) contract as animations, but every frame is computed with
+whole-array operations written straight into the FrameBuffer's memory, without per-pixel Python.
+"""
+import numpy as np
+from animations import cluster_frame
+from colors import WHEEL
+
+WHEEL_LUT = np.array(WHEEL, dtype=np.uint32)
+
+"""
+A uint32 view sharing memory with the FrameBuffer, so writes land directly in the buffer
+"""
+def pixel_view(buffer):
+    return np.frombuffer(buffer.pixels, dtype=np.uint32)
+
+"""
+np.roll(base, shift) written into out, without allocating a new array every frame
+"""
+def roll_into(base, shift, out):
+    size = len(base)
+    out[:shift] = base[size - shift:]
+    out[shift:] = base[:size - shift]
+
+def rainbow(num_leds):
+    offsets = np.arange(num_leds, dtype=np.intp) * 256 // num_leds
+    index = np.empty(num_leds, dtype=np.intp)
+
+    def render(frame, buffer):
+        # Shift every pixel's wheel position by the frame number and look all of them up at once
+        np.add(offsets, frame, out=index)
+        np.bitwise_and(index, 255, out=index)
+        np.take(WHEEL_LUT, index, out=pixel_view(buffer))
+    return render
+
+def color_wipe(num_leds, bg_color, wipe_color, pixels, seamless):
+    pixels = min(pixels, num_leds)
+    base = np.full(num_leds, bg_color, dtype=np.uint32)
+    base[:pixels] = wipe_color
+
+    def render(frame, buffer):
+        counter = frame % num_leds
+        view = pixel_view(buffer)
+        if seamless:
+            roll_into(base, counter, view)
+        else:
+            view.fill(bg_color)
+            view[counter:counter + pixels] = wipe_color
+    return render
+
+def cluster_run(num_leds, bg_color, cluster_color, cluster_size, cluster_space):
+    base = np.array(cluster_frame(num_leds, bg_color, cluster_color, cluster_size, cluster_space), dtype=np.uint32)
+
+    def render(frame, buffer):
+        roll_into(base, frame % num_leds, pixel_view(buffer))
+    return render
+
+def blink(colors):
+    colors = np.array(colors, dtype=np.uint32)
+
+    def render(frame, buffer):
+        pixel_view(buffer).fill(colors[frame % len(colors)])
+    return render
+
+"""
+Each side is scaled and rounded down on its own before they're added, like animations.blend's tables, so both renderers
+give the same frames
+"""
+def blend(start, end, weight, buffer):
+    start = np.frombuffer(start, dtype=np.uint8).astype(np.uint16)
+    end = np.frombuffer(end, dtype=np.uint8).astype(np.uint16)
+    start *= 256 - weight
+    start >>= 8
+    end *= weight
+    end >>= 8
+    start += end
+    pixel_view(buffer).view(np.uint8)[:] = start
+
+def composite(mode, pixels, buffer, start):
+    view = pixel_view(buffer)[start:start + len(pixels)]
+    layer = np.frombuffer(pixels, dtype=np.uint32)
+    if mode == 'replace':
+        view[:] = layer
+    elif mode == 'over':
+        np.copyto(view, layer, where=layer != 0)
+    else:
+        bottom = view.view(np.uint8)
+        top = layer.view(np.uint8)
+        if mode == 'add':
+            bottom[:] = np.minimum(bottom.astype(np.uint16) + top, 255)
+        elif mode == 'max':
+            np.maximum(bottom, top, out=bottom)
+        else:
+            bottom[:] = bottom.astype(np.uint16) * top // 255
@@ -0,0 +1,64 @@
+"""
+Compiles /setpattern and /fadepattern payloads into a dense per-pixel frame once, so drawing a pattern never touches
+the JSON list of colors and positions again. Compiled patterns are cached by the pattern's contents and the strip length.
+"""
+from array import array
+from functools import lru_cache
+from colors import translate_color
+
+class CompiledPattern():
+    def __init__(self, pixels, spans, key):
+        # Dense frame with every covered pixel's packed color
+        self.pixels = pixels
+        # Runs of pixels the pattern actually sets, as (start, end) slices. Every other pixel is left as it was
+        self.spans = spans
+        self.key = key
+
+    """
+    Draw the pattern into a FrameBuffer, one slice copy per covered run
+    """
+    def apply(self, buffer):
+        for start, end in self.spans:
+            buffer[start:end] = self.pixels[start:end]
+
+"""
+A hashable copy of a pattern payload, used as its cache key
+"""
+def pattern_key(pattern):
+    key = []
+    for color_position in pattern:
+        if 'start' in color_position and 'end' in color_position:
+            key.append((color_position['color'], color_position['start'], color_position['end']))
+        else:
+            position = color_position['position']
+            key.append((color_position['color'], position, position))
+    return tuple(key)
+
+"""
+Compile a pattern payload for a strip of num_leds pixels
+"""
+def compile_pattern(pattern, num_leds):
+    return _compile(pattern_key(pattern), num_leds)
+
+@lru_cache(maxsize=64)
+def _compile(key, num_leds):
+    pixels = array('I', [0]) * num_leds
+    covered = bytearray(num_leds)
+
+    # Later entries overwrite earlier ones, the same as setting them one after another
+    for color, start, end in key:
+        end = min(end + 1, num_leds)
+        if start < end:
+            pixels[start:end] = array('I', [translate_color(color)]) * (end - start)
+            covered[start:end] = b'\x01' * (end - start)
+
+    spans = []
+    start = covered.find(1)
+    while start != -1:
+        end = covered.find(0, start)
+        if end == -1:
+            end = num_leds
+        spans.append((start, end))
+        start = covered.find(1, end)
+
+    return CompiledPattern(pixels, spans, key)
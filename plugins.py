@@ -0,0 +1,90 @@
+"""
+Animations added as plugins, without touching LEDStrip, the routes or the schemas.
+
+A plugin is a module in the effects package. It declares SCHEMA, a JSON schema for its own parameters, and
+create(num_leds, **params), which returns a pure render(frame_index, t, buffer) function drawing frame number
+frame_index, t seconds into the animation, into the strip's FrameBuffer. Optionally period(num_leds, **params) gives
+the frames in one cycle, so the first cycle is recorded into the frame cache and replayed after that.
+
+Plugins run as ordinary Animations, so they get the frame scheduler, caching, pausing, crossfades and metrics like
+the built-in animations, and POST /plugins/<name> takes the usual target_strip, speed, brightness and crossfade along
+with the plugin's parameters. Plugins are found by listing the effects package without importing anything, and each
+one is only imported the first time it's used.
+"""
+import importlib
+import json
+import pkgutil
+import threading
+import jsonschema
+import effects
+
+# The payload fields every plugin route takes, which aren't passed on to the plugin. Commands sent through /batch and
+# /schedule also name their command
+RESERVED = ('target_strip', 'plugin', 'speed', 'brightness', 'crossfade', 'command')
+
+class Plugin():
+    def __init__(self, name, module):
+        self.name = name
+        self.module = module
+        self.schema = getattr(module, 'SCHEMA', {'type': 'object'})
+        validator_class = jsonschema.validators.validator_for(self.schema)
+        validator_class.check_schema(self.schema)
+        self.validator = validator_class(self.schema)
+
+    """
+    The render(frame, buffer) function and period of the plugin for a strip of num_leds pixels drawing a frame every
+    interval milliseconds
+    """
+    def create(self, num_leds, params, interval):
+        render = self.module.create(num_leds, **params)
+        seconds = interval / 1000.0
+
+        def draw(frame, buffer):
+            render(frame, frame * seconds, buffer)
+        period = self.module.period(num_leds, **params) if hasattr(self.module, 'period') else None
+        return draw, period
+
+_plugins = {}
+_lock = threading.Lock()
+
+"""
+Names of every plugin in the effects package, without importing any of them
+"""
+def names():
+    return sorted(module.name for module in pkgutil.iter_modules(effects.__path__) if not module.name.startswith('_'))
+
+"""
+Get a plugin by name, importing it the first time. Raises KeyError if there's no such plugin
+"""
+def get(name):
+    with _lock:
+        if name not in _plugins:
+            if name not in names():
+                raise KeyError(name)
+            _plugins[name] = Plugin(name, importlib.import_module('effects.' + name))
+        return _plugins[name]
+
+"""
+The parameters a plugin payload passes on to the plugin
+"""
+def params(data):
+    return {key: value for key, value in data.items() if key not in RESERVED}
+
+"""
+A hashable key for a plugin and its parameters, used as its frame cache key
+"""
+def plugin_key(name, params):
+    return ('plugin', name, json.dumps(params, sort_keys=True))
+
+"""
+Validate a plugin payload's parameters against the plugin's schema, raising the same ValidationError jsonschema.validate
+would. An unknown plugin fails validation too
+"""
+def validate(data):
+    try:
+        plugin = get(data['plugin'])
+    except KeyError:
+        raise jsonschema.ValidationError('Plugin ' + data['plugin'] + " doesn't exist!")
+    error = jsonschema.exceptions.best_match(plugin.validator.iter_errors(params(data)))
+    if error is not None:
+        raise error
@@ -0,0 +1,75 @@
+"""
+The hardware a Raspberry Pi has for driving LED strips, and which strip holds each part of it.
+
+rpi_ws281x can drive strips from three peripherals: PWM (which has two channels), PCM and SPI, each on a few possible
+GPIO pins. Each output also needs a DMA channel of its own. Outputs claim the pin, peripheral and DMA channel they use from a
+ResourcePool, which refuses a claim that conflicts with one already held, instead of a fixed limit on the strip count.
+"""
+import threading
+
+"""
+GPIO pins that can drive a strip, with the peripheral behind each and the rpi_ws281x channel that peripheral needs
+"""
+PINS = {
+    12: ('PWM0', 0), 18: ('PWM0', 0), 40: ('PWM0', 0), 52: ('PWM0', 0),
+    13: ('PWM1', 1), 19: ('PWM1', 1), 41: ('PWM1', 1), 45: ('PWM1', 1), 53: ('PWM1', 1),
+    21: ('PCM', 0), 31: ('PCM', 0),
+    10: ('SPI', 0), 38: ('SPI', 0)
+}
+
+# Both PWM channels belong to one PWM block, which an rpi_ws281x PixelStrip sets up in full even when it only drives one
+# of them. Only a single PixelStrip can drive both channels, and every output here is a PixelStrip of its own, so an
+# output on either channel holds the whole block
+SHARED_PERIPHERALS = {'PWM0': 'PWM', 'PWM1': 'PWM'}
+
+# DMA channels that can be given to an output. Channel 0 is used by the GPU, and 15 isn't available to the library
+DMA_CHANNELS = range(1, 15)
+
+class ResourceError(Exception):
+    def __init__(self, message):
+        super(ResourceError, self).__init__(message)
+        self.message = message
+
+class ResourcePool():
+    def __init__(self):
+        # Owner of each claimed resource, by resource name ('GPIO 18', 'PWM', 'DMA 10')
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    """
+    Claim every resource a strip's outputs need, given as (pin, dma, channel) for each output. Nothing is claimed
+    if any of them is unusable or already held, and a ResourceError says which one
+    """
+    def claim(self, owner, outputs):
+        wanted = []
+        for pin, dma, channel in outputs:
+            if pin not in PINS:
+                raise ResourceError('GPIO ' + str(pin) + ' cannot drive an LED strip!')
+            peripheral, expected_channel = PINS[pin]
+            if channel != expected_channel:
+                raise ResourceError('GPIO ' + str(pin) + ' is on ' + peripheral + ', which needs channel ' + str(expected_channel) + '!')
+            if dma not in DMA_CHANNELS:
+                raise ResourceError('DMA channel ' + str(dma) + ' cannot be used!')
+            wanted.extend(['GPIO ' + str(pin), SHARED_PERIPHERALS.get(peripheral, peripheral), 'DMA ' + str(dma)])
+
+        with self._lock:
+            for resource in wanted:
+                if resource in self._owners:
+                    raise ResourceError(resource + ' is already used by ' + self._owners[resource] + '!')
+            if len(set(wanted)) != len(wanted):
+                duplicate = next(resource for resource in wanted if wanted.count(resource) > 1)
+                raise ResourceError(owner + ' uses ' + duplicate + ' more than once!')
+            for resource in wanted:
+                self._owners[resource] = owner
+
+    def release(self, owner):
+        with self._lock:
+            for resource in [resource for resource, holder in self._owners.items() if holder == owner]:
+                del self._owners[resource]
+
+    """
+    Owner of every claimed resource, by resource name
+    """
+    def claims(self):
+        with self._lock:
+            return dict(self._owners)
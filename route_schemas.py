@@ -1,3 +1,8 @@
+import time
+import jsonschema
+import metrics
+import plugins
+from resources import PINS
 
 base_schema = {
     'type': 'object',
@@ -19,6 +24,24 @@ brightness_schema = {
     'required':['brightness']
 }
 
+brightness_segment_schema = {
+    'type': 'object',
+    'properties' : {
+        'start':{
+            'type': 'integer',
+            'minimum': 0
+        },
+        'end':{
+            'type': 'integer',
+            'minimum': 0
+        }
+    },
+    'dependentRequired': {
+        'start': ['end'],
+        'end': ['start']
+    }
+}
+
 fade_brightness_schema = {
     'type': 'object',
     'properties' : {
@@ -113,6 +136,71 @@ pattern_schema = {
     'required':['pattern']
 }
 
+plugin_schema = {
+    'type': 'object',
+    'properties': {
+        'plugin': {'type': 'string'}
+    },
+    'required': ['plugin']
+}
+
+crossfade_schema = {
+    'type': 'object',
+    'properties': {
+        'crossfade': {
+            'type': 'number',
+            'minimum': 0
+        }
+    }
+}
+
+timeline_schema = {
+    'type': 'object',
+    'properties': {
+        'keyframes': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'color': {
+                        'type': 'string',
+                        'pattern': '^#[0-9a-fA-F]{6}$'
+                    },
+                    'pattern': pattern_schema['properties']['pattern'],
+                    'brightness': {
+                        'type': 'integer',
+                        'minimum': 0,
+                        'maximum': 255
+                    },
+                    'duration': {
+                        'type': 'number',
+                        'minimum': 0
+                    },
+                    'hold': {
+                        'type': 'number',
+                        'minimum': 0
+                    },
+                    'easing': {
+                        'type': 'string',
+                        'enum': ['linear', 'ease_in', 'ease_out', 'ease_in_out', 'step']
+                    }
+                },
+                'oneOf': [
+                    {
+                        'required': ['color']
+                    },
+                    {
+                        'required': ['pattern']
+                    }
+                ]
+            }
+        },
+        'loop': {'type': 'boolean'}
+    },
+    'required': ['keyframes']
+}
+
 add_strip_schema = {
     "type": "object",
     "properties": {
@@ -120,7 +208,7 @@ add_strip_schema = {
         "LED_COUNT": {"type": "integer"},
         'LED_PIN': {
             'type': 'integer',
-            'enum': [12, 18, 40, 52, 13, 19, 41, 45, 53]},
+            'enum': sorted(PINS)},
         "LED_FREQ_HZ": {"type": "integer"},
         "LED_DMA": {"type": "integer"},
         "LED_INVERT": {"type": "boolean"},
@@ -128,11 +216,33 @@ add_strip_schema = {
             'type': 'integer',
             'minimum': 0,
             'maximum': 255
+        },
+        "GAMMA": {
+            "type": "number",
+            "minimum": 0.1,
+            "maximum": 5
+        },
+        "BACKEND": {
+            "type": "string",
+            "enum": ["ws281x", "simulated", "null"]
+        },
+        "CHAIN": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "LED_COUNT": {"type": "integer", "minimum": 1},
+                    "LED_PIN": {"type": "integer", "enum": sorted(PINS)},
+                    "LED_DMA": {"type": "integer"},
+                    "LED_CHANNEL": {"type": "integer", "enum": [0, 1]}
+                },
+                "required": ["LED_COUNT", "LED_PIN", "LED_DMA", "LED_CHANNEL"]
+            }
         }
     },
     "if":{
         "properties":{
-            "LED_PIN": {"enum":[12, 18, 40, 52]}
+            "LED_PIN": {"enum":sorted(pin for pin, (_, channel) in PINS.items() if channel == 0)}
         }
     },
     "then":{
@@ -150,6 +260,36 @@ add_strip_schema = {
     "required": ["STRIP_NAME", "LED_COUNT", "LED_PIN", "LED_FREQ_HZ", "LED_DMA", "LED_INVERT", "LED_BRIGHTNESS", "LED_CHANNEL"]
 }
 
+add_segment_schema = {
+    'type': 'object',
+    'properties': {
+        'STRIP_NAME': {'type': 'string'},
+        'spans': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'strip': {'type': 'string'},
+                    'start': {
+                        'type': 'integer',
+                        'minimum': 0
+                    },
+                    'end': {
+                        'type': 'integer',
+                        'minimum': 0
+                    },
+                    'blend': {
+                        'type': 'string',
+                        'enum': ['replace', 'over', 'add', 'max', 'multiply']
+                    }
+                },
+                'required': ['strip', 'start', 'end']
+            }
+        }
+    },
+    'required': ['STRIP_NAME', 'spans']
+}
 
 color_wipe_schema = {
     'type': 'object',
@@ -239,4 +379,135 @@ start_rainbow_schema = {
         'color_interval':{'type': 'number'}
     },
     'required':['color_interval']
-}
\ No newline at end of file
+}
+batch_schema = {
+    'type': 'object',
+    'properties': {
+        'commands': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'command': {
+                        'type': 'string',
+                        'enum': ['setcolor', 'setpattern', 'startrainbow', 'clear', 'colorwipe', 'clusterrun', 'fadecolor', 'fadepattern', 'blink', 'timeline', 'plugin', 'pause', 'resume', 'setbrightness']
+                    }
+                },
+                'required': ['command']
+            },
+            'minItems': 1
+        },
+        'sync': {'type': 'boolean'}
+    },
+    'required': ['commands']
+}
+schedule_schema = {
+    'type': 'object',
+    'properties': {
+        'name': {'type': 'string'},
+        'cron': {'type': 'string'},
+        'sun': {
+            'type': 'string',
+            'enum': ['sunrise', 'sunset']
+        },
+        'offset': {'type': 'number'},
+        'scene': {'type': 'string'},
+        'command': {
+            'type': 'object',
+            'properties': {
+                'command': {
+                    'type': 'string',
+                    'enum': ['setcolor', 'setpattern', 'startrainbow', 'clear', 'colorwipe', 'clusterrun', 'fadecolor', 'fadepattern', 'blink', 'timeline', 'plugin', 'pause', 'resume', 'setbrightness']
+                }
+            },
+            'required': ['command']
+        }
+    },
+    'allOf': [
+        {'oneOf': [{'required': ['cron']}, {'required': ['sun']}]},
+        {'oneOf': [{'required': ['scene']}, {'required': ['command']}]}
+    ],
+    'dependentRequired': {'offset': ['sun']}
+}
+recall_scene_schema = {
+    'type': 'object',
+    'properties': {
+        'strips': {
+            'type': 'array',
+            'items': {'type': 'string'},
+            'uniqueItems': True
+        }
+    }
+}
+save_scene_schema = {
+    'type': 'object',
+    'properties': {
+        'strips': {
+            'type': 'array',
+            'items': {'type': 'string'},
+            'uniqueItems': True
+        },
+        'tags': {
+            'type': 'array',
+            'items': {
+                'type': 'string',
+                'pattern': '^[^,]+$'
+            },
+            'uniqueItems': True
+        }
+    }
+}
+
+"""
+The schemas each route validates its payload against, in the order they're checked
+"""
+route_schemas = {
+    'setcolor': [base_schema, color_schema, brightness_schema],
+    'setpattern': [base_schema, pattern_schema, brightness_schema],
+    'startrainbow': [base_schema, start_rainbow_schema, speed_schema, brightness_schema, crossfade_schema],
+    'clear': [base_schema],
+    'colorwipe': [base_schema, color_wipe_schema, speed_schema, brightness_schema, crossfade_schema],
+    'clusterrun': [base_schema, cluster_run_schema, brightness_schema, speed_schema, crossfade_schema],
+    'fadecolor': [base_schema, color_schema, fade_brightness_schema, speed_schema],
+    'fadepattern': [base_schema, pattern_schema, fade_brightness_schema, speed_schema],
+    'blink': [base_schema, color_array_schema, speed_schema, brightness_schema, crossfade_schema],
+    'timeline': [base_schema, timeline_schema, speed_schema, crossfade_schema],
+    'plugin': [base_schema, plugin_schema, speed_schema, brightness_schema, crossfade_schema],
+    'pause': [base_schema],
+    'resume': [base_schema],
+    'setbrightness': [base_schema, brightness_schema, brightness_segment_schema],
+    'addstrip': [add_strip_schema],
+    'addsegment': [add_segment_schema],
+    'removestrip': [base_schema],
+    'batch': [batch_schema],
+    'schedule': [schedule_schema],
+    'recallscene': [recall_scene_schema],
+    'savescene': [save_scene_schema]
+}
+
+"""
+Combine schemas into one and build its validator. jsonschema.validate checks the schema itself and builds a new
+validator on every call, so routes use validators compiled once here instead
+"""
+def compile_validator(*schemas):
+    schema = {'allOf': list(schemas)}
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+route_validators = {route: compile_validator(*schemas) for route, schemas in route_schemas.items()}
+
+"""
+Validate a route's payload with its compiled validator, raising the same ValidationError jsonschema.validate would.
+Plugin payloads are then checked against the plugin's own schema
+"""
+def validate(data, route):
+    started = time.perf_counter()
+    try:
+        error = jsonschema.exceptions.best_match(route_validators[route].iter_errors(data))
+        if error is not None:
+            raise error
+        if route == 'plugin':
+            plugins.validate(data)
+    finally:
+        metrics.route(route).validation.observe(time.perf_counter() - started)
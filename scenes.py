@@ -0,0 +1,276 @@
+"""
+Scenes: named snapshots of what each strip is showing, kept on disk so they can be recalled later and so every strip
+comes back to its last scene after a restart.
+
+A strip's part of a scene is the command that set what it's showing, with its payload. Patterns are also saved
+compiled, as their packed frame and the runs of pixels they cover, so recalling one never compiles the JSON again.
+
+The store is a single append-only file of records, memory-mapped when it's opened. Only the record headers are read
+then, to index every scene by name and tag, so recalling a scene is one dict lookup and one read of its record however
+many scenes are stored. Saving appends a record that replaces any earlier one of the same name, and the file is
+rewritten without the replaced records once they make up most of it.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from patterns import CompiledPattern, compile_pattern
+
+MAGIC = b'LEDSCN1\n'
+
+# Record kinds: a scene, a deleted scene, and the last scene a strip showed
+SCENE, DELETED, LAST = 1, 2, 3
+
+# Kind, name length, tags length and body length, ahead of the name, the comma-separated tags and the body
+HEADER = struct.Struct('<BHHI')
+
+# Rewrite the file once replaced records take up more than this many bytes and half of it
+COMPACT_BYTES = 64 * 1024
+
+class SceneError(Exception):
+    def __init__(self, message):
+        super(SceneError, self).__init__(message)
+        self.message = message
+
+class SceneStore():
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # (body offset, body length, tags, record length) of each scene, by name
+        self._scenes = {}
+        # Names of the scenes with each tag
+        self._tags = {}
+        # Name of the last scene each strip showed, by strip name
+        self._last = {}
+        self._dead = 0
+        self._file = None
+        self._map = None
+        self.__open()
+
+    """
+    Save a scene from each strip's (command, payload, compiled pattern or None), by strip name
+    """
+    def save(self, name, states, tags=()):
+        for tag in tags:
+            if ',' in tag:
+                raise SceneError('Tag ' + tag + ' cannot contain a comma!')
+        with self._lock:
+            start = self.__append(SCENE, name, ','.join(tags), _encode(states))
+            for strip_name in states:
+                self.__append(LAST, strip_name, '', name.encode('utf-8'))
+            self.__remap(start)
+
+    """
+    Each strip's (command, payload, compiled pattern or None) in a scene, by strip name. Raises KeyError if there's no
+    scene with that name
+    """
+    def load(self, name):
+        with self._lock:
+            offset, length, _, _ = self._scenes[name]
+            return _decode(self._map[offset:offset + length])
+
+    def delete(self, name):
+        with self._lock:
+            if name not in self._scenes:
+                raise KeyError(name)
+            self.__remap(self.__append(DELETED, name, '', b''))
+
+    """
+    Remember that strips are showing a scene, so they come back to it on the next start
+    """
+    def set_last(self, name, strip_names):
+        with self._lock:
+            start = None
+            for strip_name in strip_names:
+                offset = self.__append(LAST, strip_name, '', name.encode('utf-8'))
+                start = offset if start is None else start
+            if start is not None:
+                self.__remap(start)
+
+    """
+    Name of the last scene each strip showed, by strip name, leaving out scenes that have since been deleted
+    """
+    def last(self):
+        with self._lock:
+            return {strip_name: name for strip_name, name in self._last.items() if name in self._scenes}
+
+    """
+    Names and tags of every scene, or only of the scenes with a tag
+    """
+    def list(self, tag=None):
+        with self._lock:
+            names = self._scenes if tag is None else self._tags.get(tag, ())
+            return {name: list(self._scenes[name][2]) for name in sorted(names)}
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._scenes
+
+    def close(self):
+        with self._lock:
+            self._map.close()
+            self._file.close()
+
+    def __open(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, 'wb') as f:
+                f.write(MAGIC)
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise SceneError(self.path + ' is not a scene file!')
+        end = self.__index(len(MAGIC))
+        if end < len(self._map):
+            # A record cut short by a crash mid-write is dropped
+            self._map.close()
+            self._file.truncate(end)
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    """
+    Read the headers of the records from offset on into the indexes, skipping over the bodies. Returns where the last
+    whole record ends
+    """
+    def __index(self, offset):
+        if offset == len(MAGIC):
+            self._scenes, self._tags, self._last, self._dead = {}, {}, {}, 0
+        size = len(self._map)
+        while offset + HEADER.size <= size:
+            kind, name_length, tags_length, body_length = HEADER.unpack_from(self._map, offset)
+            start = offset + HEADER.size
+            body = start + name_length + tags_length
+            end = body + body_length
+            if end > size:
+                break
+            name = self._map[start:start + name_length].decode('utf-8')
+            tags = self._map[start + name_length:body].decode('utf-8')
+            self.__apply(kind, name, tuple(tags.split(',')) if tags else (), body, body_length, end - offset)
+            offset = end
+        return offset
+
+    def __apply(self, kind, name, tags, body, body_length, record_length):
+        if kind == LAST:
+            if name in self._last:
+                self._dead += record_length
+            self._last[name] = self._map[body:body + body_length].decode('utf-8')
+            return
+        if name in self._scenes:
+            _, _, old_tags, old_record_length = self._scenes.pop(name)
+            self._dead += old_record_length
+            for tag in old_tags:
+                self._tags[tag].discard(name)
+        if kind == SCENE:
+            self._scenes[name] = (body, body_length, tags, record_length)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(name)
+        else:
+            self._dead += record_length
+
+    """
+    Write a record at the end of the file, returning where it starts
+    """
+    def __append(self, kind, name, tags, body):
+        name_bytes, tags_bytes = name.encode('utf-8'), tags.encode('utf-8')
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(HEADER.pack(kind, len(name_bytes), len(tags_bytes), len(body)) + name_bytes + tags_bytes + body)
+        return offset
+
+    """
+    Map the file again after appending records from offset on, index them, and rewrite the file if it's mostly
+    replaced records
+    """
+    def __remap(self, offset):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__index(offset)
+        if self._dead > COMPACT_BYTES and self._dead * 2 > len(self._map):
+            self.__compact()
+
+    def __compact(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC)
+            for name, (offset, length, tags, _) in self._scenes.items():
+                name_bytes, tags_bytes = name.encode('utf-8'), ','.join(tags).encode('utf-8')
+                f.write(HEADER.pack(SCENE, len(name_bytes), len(tags_bytes), length) + name_bytes + tags_bytes)
+                f.write(self._map[offset:offset + length])
+            for strip_name, name in self._last.items():
+                if name in self._scenes:
+                    strip_bytes, name_bytes = strip_name.encode('utf-8'), name.encode('utf-8')
+                    f.write(HEADER.pack(LAST, len(strip_bytes), 0, len(name_bytes)) + strip_bytes + name_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        self._map.close()
+        self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__index(len(MAGIC))
+
+"""
+The state a command leaves a strip of num_leds pixels in, as saved in a scene: the command, its payload without the
+target strip, and for patterns the compiled pattern
+"""
+def capture(command, data, num_leds):
+    pattern = data.get('compiled_pattern')
+    data = {key: value for key, value in data.items() if key not in ('target_strip', 'compiled_pattern')}
+    if pattern is None and 'pattern' in data:
+        pattern = compile_pattern(data['pattern'], num_leds)
+    return command, data, pattern
+
+"""
+The payload that puts a strip back into its state in a scene. A compiled pattern is only used if it was compiled for
+a strip of the same length
+"""
+def payload(strip_name, state, num_leds):
+    _, data, pattern = state
+    data = dict(data, target_strip=strip_name)
+    if pattern is not None and len(pattern.pixels) == num_leds:
+        data['compiled_pattern'] = pattern
+    return data
+
+"""
+A scene body: the length of a JSON header, the header, and then the packed frames of its compiled patterns, in
+little-endian byte order
+"""
+def _encode(states):
+    header = {}
+    frames = []
+    offset = 0
+    for strip_name, (command, data, pattern) in states.items():
+        entry = {'command': command, 'data': data}
+        if pattern is not None:
+            entry['pattern'] = {'offset': offset, 'count': len(pattern.pixels), 'spans': pattern.spans, 'key': pattern.key}
+            frames.append(_little_endian(pattern.pixels))
+            offset += len(pattern.pixels) * pattern.pixels.itemsize
+        header[strip_name] = entry
+    header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return struct.pack('<I', len(header)) + header + b''.join(frames)
+
+def _decode(body):
+    header_length, = struct.unpack_from('<I', body)
+    frames = 4 + header_length
+    states = {}
+    for strip_name, entry in json.loads(body[4:frames].decode('utf-8')).items():
+        pattern = None
+        if 'pattern' in entry:
+            compiled = entry['pattern']
+            start = frames + compiled['offset']
+            pixels = array('I')
+            pixels.frombytes(body[start:start + compiled['count'] * pixels.itemsize])
+            if sys.byteorder == 'big':
+                pixels.byteswap()
+            key = tuple(tuple(span) for span in compiled['key'])
+            pattern = CompiledPattern(pixels, [tuple(span) for span in compiled['spans']], key)
+        states[strip_name] = (entry['command'], entry['data'], pattern)
+    return states
+
+def _little_endian(pixels):
+    if sys.byteorder == 'big':
+        pixels = array('I', pixels)
+        pixels.byteswap()
+    return pixels.tobytes()
@@ -0,0 +1,245 @@
+"""
+Runs jobs at set times from inside the server: cron-like jobs on a five-field cron expression in local time, and sun
+jobs some minutes before or after sunrise or sunset at init.json's location.
+
+Jobs wait in a heap ordered by when they're next due, and the scheduler thread sleeps until the earliest one instead of
+polling. Adding or removing a job wakes it to look at the heap again. Jobs are kept in a JSON file, so they survive
+restarts.
+"""
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+# Shorthands for common cron expressions
+CRON_MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@hourly': '0 * * * *'
+}
+
+# (lowest, highest) value of each cron field: minute, hour, day of month, month and day of week (0 or 7 is Sunday)
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# How far ahead to look for the next run before deciding a job never runs again
+SEARCH_DAYS = 366 * 4 + 1
+
+class ScheduleError(Exception):
+    def __init__(self, message):
+        super(ScheduleError, self).__init__(message)
+        self.message = message
+
+"""
+A parsed cron expression, as the set of values each field matches
+"""
+class Cron():
+    def __init__(self, expression):
+        expression = CRON_MACROS.get(expression.strip(), expression)
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ScheduleError('Cron expression ' + expression + ' needs 5 fields: minute hour day month weekday')
+        self.minutes, self.hours, self.days, self.months, weekdays = [_parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)]
+        self.weekdays = set(day % 7 for day in weekdays)
+        # With both days of the month and of the week restricted, a day matching either one matches, as in cron
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    """
+    The first time after `after` (a timestamp) that the expression matches, as a timestamp, or None if it never does
+    """
+    def next_time(self, after):
+        moment = datetime.fromtimestamp(after).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end = moment + timedelta(days=SEARCH_DAYS)
+        while moment < end:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self.__day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        return None
+
+    def __day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = _parse_number(step, 1, high)
+        if part == '*':
+            first, last = low, high
+        elif '-' in part:
+            first, last = (_parse_number(value, low, high) for value in part.split('-', 1))
+        else:
+            first = _parse_number(part, low, high)
+            last = high if step > 1 else first
+        if first > last:
+            raise ScheduleError('Cron range ' + part + ' is backwards')
+        values.update(range(first, last + 1, step))
+    return values
+
+def _parse_number(value, low, high):
+    if not value.isdigit() or not low <= int(value) <= high:
+        raise ScheduleError('Cron value ' + value + ' is not between ' + str(low) + ' and ' + str(high))
+    return int(value)
+
+"""
+Time of sunrise or sunset on a day (UTC) at a latitude and longitude (degrees, east positive), as a timestamp, or None
+when the sun doesn't rise or set that day. Uses the sunrise equation, which is good to about a minute
+"""
+def sun_time(day, latitude, longitude, event):
+    # Days since noon on 1 January 2000, at solar noon of the longitude
+    mean_noon = day.toordinal() - date(2000, 1, 1).toordinal() + 0.0008 - longitude / 360.0
+    anomaly = math.radians((357.5291 + 0.98560028 * mean_noon) % 360)
+    center = 1.9148 * math.sin(anomaly) + 0.02 * math.sin(2 * anomaly) + 0.0003 * math.sin(3 * anomaly)
+    ecliptic = math.radians((math.degrees(anomaly) + center + 180 + 102.9372) % 360)
+    transit = 2451545.0 + mean_noon + 0.0053 * math.sin(anomaly) - 0.0069 * math.sin(2 * ecliptic)
+    declination = math.asin(math.sin(ecliptic) * math.sin(math.radians(23.4397)))
+    latitude = math.radians(latitude)
+    cos_hour = (math.sin(math.radians(-0.833)) - math.sin(latitude) * math.sin(declination)) / (math.cos(latitude) * math.cos(declination))
+    if not -1 <= cos_hour <= 1:
+        return None
+    hour_angle = math.degrees(math.acos(cos_hour)) / 360.0
+    julian = transit - hour_angle if event == 'sunrise' else transit + hour_angle
+    return (julian - 2440587.5) * 86400
+
+"""
+When a job is next due after `after` (a timestamp), or None if it never runs again. location is (latitude, longitude)
+"""
+def next_run(job, after, location=None):
+    if 'cron' in job:
+        return Cron(job['cron']).next_time(after)
+    if location is None:
+        raise ScheduleError('Sun jobs need a "location" with a latitude and longitude in init.json')
+    offset = job.get('offset', 0) * 60
+    today = datetime.fromtimestamp(after, timezone.utc).date()
+    for days in range(-1, SEARCH_DAYS):
+        due = sun_time(today + timedelta(days=days), location[0], location[1], job['sun'])
+        if due is not None and due + offset > after:
+            return due + offset
+    return None
+
+class Scheduler():
+    def __init__(self, path, run_job, location=None):
+        self.path = path
+        # Called on the scheduler thread with each job when it's due
+        self.run_job = run_job
+        self.location = location
+        self.jobs = {}
+        # (due, job id) of every job with a next run. Entries for removed jobs are skipped when they come up
+        self._heap = []
+        self._due = {}
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.__load()
+
+    """
+    Add a job, returning it with its id and when it's next due. Raises ScheduleError if its time can't be worked out
+    """
+    def add(self, job):
+        with self._condition:
+            job = dict(job, id=next(self._ids))
+            due = next_run(job, time.time(), self.location)
+            self.jobs[job['id']] = job
+            self.__push(job['id'], due)
+            self.__save()
+            self._condition.notify()
+        return dict(job, next_run=due)
+
+    def remove(self, job_id):
+        with self._condition:
+            del self.jobs[job_id]
+            self._due.pop(job_id, None)
+            self.__save()
+            self._condition.notify()
+
+    """
+    Every job, with when it's next due as a timestamp (None if never)
+    """
+    def list(self):
+        with self._condition:
+            return [dict(job, next_run=self._due.get(job_id)) for job_id, job in sorted(self.jobs.items())]
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.__run, name='Scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __push(self, job_id, due):
+        if due is None:
+            self._due.pop(job_id, None)
+            return
+        self._due[job_id] = due
+        heapq.heappush(self._heap, (due, job_id))
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    # Drop entries for jobs that were removed or have been pushed back since
+                    while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                        heapq.heappop(self._heap)
+                    if self._heap and self._heap[0][0] <= time.time():
+                        break
+                    self._condition.wait(self._heap[0][0] - time.time() if self._heap else None)
+                if not self._running:
+                    return
+                due, job_id = heapq.heappop(self._heap)
+                job = self.jobs[job_id]
+                self.__push(job_id, next_run(job, max(due, time.time()), self.location))
+            try:
+                self.run_job(job)
+            except Exception as e:
+                print('Scheduled job ' + str(job_id) + ' failed: ' + repr(e))
+
+    def __load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            jobs = json.load(f)
+        now = time.time()
+        for job in jobs:
+            self.jobs[job['id']] = job
+            try:
+                self.__push(job['id'], next_run(job, now, self.location))
+            except ScheduleError as e:
+                print('Scheduled job ' + str(job['id']) + ' will not run: ' + e.message)
+        self._ids = itertools.count(max(self.jobs, default=0) + 1)
+
+    """
+    Write the jobs to a temporary file and move it over the old one, so a crash never leaves half a file
+    """
+    def __save(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(list(self.jobs.values()), f, indent=4)
+        os.replace(temporary, self.path)
@@ -0,0 +1,85 @@
+"""
+Virtual strips: an LEDStrip made of ranges (spans) of one or more physical strips. A virtual strip runs its own effect
+like any other strip, but its output backend writes each frame into layers on the strips it spans instead of to
+hardware. A strip with layers composites them over its own frame, each with its blend mode, and pushes the result
+once per frame that any of them changed, from the render engine's tick when there is one.
+
+A named range of a single strip (a segment) is a virtual strip with one span. Several segments on one strip each run
+their own effect, and the strip still shows everything in a single push.
+"""
+from array import array
+from backends import OutputBackend
+from LEDStrip import LEDStrip
+
+# Use the vectorized compositing when NumPy is installed, and the pure-Python one otherwise
+try:
+    import np_animations as animations
+except ImportError:
+    import animations
+
+BLEND_MODES = ['replace', 'over', 'add', 'max', 'multiply']
+
+class SegmentError(Exception):
+    def __init__(self, message):
+        super(SegmentError, self).__init__(message)
+        self.message = message
+
+"""
+The pixels a virtual strip last showed on one range of a strip, from start up to (not including) end
+"""
+class Layer():
+    def __init__(self, start, end, blend='replace'):
+        self.start = start
+        self.end = end
+        self.blend = blend
+        self.pixels = array('I', [0]) * (end - start)
+
+    def apply(self, buffer):
+        animations.composite(self.blend, self.pixels, buffer, self.start)
+
+"""
+Output backend of a virtual strip: each frame is split across its layers, in order, and the strips holding the
+layers are marked as changed, so their compositors push them on their next frame
+"""
+class LayerBackend(OutputBackend):
+    def __init__(self, spans):
+        # (strip, Layer) for each span, in order along the virtual strip
+        self.spans = spans
+        super(LayerBackend, self).__init__(sum(len(layer.pixels) for _, layer in spans))
+
+    def begin(self):
+        for strip, layer in self.spans:
+            strip.add_layer(layer)
+
+    def show(self, pixels):
+        offset = 0
+        for _, layer in self.spans:
+            size = len(layer.pixels)
+            layer.pixels[:] = pixels[offset:offset + size]
+            offset += size
+        for strip, _ in self.spans:
+            strip.mark_changed()
+
+    def close(self):
+        for strip, layer in self.spans:
+            strip.remove_layer(layer)
+
+"""
+Check span payloads ({'strip', 'start', 'end', 'blend'}, with an inclusive end) against the strips they name,
+raising SegmentError for a strip that doesn't exist or a range that doesn't fit on it
+"""
+def check_spans(spans, strips):
+    for span in spans:
+        if span['strip'] not in strips:
+            raise SegmentError('Strip ' + span['strip'] + " doesn't exist!")
+        if span['start'] > span['end'] or span['end'] >= strips[span['strip']].num_leds:
+            raise SegmentError('Pixels ' + str(span['start']) + '-' + str(span['end']) + ' are not on strip ' + span['strip'] + '!')
+
+"""
+Create a virtual strip from span payloads, over strips looked up by name
+"""
+def create_virtual_strip(spans, strips, engine=None):
+    check_spans(spans, strips)
+    layers = [(strips[span['strip']], Layer(span['start'], span['end'] + 1, span.get('blend', 'replace'))) for span in spans]
+    backend = LayerBackend(layers)
+    return LEDStrip(backend.num_leds, LED_PIN=None, engine=engine, backend=backend)
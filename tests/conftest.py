@@ -0,0 +1,36 @@
+import os
+import sys
+
+# The modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json
+import pytest
+
+"""
+Path of an init.json with one simulated strip, desk, and its files in a temporary directory
+"""
+@pytest.fixture
+def config_path(tmp_path):
+    config = {
+        'strips': [{'STRIP_NAME': 'desk', 'LED_COUNT': 10, 'LED_PIN': 18, 'LED_FREQ_HZ': 800000, 'LED_DMA': 10, 'LED_BRIGHTNESS': 255, 'LED_INVERT': False, 'LED_CHANNEL': 0, 'BACKEND': 'simulated'}],
+        'lock_file': str(tmp_path / 'lock'),
+        'scene_file': str(tmp_path / 'scenes.bin'),
+        'schedule_file': str(tmp_path / 'schedule.json')
+    }
+    path = tmp_path / 'init.json'
+    path.write_text(json.dumps(config))
+    return str(path)
+
+"""
+The app started from config_path. It's shut down again after the test, ready to be started afresh by the next one
+"""
+@pytest.fixture
+def server(config_path):
+    import app
+    app.create_app(config_path)
+    try:
+        yield app
+    finally:
+        app.shutdown(0)
+        app.Started = app.Draining = False
@@ -0,0 +1,56 @@
+import ctypes
+import sys
+import types
+from array import array
+from backends import ChainBackend, SimulatedBackend, Ws281xBackend
+
+def test_chain_splits_each_frame_across_its_outputs_in_order():
+    first, second = SimulatedBackend(3), SimulatedBackend(5)
+    chain = ChainBackend([first, second])
+    assert chain.num_leds == 8
+    chain.begin()
+    chain.show(array('I', range(1, 9)))
+    assert list(first.last_frame()) == [1, 2, 3]
+    assert list(second.last_frame()) == [4, 5, 6, 7, 8]
+
+def test_chain_sets_brightness_on_every_output():
+    outputs = [SimulatedBackend(2), SimulatedBackend(2)]
+    chain = ChainBackend(outputs)
+    chain.set_brightness(40)
+    assert chain.get_brightness() == 40
+    assert [output.get_brightness() for output in outputs] == [40, 40]
+
+def test_chain_closes_every_output():
+    closed = []
+
+    class Output(SimulatedBackend):
+        def close(self):
+            closed.append(self)
+    outputs = [Output(2), Output(2)]
+    ChainBackend(outputs).close()
+    assert closed == outputs
+
+def test_ws281x_frames_are_copied_into_the_channel_buffer_in_one_go(monkeypatch):
+    # Stands in for the driver's LED buffer, which it allocates when the strip begins
+    leds = (ctypes.c_uint32 * 4)()
+
+    class PixelStrip():
+        def __init__(self, *args):
+            self._channel = 'channel'
+            self.shows = 0
+
+        def begin(self):
+            pass
+
+        def show(self):
+            self.shows += 1
+
+        def __setitem__(self, pos, value):
+            raise AssertionError('Pixels were set one at a time')
+    monkeypatch.setitem(sys.modules, 'rpi_ws281x', types.SimpleNamespace(PixelStrip=PixelStrip))
+    monkeypatch.setitem(sys.modules, '_rpi_ws281x', types.SimpleNamespace(ws2811_channel_t_leds_get=lambda channel: ctypes.addressof(leds)))
+    backend = Ws281xBackend(4)
+    backend.begin()
+    backend.show(array('I', [0xff0000, 0xff00, 0xff, 0xffffff]))
+    assert list(leds) == [0xff0000, 0xff00, 0xff, 0xffffff]
+    assert backend.strip.shows == 1
@@ -0,0 +1,42 @@
+import time
+
+RAINBOW = {'command': 'startrainbow', 'target_strip': 'desk', 'color_interval': 10, 'speed': 20, 'brightness': 100}
+SHELF = {'STRIP_NAME': 'shelf', 'LED_COUNT': 10, 'LED_PIN': 21, 'LED_FREQ_HZ': 800000, 'LED_DMA': 11, 'LED_BRIGHTNESS': 255, 'LED_INVERT': False, 'LED_CHANNEL': 0, 'BACKEND': 'simulated'}
+
+def test_an_invalid_command_queues_nothing(server):
+    client = server.app.test_client()
+    before = client.post('/clear?wait=true', json={'target_strip': 'desk'}).json['command_id']
+    response = client.post('/batch', json={'commands': [RAINBOW, {'command': 'setcolor', 'target_strip': 'desk'}]})
+    assert response.status_code == 400 and response.json['index'] == 1
+    after = client.post('/clear?wait=true', json={'target_strip': 'desk'}).json['command_id']
+    assert after == before + 1
+    assert server.Strips['desk'].state()['animation'] is None
+
+def test_a_pause_is_checked_against_the_commands_before_it(server):
+    response = server.app.test_client().post('/batch?wait=true', json={'commands': [RAINBOW, {'command': 'pause', 'target_strip': 'desk'}]})
+    assert response.status_code == 201, response.json
+    assert server.Strips['desk'].state()['paused']
+
+def test_a_pause_that_would_fail_refuses_the_whole_batch(server):
+    client = server.app.test_client()
+    before = client.post('/clear?wait=true', json={'target_strip': 'desk'}).json['command_id']
+    response = client.post('/batch?wait=true', json={'commands': [{'command': 'setcolor', 'target_strip': 'desk', 'color': '#ff0000', 'brightness': 100}, {'command': 'pause', 'target_strip': 'desk'}]})
+    assert response.status_code == 400
+    assert response.json == {'error': 'No animation found', 'index': 1, 'applied': 0}
+    assert client.post('/clear?wait=true', json={'target_strip': 'desk'}).json['command_id'] == before + 1
+
+def test_a_resume_is_checked_against_the_strips_state(server):
+    client = server.app.test_client()
+    assert client.post('/startrainbow?wait=true', json=dict(RAINBOW)).status_code == 201
+    response = client.post('/batch', json={'commands': [{'command': 'resume', 'target_strip': 'desk'}]})
+    assert response.status_code == 400 and response.json['error'] == 'Animation is not paused'
+
+def test_synced_animations_share_their_first_frame(server):
+    client = server.app.test_client()
+    assert client.post('/addstrip', json=SHELF).status_code == 201
+    requested = time.monotonic()
+    response = client.post('/batch?wait=true', json={'sync': True, 'commands': [RAINBOW, dict(RAINBOW, target_strip='shelf')]})
+    assert response.status_code == 201, response.json
+    desk, shelf = server.Strips['desk'].scheduler.start, server.Strips['shelf'].scheduler.start
+    assert desk == shelf
+    assert desk >= requested + server.BATCH_SYNC_DELAY
@@ -0,0 +1,128 @@
+import threading
+import time
+import pytest
+import commands
+from LEDStrip import LEDStrip
+
+class Strip():
+    def __init__(self):
+        self.calls = []
+        self.start_at = None
+
+    def schedule_start(self, start):
+        self.start_at = start
+
+"""
+Commands that record what they ran, and one that holds its queue until released
+"""
+@pytest.fixture
+def recorded(monkeypatch):
+    release = threading.Event()
+
+    def record(target_strip, data):
+        target_strip.calls.append((data['name'], target_strip.start_at))
+
+    def hold(target_strip, data):
+        release.wait(5)
+
+    def fail(target_strip, data):
+        raise ValueError('broken')
+    monkeypatch.setitem(commands.COMMANDS, 'record', record)
+    monkeypatch.setitem(commands.COMMANDS, 'hold', hold)
+    monkeypatch.setitem(commands.COMMANDS, 'fail', fail)
+    yield release
+    release.set()
+
+def test_commands_run_in_order_and_tickets_follow_them(recorded):
+    strip = Strip()
+    queue = commands.CommandQueue('desk', strip)
+    held = queue.submit('hold', {})
+    tickets = [queue.submit('record', {'name': name}) for name in 'abc']
+    assert held.wait(1) is False
+    assert [ticket.status for ticket in tickets] == ['queued'] * 3
+    assert held.status == 'running'
+    recorded.set()
+    assert queue.drain(5)
+    assert [ticket.status for ticket in tickets] == ['done'] * 3
+    assert [name for name, _ in strip.calls] == ['a', 'b', 'c']
+    assert commands.get_ticket(tickets[0].command_id) is tickets[0]
+    assert tickets[0].state() == {'command_id': tickets[0].command_id, 'command': 'record', 'target_strip': 'desk', 'status': 'done'}
+    queue.stop()
+
+def test_failed_commands_record_their_error(recorded):
+    queue = commands.CommandQueue('desk', LEDStrip(5, backend='simulated'))
+    paused = queue.submit('pause', {})
+    broken = queue.submit('fail', {})
+    assert queue.drain(5)
+    assert (paused.status, paused.error, paused.exception) == ('failed', 'No animation found', None)
+    assert broken.status == 'failed' and isinstance(broken.exception, ValueError)
+    assert broken.state()['error'] == "ValueError('broken')"
+    queue.stop()
+
+def test_drain_gives_up_after_its_timeout(recorded):
+    queue = commands.CommandQueue('desk', Strip())
+    queue.submit('hold', {})
+    assert queue.drain(0.05) is False
+    recorded.set()
+    assert queue.drain(5)
+    queue.stop()
+
+def test_stop_fails_queued_commands_instead_of_running_them(recorded):
+    strip = Strip()
+    queue = commands.CommandQueue('desk', strip)
+    held = queue.submit('hold', {})
+    queued = queue.submit('record', {'name': 'late'})
+    # Stop once the held command is running, or it would be failed along with the queued one
+    while held.status != 'running':
+        time.sleep(0.001)
+    stopper = threading.Thread(target=queue.stop)
+    stopper.start()
+    assert queued.wait(5)
+    assert (queued.status, queued.error) == ('failed', 'Strip was removed')
+    recorded.set()
+    stopper.join(5)
+    assert held.status == 'done'
+    assert strip.calls == []
+
+def test_submit_all_queues_on_each_strip_with_the_start_time(recorded):
+    desk, shelf = Strip(), Strip()
+    desk_queue, shelf_queue = commands.CommandQueue('desk', desk), commands.CommandQueue('shelf', shelf)
+    entries = [(desk_queue, 'record', {'name': 'a'}), (shelf_queue, 'record', {'name': 'b'}), (desk_queue, 'record', {'name': 'c'})]
+    tickets = commands.submit_all(entries, 12.5)
+    assert [ticket.strip_name for ticket in tickets] == ['desk', 'shelf', 'desk']
+    assert desk_queue.drain(5) and shelf_queue.drain(5)
+    assert desk.calls == [('a', 12.5), ('c', 12.5)]
+    assert shelf.calls == [('b', 12.5)]
+    # The start time only applies to the batch's own commands
+    assert desk.start_at is None
+    desk_queue.stop()
+    shelf_queue.stop()
+
+def test_state_commands_are_remembered(recorded):
+    strip = LEDStrip(5, backend='simulated')
+    commands.run('setcolor', strip, {'color': '#ff0000', 'brightness': 100})
+    commands.run('setbrightness', strip, {'brightness': 50})
+    assert commands.get_state(strip) == ('setcolor', {'color': '#ff0000', 'brightness': 50})
+
+def test_routes_acknowledge_straight_away_or_once_run_with_wait(server):
+    client = server.app.test_client()
+    payload = {'target_strip': 'desk', 'color': '#ff0000', 'brightness': 100}
+    queued = client.post('/setcolor', json=payload)
+    assert queued.status_code == 202
+    server.Queues['desk'].drain(5)
+    assert client.get('/command/' + str(queued.json['command_id'])).json['status'] == 'done'
+    assert client.post('/setcolor?wait=true', json=payload).status_code == 201
+    failed = client.post('/pause?wait=1', json={'target_strip': 'desk'})
+    assert failed.status_code == 400 and failed.json['error'] == 'No animation found'
+    assert client.get('/command/999999').status_code == 404
+
+def test_a_wait_that_runs_out_is_still_acknowledged(server, recorded):
+    server.Queues['desk'].submit('hold', {})
+    response = server.app.test_client().post('/setcolor?wait=0.05', json={'target_strip': 'desk', 'color': '#ff0000', 'brightness': 100})
+    assert response.status_code == 202 and response.json['status'] == 'queued'
+
+def test_saving_a_scene_gives_up_on_a_busy_strip(server, recorded, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_WAIT', 0.05)
+    server.Queues['desk'].submit('hold', {})
+    response = server.app.test_client().put('/scene/evening', json={})
+    assert response.status_code == 503
@@ -0,0 +1,60 @@
+import json
+import threading
+from feeds import StripFeed
+from LEDStrip import LEDStrip
+
+def parse(message):
+    event, data = message.decode('utf-8').rstrip('\n').split('\n')
+    return event[len('event: '):], json.loads(data[len('data: '):])
+
+def open_stream(server, strip_name='desk'):
+    return server.app.test_client().get('/strips/' + strip_name + '/events', buffered=False)
+
+def test_a_stream_starts_with_the_state_and_a_keyframe(server):
+    response = open_stream(server)
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    messages = response.iter_encoded()
+    event, state = parse(next(messages))
+    assert event == 'state' and state['target_strip'] == 'desk'
+    event, keyframe = parse(next(messages))
+    assert event == 'keyframe' and len(keyframe['pixels']) == 10
+    response.close()
+
+def test_closing_a_stream_gives_its_slot_back(server, monkeypatch):
+    monkeypatch.setattr(server, 'Event_stream_slots', threading.BoundedSemaphore(1))
+    first = open_stream(server)
+    next(first.iter_encoded())
+    refused = open_stream(server)
+    assert refused.status_code == 503
+    first.close()
+    second = open_stream(server)
+    assert second.status_code == 200
+    second.close()
+    assert server.Feeds['desk'].subscribers == []
+
+def test_an_unknown_strip_has_no_stream(server):
+    assert open_stream(server, 'shelf').status_code == 404
+
+def test_an_idle_stream_sends_keepalives(server, monkeypatch):
+    monkeypatch.setattr(server, 'FEED_KEEPALIVE', 0.01)
+    response = open_stream(server)
+    messages = response.iter_encoded()
+    next(messages)
+    next(messages)
+    assert next(messages) == b': keepalive\n\n'
+    response.close()
+
+def test_small_changes_are_sent_as_deltas():
+    strip = LEDStrip(10, backend='simulated')
+    feed = StripFeed('desk', strip, fps=100)
+    subscriber = feed.subscribe()
+    subscriber.get(1)
+    subscriber.get(1)
+    strip.set_pattern([{'color': '#ff0000', 'start': 2, 'end': 3}])
+    event, delta = parse(subscriber.get(1))
+    assert event == 'delta'
+    assert delta == {'frame': 1, 'changes': [[2, ['#ff0000', '#ff0000']]]}
+    feed.close()
+    assert parse(subscriber.get(1)) == ('removed', {'target_strip': 'desk'})
+    assert subscriber.get(1) is None
+    strip.close()
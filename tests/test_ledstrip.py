@@ -0,0 +1,65 @@
+import time
+from LEDStrip import LEDStrip
+from backends import ChainBackend, SimulatedBackend
+
+def make_strip(num_leds=10, **kwargs):
+    return LEDStrip(num_leds, backend='simulated', **kwargs)
+
+def test_set_color_shows_the_color_on_every_pixel():
+    strip = make_strip()
+    strip.set_color('#ff8000')
+    assert list(strip.backend.last_frame()) == [0xff8000] * 10
+    assert list(strip.pixels()) == [0xff8000] * 10
+    strip.close()
+
+def test_brightness_is_applied_in_software():
+    strip = make_strip(LED_BRIGHTNESS=128)
+    strip.set_color('#ff0000')
+    red = strip.backend.last_frame()[0] >> 16
+    assert 126 <= red <= 129
+    # The hardware stays at full brightness
+    assert strip.backend.get_brightness() == 255
+    strip.close()
+
+def test_pattern_covers_only_its_pixels():
+    strip = make_strip()
+    strip.set_pattern([{'color': '#00ff00', 'start': 2, 'end': 4}, {'color': '#0000ff', 'position': 8}])
+    assert list(strip.pixels()) == [0, 0, 0xff00, 0xff00, 0xff00, 0, 0, 0, 0xff, 0]
+    strip.close()
+
+def test_an_unchanged_frame_is_not_pushed_again():
+    strip = make_strip()
+    strip.set_color('#ffffff')
+    shows = strip.backend.shows
+    strip.set_color('#ffffff')
+    assert strip.backend.shows == shows
+    strip.close()
+
+def test_chained_outputs_make_one_longer_strip():
+    chain = [{'LED_COUNT': 4, 'LED_PIN': 21, 'LED_DMA': 11, 'LED_CHANNEL': 0}]
+    strip = make_strip(6, chain=chain)
+    assert strip.num_leds == 10
+    assert isinstance(strip.backend, ChainBackend)
+    strip.set_pattern([{'color': '#ffffff', 'start': 5, 'end': 6}])
+    first, second = strip.backend.outputs
+    assert list(first.last_frame()) == [0] * 5 + [0xffffff]
+    assert list(second.last_frame()) == [0xffffff, 0, 0, 0]
+    strip.close()
+
+def test_animation_runs_pauses_and_stops():
+    backend = SimulatedBackend(10)
+    strip = LEDStrip(10, backend=backend)
+    strip.blink(['#ff0000', '#0000ff'], 5)
+    time.sleep(0.1)
+    assert strip.animation_state()['name'] == 'blink'
+    assert backend.shows > 2
+    strip.pause()
+    assert strip.paused()
+    time.sleep(0.02)
+    shows = backend.shows
+    time.sleep(0.05)
+    assert backend.shows == shows
+    strip.resume()
+    strip.stop_thread()
+    assert strip.animation_state() is None
+    strip.close()
@@ -0,0 +1,42 @@
+import fcntl
+import json
+import os
+import pytest
+import app
+
+@pytest.fixture
+def held_lock(config_path):
+    with open(config_path) as f:
+        lock_file = json.load(f)['lock_file']
+    other = open(lock_file, 'a+')
+    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    yield other
+    other.close()
+
+def test_a_held_lock_stops_the_app_starting(config_path, held_lock):
+    with pytest.raises(RuntimeError):
+        app.create_app(config_path)
+    assert not app.Started
+    assert app.Strips == {}
+
+def test_requests_are_turned_away_until_the_app_can_start(config_path, held_lock, monkeypatch):
+    # Requests start the app from init.json in the working directory
+    monkeypatch.chdir(os.path.dirname(config_path))
+    client = app.app.test_client()
+    try:
+        for route in ('/strips', '/schedule', '/scenes'):
+            response = client.get(route)
+            assert response.status_code == 503
+            assert 'could not start' in response.json['error']
+        held_lock.close()
+        assert client.get('/strips').status_code == 200
+        assert client.get('/schedule').status_code == 200
+        assert 'desk' in app.Strips
+    finally:
+        app.shutdown(0)
+        app.Started = app.Draining = False
+
+def test_shutdown_turns_requests_away(server):
+    server.shutdown(0)
+    assert server.app.test_client().get('/strips').status_code == 503
+    assert server.Strips == {}
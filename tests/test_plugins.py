@@ -0,0 +1,32 @@
+import plugins
+
+COMET = {'command': 'plugin', 'plugin': 'comet', 'target_strip': 'desk', 'color': '#ff8000', 'speed': 20, 'brightness': 255}
+
+def test_plugins_are_listed_without_importing_them():
+    assert {'comet', 'theater_chase'} <= set(plugins.names())
+
+def test_route_fields_are_not_passed_to_the_plugin():
+    assert plugins.params(dict(COMET, crossfade=100)) == {'color': '#ff8000'}
+
+def test_plugin_route_starts_the_plugin(server):
+    payload = {key: value for key, value in COMET.items() if key not in ('command', 'plugin')}
+    response = server.app.test_client().post('/plugins/comet?wait=true', json=payload)
+    assert response.status_code == 201
+    assert server.Strips['desk'].animation_state()['name'] == 'comet'
+
+def test_plugin_parameters_are_checked_against_the_plugin_schema(server):
+    payload = {key: value for key, value in COMET.items() if key not in ('command', 'plugin')}
+    response = server.app.test_client().post('/plugins/comet', json=dict(payload, tail=0))
+    assert response.status_code == 400
+
+def test_plugin_commands_run_in_a_batch(server):
+    response = server.app.test_client().post('/batch?wait=true', json={'commands': [COMET]})
+    assert response.status_code == 201, response.json
+    assert server.Strips['desk'].animation_state()['name'] == 'comet'
+
+def test_plugin_commands_can_be_scheduled(server):
+    response = server.app.test_client().post('/schedule', json={'cron': '@daily', 'command': COMET})
+    assert response.status_code == 201, response.json
+    server.run_job(response.json)
+    server.Queues['desk'].drain()
+    assert server.Strips['desk'].animation_state() == {'name': 'comet', 'params': {'color': '#ff8000', 'interval': 20}}
@@ -0,0 +1,99 @@
+import pytest
+import app
+from resources import ResourceError, ResourcePool
+
+def test_claims_every_resource_an_output_needs():
+    pool = ResourcePool()
+    pool.claim('desk', [(18, 10, 0)])
+    assert pool.claims() == {'GPIO 18': 'desk', 'PWM': 'desk', 'DMA 10': 'desk'}
+
+def test_pins_on_different_peripherals_can_be_used_together():
+    pool = ResourcePool()
+    pool.claim('pwm', [(18, 10, 0)])
+    pool.claim('pcm', [(21, 12, 0)])
+    pool.claim('spi', [(10, 5, 0)])
+    assert set(pool.claims().values()) == {'pwm', 'pcm', 'spi'}
+
+def test_two_pins_on_pwm0_conflict():
+    pool = ResourcePool()
+    pool.claim('desk', [(18, 10, 0)])
+    with pytest.raises(ResourceError) as error:
+        pool.claim('shelf', [(12, 11, 0)])
+    assert error.value.message == 'PWM is already used by desk!'
+
+def test_the_two_pwm_channels_are_one_peripheral():
+    pool = ResourcePool()
+    pool.claim('desk', [(18, 10, 0)])
+    with pytest.raises(ResourceError) as error:
+        pool.claim('shelf', [(13, 11, 1)])
+    assert error.value.message == 'PWM is already used by desk!'
+    with pytest.raises(ResourceError) as error:
+        pool.claim('shelf', [(21, 11, 0), (19, 12, 1)])
+    assert error.value.message == 'PWM is already used by desk!'
+
+@pytest.mark.parametrize('first, second', [(21, 31), (10, 38)])
+def test_two_pins_on_pcm_or_spi_conflict(first, second):
+    pool = ResourcePool()
+    pool.claim('desk', [(first, 10, 0)])
+    with pytest.raises(ResourceError):
+        pool.claim('shelf', [(second, 11, 0)])
+
+def test_dma_channel_conflicts():
+    pool = ResourcePool()
+    pool.claim('desk', [(18, 10, 0)])
+    with pytest.raises(ResourceError) as error:
+        pool.claim('shelf', [(21, 10, 0)])
+    assert error.value.message == 'DMA 10 is already used by desk!'
+
+@pytest.mark.parametrize('output, message', [
+    ((4, 10, 0), 'GPIO 4 cannot drive an LED strip!'),
+    ((13, 10, 0), 'GPIO 13 is on PWM1, which needs channel 1!'),
+    ((18, 0, 0), 'DMA channel 0 cannot be used!'),
+    ((18, 15, 0), 'DMA channel 15 cannot be used!')
+])
+def test_unusable_outputs_are_refused(output, message):
+    pool = ResourcePool()
+    with pytest.raises(ResourceError) as error:
+        pool.claim('desk', [output])
+    assert error.value.message == message
+    assert pool.claims() == {}
+
+def test_a_failed_claim_claims_nothing():
+    pool = ResourcePool()
+    pool.claim('desk', [(18, 10, 0)])
+    with pytest.raises(ResourceError):
+        # The first output is free, the chained one clashes with desk
+        pool.claim('shelf', [(21, 11, 0), (12, 12, 0)])
+    assert 'shelf' not in pool.claims().values()
+
+def test_a_chain_cannot_use_a_resource_twice():
+    pool = ResourcePool()
+    with pytest.raises(ResourceError) as error:
+        pool.claim('desk', [(18, 10, 0), (21, 10, 0)])
+    assert error.value.message == 'desk uses DMA 10 more than once!'
+    with pytest.raises(ResourceError) as error:
+        pool.claim('desk', [(18, 10, 0), (13, 11, 1)])
+    assert error.value.message == 'desk uses PWM more than once!'
+    assert pool.claims() == {}
+
+def test_release_frees_only_the_owners_resources():
+    pool = ResourcePool()
+    pool.claim('desk', [(18, 10, 0)])
+    pool.claim('shelf', [(21, 11, 0)])
+    pool.release('desk')
+    assert set(pool.claims().values()) == {'shelf'}
+    pool.claim('desk', [(12, 10, 0)])
+
+def test_tearing_down_a_strip_releases_its_resources():
+    app.setup_strip('test-desk', 30, 18, 800000, 10, 255, False, 0, 'simulated')
+    try:
+        assert 'test-desk' in app.Resources.claims().values()
+    finally:
+        app.teardown_strip('test-desk')
+    assert 'test-desk' not in app.Resources.claims().values()
+
+def test_a_strip_that_fails_to_start_releases_its_resources():
+    with pytest.raises(ValueError):
+        app.setup_strip('test-desk', 30, 18, 800000, 10, 255, False, 0, 'no-such-backend')
+    assert 'test-desk' not in app.Resources.claims().values()
+    assert 'test-desk' not in app.Strips
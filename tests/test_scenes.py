@@ -0,0 +1,142 @@
+import os
+import struct
+import pytest
+import scenes
+from patterns import compile_pattern
+
+RED = ('setcolor', {'color': '#ff0000', 'brightness': 100}, None)
+
+def pattern_state(num_leds=10):
+    data = {'pattern': [{'color': '#00ff00', 'start': 2, 'end': 4}], 'brightness': 255}
+    return 'setpattern', data, compile_pattern(data['pattern'], num_leds)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'scenes.bin')
+
+def test_a_new_file_starts_with_the_magic(path):
+    scenes.SceneStore(path).close()
+    with open(path, 'rb') as f:
+        assert f.read() == scenes.MAGIC
+
+def test_records_are_a_header_then_name_tags_and_body(path):
+    store = scenes.SceneStore(path)
+    store.save('evening', {'desk': RED}, ['warm', 'dim'])
+    store.close()
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = len(scenes.MAGIC)
+    kind, name_length, tags_length, body_length = scenes.HEADER.unpack_from(data, offset)
+    assert (kind, name_length, tags_length) == (scenes.SCENE, len('evening'), len('warm,dim'))
+    start = offset + scenes.HEADER.size
+    assert data[start:start + name_length + tags_length] == b'eveningwarm,dim'
+    body = data[start + name_length + tags_length:start + name_length + tags_length + body_length]
+    assert scenes._decode(body) == {'desk': RED}
+    # Followed by the record of the last scene desk showed
+    offset = start + name_length + tags_length + body_length
+    assert scenes.HEADER.unpack_from(data, offset) == (scenes.LAST, len('desk'), 0, len('evening'))
+
+def test_scenes_survive_reopening(path):
+    store = scenes.SceneStore(path)
+    store.save('evening', {'desk': RED, 'shelf': pattern_state()}, ['warm'])
+    store.close()
+    store = scenes.SceneStore(path)
+    states = store.load('evening')
+    assert states['desk'] == RED
+    command, data, pattern = states['shelf']
+    assert (command, data) == pattern_state()[:2]
+    assert list(pattern.pixels) == list(pattern_state()[2].pixels)
+    assert pattern.spans == pattern_state()[2].spans
+    assert store.list() == {'evening': ['warm']}
+    assert store.last() == {'desk': 'evening', 'shelf': 'evening'}
+    store.close()
+
+def test_saving_again_replaces_the_scene_and_its_tags(path):
+    store = scenes.SceneStore(path)
+    store.save('evening', {'desk': RED}, ['warm'])
+    store.save('evening', {'desk': pattern_state()}, ['cool'])
+    assert store.load('evening')['desk'][0] == 'setpattern'
+    assert store.list('warm') == {}
+    assert store.list('cool') == {'evening': ['cool']}
+    store.close()
+
+def test_deleted_scenes_stay_deleted(path):
+    store = scenes.SceneStore(path)
+    store.save('evening', {'desk': RED})
+    store.delete('evening')
+    with pytest.raises(KeyError):
+        store.delete('evening')
+    store.close()
+    store = scenes.SceneStore(path)
+    assert 'evening' not in store
+    assert store.last() == {}
+    store.close()
+
+def test_a_record_cut_short_is_dropped_on_open(path):
+    store = scenes.SceneStore(path)
+    store.save('evening', {'desk': RED})
+    store.close()
+    whole = os.path.getsize(path)
+    # A crash partway through appending the next scene leaves half a record at the end
+    store = scenes.SceneStore(path)
+    store.save('morning', {'desk': pattern_state()})
+    store.close()
+    with open(path, 'r+b') as f:
+        f.truncate(whole + scenes.HEADER.size + 3)
+
+    store = scenes.SceneStore(path)
+    assert os.path.getsize(path) == whole
+    assert store.list() == {'evening': []}
+    assert store.load('evening') == {'desk': RED}
+    # New records go where the partial one was
+    store.save('morning', {'desk': RED})
+    store.close()
+    store = scenes.SceneStore(path)
+    assert set(store.list()) == {'evening', 'morning'}
+    store.close()
+
+def test_a_file_that_is_not_a_scene_file_is_refused(path):
+    with open(path, 'wb') as f:
+        f.write(b'not scenes')
+    with pytest.raises(scenes.SceneError):
+        scenes.SceneStore(path)
+
+def test_tags_cannot_contain_commas(path):
+    store = scenes.SceneStore(path)
+    with pytest.raises(scenes.SceneError):
+        store.save('evening', {'desk': RED}, ['warm,dim'])
+    store.close()
+
+def test_replaced_records_count_in_full_towards_compaction(path):
+    store = scenes.SceneStore(path)
+    store.save('evening', {'desk': RED})
+    first = os.path.getsize(path) - len(scenes.MAGIC)
+    store.save('evening', {'desk': RED})
+    # The whole first scene record and the LAST record after it are dead
+    assert store._dead == first
+    store.close()
+
+def test_compaction_keeps_only_live_records(path, monkeypatch):
+    monkeypatch.setattr(scenes, 'COMPACT_BYTES', 0)
+    store = scenes.SceneStore(path)
+    for _ in range(5):
+        store.save('evening', {'desk': RED}, ['warm'])
+    store.save('morning', {'desk': pattern_state()})
+    store.close()
+
+    fresh = str(path) + '.fresh'
+    store = scenes.SceneStore(fresh)
+    store.save('evening', {'desk': RED}, ['warm'])
+    store.save('morning', {'desk': pattern_state()})
+    store.close()
+    assert os.path.getsize(path) <= os.path.getsize(fresh)
+
+    store = scenes.SceneStore(path)
+    assert store.list() == {'evening': ['warm'], 'morning': []}
+    assert store.last() == {'desk': 'morning'}
+    store.close()
+
+def test_a_pattern_for_another_strip_length_is_compiled_again():
+    state = pattern_state(10)
+    assert 'compiled_pattern' in scenes.payload('desk', state, 10)
+    assert 'compiled_pattern' not in scenes.payload('desk', state, 20)
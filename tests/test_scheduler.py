@@ -0,0 +1,80 @@
+from datetime import date, datetime, timezone
+import pytest
+from scheduler import Cron, ScheduleError, Scheduler, next_run, sun_time
+
+def at(*args):
+    return datetime(*args).timestamp()
+
+def test_fields_are_parsed_into_the_values_they_match():
+    cron = Cron('*/15 9-17 1,15 * 1-5')
+    assert cron.minutes == {0, 15, 30, 45}
+    assert cron.hours == set(range(9, 18))
+    assert cron.days == {1, 15}
+    assert cron.months == set(range(1, 13))
+    assert cron.weekdays == {1, 2, 3, 4, 5}
+
+def test_a_step_from_a_single_value_runs_to_the_end_of_the_range():
+    assert Cron('5/20 * * * *').minutes == {5, 25, 45}
+
+def test_seven_is_sunday_too():
+    assert Cron('0 0 * * 7').weekdays == {0}
+
+def test_macros_expand():
+    assert Cron('@hourly').minutes == {0}
+    assert Cron('@daily').hours == {0}
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '* 24 * * *', '0 0 0 * *', '0 0 * 13 *', '0 0 * * 8', '30-10 * * * *', 'a * * * *', '*/0 * * * *'])
+def test_bad_expressions_are_refused(expression):
+    with pytest.raises(ScheduleError):
+        Cron(expression)
+
+def test_next_time_is_the_next_matching_minute():
+    cron = Cron('30 7 * * *')
+    assert cron.next_time(at(2026, 3, 2, 6, 0)) == at(2026, 3, 2, 7, 30)
+    assert cron.next_time(at(2026, 3, 2, 7, 30)) == at(2026, 3, 3, 7, 30)
+
+def test_next_time_rolls_over_months_and_years():
+    cron = Cron('0 0 1 1 *')
+    assert cron.next_time(at(2026, 6, 15, 12, 0)) == at(2027, 1, 1, 0, 0)
+
+def test_weekdays_are_counted_from_sunday():
+    # 2 March 2026 is a Monday
+    assert Cron('0 12 * * 0').next_time(at(2026, 3, 2, 0, 0)) == at(2026, 3, 8, 12, 0)
+
+def test_day_of_month_or_day_of_week_matches_when_both_are_set():
+    # The 13th, or any Friday: Friday 6 March comes before the 13th
+    assert Cron('0 0 13 * 5').next_time(at(2026, 3, 2, 0, 0)) == at(2026, 3, 6, 0, 0)
+
+def test_a_date_that_never_comes_never_runs():
+    assert Cron('0 0 31 2 *').next_time(at(2026, 1, 1, 0, 0)) is None
+
+def test_sun_times_are_near_the_equinox_times():
+    # Around the equinox the sun rises near 06:00 and sets near 18:00 local solar time on the equator at 0 longitude
+    sunrise = sun_time(date(2026, 3, 20), 0.0, 0.0, 'sunrise')
+    sunset = sun_time(date(2026, 3, 20), 0.0, 0.0, 'sunset')
+    midnight = datetime(2026, 3, 20, tzinfo=timezone.utc).timestamp()
+    assert abs(sunrise - midnight - 6 * 3600) < 15 * 60
+    assert abs(sunset - midnight - 18 * 3600) < 15 * 60
+
+def test_the_sun_does_not_rise_in_the_polar_night():
+    assert sun_time(date(2026, 12, 21), 80.0, 0.0, 'sunrise') is None
+
+def test_sun_jobs_apply_their_offset_and_need_a_location():
+    job = {'sun': 'sunset', 'offset': -30}
+    after = at(2026, 3, 20, 0, 0)
+    due = next_run(job, after, (51.5, 0.0))
+    assert due > after
+    assert due == next_run({'sun': 'sunset'}, after, (51.5, 0.0)) - 30 * 60
+    with pytest.raises(ScheduleError):
+        next_run(job, after)
+
+def test_jobs_are_kept_in_the_schedule_file(tmp_path):
+    path = str(tmp_path / 'schedule.json')
+    schedule = Scheduler(path, lambda job: None)
+    job = schedule.add({'cron': '@daily', 'scene': 'evening'})
+    assert job['id'] == 1 and job['next_run'] is not None
+    schedule = Scheduler(path, lambda job: None)
+    assert [saved['scene'] for saved in schedule.list()] == ['evening']
+    assert schedule.add({'cron': '@hourly', 'scene': 'morning'})['id'] == 2
+    schedule.remove(1)
+    assert [saved['id'] for saved in Scheduler(path, lambda job: None).list()] == [2]
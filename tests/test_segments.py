@@ -0,0 +1,102 @@
+import time
+import pytest
+from LEDStrip import LEDStrip
+from RenderEngine import RenderEngine
+from RenderWorker import RenderWorker
+from segments import SegmentError, check_spans, create_virtual_strip
+
+RED, BLUE = 0xff0000, 0x0000ff
+
+def span(start, end, **kwargs):
+    return dict(strip='desk', start=start, end=end, **kwargs)
+
+@pytest.fixture
+def desk():
+    strip = LEDStrip(6, backend='simulated')
+    strip.set_color('#ff0000')
+    yield strip
+    strip.close()
+
+@pytest.mark.parametrize('spans, message', [
+    ([dict(strip='shelf', start=0, end=1)], "Strip shelf doesn't exist!"),
+    ([span(3, 2)], 'Pixels 3-2 are not on strip desk!'),
+    ([span(4, 6)], 'Pixels 4-6 are not on strip desk!'),
+    ([span(0, 1), span(5, 6)], 'Pixels 5-6 are not on strip desk!')
+])
+def test_spans_must_fit_on_their_strips(desk, spans, message):
+    with pytest.raises(SegmentError) as error:
+        check_spans(spans, {'desk': desk})
+    assert error.value.message == message
+    assert desk.layers == []
+
+def test_a_segment_draws_over_its_range(desk):
+    segment = create_virtual_strip([span(1, 2)], {'desk': desk})
+    segment.set_color('#0000ff')
+    assert list(desk.pixels()) == [RED, BLUE, BLUE, RED, RED, RED]
+    assert list(desk.backend.last_frame()) == [RED, BLUE, BLUE, RED, RED, RED]
+    segment.close()
+
+def test_a_virtual_strip_runs_across_its_spans_in_order(desk):
+    segment = create_virtual_strip([span(4, 5), span(0, 0)], {'desk': desk})
+    segment.set_pattern([{'color': '#0000ff', 'position': 2}])
+    assert list(desk.pixels()) == [BLUE, RED, RED, RED, 0, 0]
+    segment.close()
+
+def test_later_segments_draw_over_earlier_ones_where_they_overlap(desk):
+    under = create_virtual_strip([span(0, 3)], {'desk': desk})
+    over = create_virtual_strip([span(2, 5, blend='add')], {'desk': desk})
+    under.set_color('#0000ff')
+    over.set_color('#ff0000')
+    assert list(desk.pixels()) == [BLUE, BLUE, RED | BLUE, RED | BLUE, RED, RED]
+    over.close()
+    under.close()
+
+def test_removing_a_segment_shows_the_strip_under_it_again(desk):
+    under = create_virtual_strip([span(0, 3)], {'desk': desk})
+    over = create_virtual_strip([span(2, 5)], {'desk': desk})
+    under.set_color('#0000ff')
+    over.set_color('#000000')
+    over.close()
+    assert list(desk.pixels()) == [BLUE, BLUE, BLUE, BLUE, RED, RED]
+    under.close()
+    assert list(desk.pixels()) == [RED] * 6
+    assert desk.compositor is None
+
+def test_nothing_is_composited_until_something_changes(desk):
+    segment = create_virtual_strip([span(0, 1)], {'desk': desk})
+    segment.set_color('#0000ff')
+    desk.pixels()
+    skipped = desk.metrics.skipped_shows
+    time.sleep(0.05)
+    desk.composite_layers()
+    assert desk.metrics.skipped_shows == skipped
+    desk.set_brightness(255)
+    desk.composite_layers()
+    assert desk.metrics.skipped_shows == skipped + 1
+    segment.close()
+
+def test_the_render_engine_composites_segments_on_its_tick():
+    engine = RenderEngine()
+    engine.start()
+    desk = LEDStrip(6, engine=engine, backend='simulated')
+    segment = create_virtual_strip([span(0, 2)], {'desk': desk}, engine)
+    assert desk.compositor is None
+    segment.blink(['#0000ff'], 10)
+    time.sleep(0.05)
+    assert list(desk.backend.last_frame()) == [BLUE] * 3 + [0] * 3
+    segment.close()
+    desk.close()
+    engine.stop()
+
+def test_a_worker_publishes_the_strips_a_segment_is_drawn_over():
+    worker = RenderWorker()
+    worker.start()
+    try:
+        desk = worker.add_strip('desk', 6, 18, 800000, 10, False, 255, 0, backend='simulated')
+        segment = worker.add_virtual_strip('segment', [span(0, 1)])
+        segment.set_color('#0000ff')
+        assert list(desk.pixels()) == [BLUE, BLUE, 0, 0, 0, 0]
+        worker.remove_strip(segment)
+        assert list(desk.pixels()) == [0] * 6
+    finally:
+        worker.stop()
@@ -0,0 +1,124 @@
+import time
+import commands
+from LEDStrip import LEDStrip
+from RenderWorker import RenderWorker
+from StreamServer import DDP_FLAG_PUSH, DDP_FLAG_QUERY, DDP_FLAG_TIMECODE, DDP_HEADER, DDP_VERSION_1, StreamServer
+
+def packet(data, stream_id=1, offset=0, sequence=0, flags=DDP_VERSION_1 | DDP_FLAG_PUSH, timecode=None):
+    header = DDP_HEADER.pack(flags, sequence, 0x0B, stream_id, offset, len(data))
+    if timecode is not None:
+        header += timecode.to_bytes(4, 'big')
+    return header + bytes(data)
+
+"""
+A stream server with one strip registered on id 1. Unless told not to, the strip is already streaming
+"""
+def make_server(num_leds=4, streaming=True):
+    server = StreamServer()
+    strip = LEDStrip(num_leds, backend='simulated')
+    command_queue = commands.CommandQueue('desk', strip)
+    server.register(1, strip, command_queue)
+    if streaming:
+        command_queue.submit('stream', {}).wait(5)
+    return server, strip, command_queue
+
+def test_a_pushed_packet_is_shown():
+    server, strip, _ = make_server()
+    server.handle_packet(packet([255, 0, 0, 0, 255, 0]), time.monotonic())
+    assert list(strip.backend.last_frame()) == [0xff0000, 0x00ff00, 0, 0]
+    assert server.stats()[1]['frames'] == 1
+
+def test_the_data_offset_is_in_bytes():
+    server, strip, _ = make_server()
+    server.handle_packet(packet([0, 0, 255], offset=6), time.monotonic())
+    assert list(strip.pixels()) == [0, 0, 0xff, 0]
+
+def test_a_frame_split_across_packets_is_shown_on_the_push():
+    server, strip, _ = make_server()
+    server.handle_packet(packet([1, 2, 3, 4, 5, 6], flags=DDP_VERSION_1), time.monotonic())
+    assert strip.backend.last_frame() is None
+    server.handle_packet(packet([7, 8, 9, 10, 11, 12], offset=6), time.monotonic())
+    assert list(strip.backend.last_frame()) == [0x010203, 0x040506, 0x070809, 0x0a0b0c]
+    assert server.stats()[1]['packets'] == 2
+    assert server.stats()[1]['frames'] == 1
+
+def test_a_timecode_is_skipped():
+    server, strip, _ = make_server()
+    server.handle_packet(packet([9, 9, 9], flags=DDP_VERSION_1 | DDP_FLAG_PUSH | DDP_FLAG_TIMECODE, timecode=12345), time.monotonic())
+    assert strip.pixels()[0] == 0x090909
+
+def test_data_past_the_strip_is_dropped():
+    server, strip, _ = make_server(2)
+    server.handle_packet(packet([1, 1, 1] * 5), time.monotonic())
+    assert list(strip.pixels()) == [0x010101, 0x010101]
+
+def test_packets_that_are_not_frames_for_a_strip_are_ignored():
+    server, strip, _ = make_server()
+    received = time.monotonic()
+    server.handle_packet(packet([255, 255, 255])[:DDP_HEADER.size - 1], received)
+    server.handle_packet(packet([255, 255, 255], flags=0x80 | DDP_FLAG_PUSH), received)
+    server.handle_packet(packet([255, 255, 255], flags=DDP_VERSION_1 | DDP_FLAG_QUERY), received)
+    server.handle_packet(packet([255, 255, 255], stream_id=2), received)
+    assert strip.backend.last_frame() is None
+    assert server.stats()[1]['packets'] == 0
+
+def test_a_frame_whose_push_never_comes_is_dropped():
+    server, strip, _ = make_server()
+    server.handle_packet(packet([1, 1, 1, 1, 1, 1], flags=DDP_VERSION_1), time.monotonic())
+    # The next frame starts over from the first pixel before the last one was pushed
+    server.handle_packet(packet([2, 2, 2, 2, 2, 2], flags=DDP_VERSION_1), time.monotonic())
+    server.handle_packet(packet([3, 3, 3, 3, 3, 3], offset=6), time.monotonic())
+    assert server.stats()[1]['frames'] == 1
+    assert server.stats()[1]['dropped_frames'] == 1
+    assert list(strip.backend.last_frame()) == [0x020202, 0x020202, 0x030303, 0x030303]
+
+def test_the_stream_takes_the_strip_over_through_its_queue():
+    server, strip, command_queue = make_server(streaming=False)
+    strip.blink(['#ff0000', '#0000ff'], 10)
+    server.handle_packet(packet([9, 9, 9]), time.monotonic())
+    # Nothing is written until the queued stream command has stopped the animation
+    assert server.stats()[1]['dropped_frames'] == 1
+    assert command_queue.drain(5)
+    assert strip.streaming and strip.get_animation() is None
+    server.handle_packet(packet([9, 9, 9]), time.monotonic())
+    assert strip.pixels()[0] == 0x090909
+    assert server.stats()[1]['frames'] == 1
+
+def test_a_command_takes_the_strip_back_from_the_stream():
+    server, strip, command_queue = make_server()
+    command_queue.submit('setcolor', {'color': '#00ff00', 'brightness': 255}).wait(5)
+    assert not strip.streaming
+    server.handle_packet(packet([9, 9, 9]), time.monotonic())
+    assert list(strip.pixels()) == [0x00ff00] * 4
+    command_queue.drain(5)
+    assert strip.streaming
+
+def test_free_ids_start_at_one_and_fill_gaps():
+    server = StreamServer()
+    assert server.free_id() == 1
+    server.register(1, None, None)
+    server.register(2, None, None)
+    server.unregister(1)
+    assert server.free_id() == 1
+    assert list(server.stats()) == [2]
+
+def test_a_worker_strip_is_streamed_through_shared_memory():
+    worker = RenderWorker()
+    worker.start()
+    try:
+        strip = worker.add_strip('desk', 4, 18, 800000, 10, False, 255, 0, backend='simulated')
+        server = StreamServer()
+        command_queue = commands.CommandQueue('desk', strip)
+        server.register(1, strip, command_queue)
+        command_queue.submit('stream', {}).wait(5)
+        server.handle_packet(packet([1, 2, 3, 4, 5, 6]), time.monotonic())
+        # Only the changed pixel is sent for the next frame
+        server.handle_packet(packet([7, 8, 9], offset=3), time.monotonic())
+        deadline = time.monotonic() + 5
+        while list(strip.pixels()) != [0x010203, 0x070809, 0, 0] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert list(strip.pixels()) == [0x010203, 0x070809, 0, 0]
+        assert server.stats()[1]['frames'] == 2
+        command_queue.stop()
+    finally:
+        worker.stop()
@@ -0,0 +1,100 @@
+import time
+from Animation import Animation
+from FrameBuffer import FrameBuffer
+from LEDStrip import LEDStrip
+from timeline import Crossfade, compile_timeline
+
+RED, BLUE = 0xff0000, 0x0000ff
+
+def keyframe(color, duration=0, hold=0, **kwargs):
+    return dict(color=color, duration=duration, hold=hold, **kwargs)
+
+def frames(timeline, numbers, num_leds=2):
+    buffer = FrameBuffer(num_leds)
+    drawn = []
+    for number in numbers:
+        timeline.render(number, buffer)
+        drawn.append(buffer.pixels[0])
+    return drawn
+
+def test_keyframes_are_held_and_then_eased_into_the_next():
+    timeline = compile_timeline([keyframe('#ff0000', duration=40, hold=20), keyframe('#0000ff', hold=20)], 2, 10, loop=False)
+    held_red, held_red_too, first, middle, _, last = frames(timeline, range(6))
+    assert held_red == held_red_too == RED
+    assert first == 0xbf003f
+    assert middle == 0x7f007f
+    assert last == BLUE
+
+def test_easing_shapes_the_transition():
+    timeline = compile_timeline([keyframe('#000000', duration=40, easing='step'), keyframe('#ffffff')], 2, 10, loop=False)
+    assert frames(timeline, range(4)) == [0, 0, 0, 0xffffff]
+
+def test_a_timeline_that_plays_once_stays_on_its_last_keyframe():
+    timeline = compile_timeline([keyframe('#ff0000', duration=20), keyframe('#0000ff', duration=20)], 2, 10, loop=False)
+    assert timeline.period is None
+    assert frames(timeline, [2, 50, 1000]) == [BLUE] * 3
+
+def test_a_looping_timeline_eases_back_into_its_first_keyframe():
+    timeline = compile_timeline([keyframe('#ff0000', duration=20, hold=10), keyframe('#0000ff', duration=20, hold=10)], 2, 10)
+    assert timeline.period == 6
+    assert frames(timeline, range(6)) == frames(timeline, range(6, 12))
+    assert frames(timeline, [3, 5]) == [BLUE, RED]
+
+def test_a_looping_timeline_that_takes_no_time_shows_its_first_keyframe():
+    timeline = compile_timeline([keyframe('#ff0000'), keyframe('#0000ff')], 2, 10)
+    assert timeline.period == 1
+    assert frames(timeline, range(3)) == [RED] * 3
+
+def test_keyframes_can_be_patterns_at_their_own_brightness():
+    timeline = compile_timeline([{'pattern': [{'color': '#ffffff', 'start': 1, 'end': 1}], 'brightness': 0}], 2, 10)
+    buffer = FrameBuffer(2)
+    timeline.render(0, buffer)
+    assert list(buffer.pixels) == [0, 0]
+
+def solid(name, color):
+    return Animation(name, lambda frame, buffer: buffer.fill(color), 10)
+
+def test_a_crossfade_blends_from_what_is_showing_into_the_new_animation():
+    buffer = FrameBuffer(2)
+    buffer.fill(RED)
+    crossfade = Crossfade(solid('red', RED), 0, solid('blue', BLUE), 40)
+    crossfade.begin(buffer)
+    drawn = []
+    for frame in range(5):
+        crossfade.draw(frame, buffer)
+        drawn.append(buffer.pixels[0])
+    assert drawn[0] not in (RED, BLUE)
+    assert drawn[3:] == [BLUE, BLUE]
+    assert crossfade.name == 'blue'
+
+def test_a_crossfade_pauses_and_resumes_with_the_strip():
+    strip = LEDStrip(2, backend='simulated')
+    strip.blink(['#ff0000'], 10)
+    strip.schedule_crossfade(50)
+    strip.timeline([keyframe('#0000ff')], 10)
+    assert isinstance(strip.get_animation(), Crossfade)
+    strip.pause()
+    assert strip.paused()
+    # A frame being drawn as it paused may still land
+    time.sleep(0.02)
+    paused_at = list(strip.pixels())
+    time.sleep(0.1)
+    assert list(strip.pixels()) == paused_at
+    strip.resume()
+    time.sleep(0.15)
+    assert list(strip.pixels()) == [BLUE, BLUE]
+    strip.close()
+
+def test_a_paused_strip_cuts_straight_to_the_next_animation():
+    strip = LEDStrip(2, backend='simulated')
+    strip.blink(['#ff0000'], 10)
+    strip.pause()
+    strip.schedule_crossfade(50)
+    strip.timeline([keyframe('#0000ff')], 10)
+    assert not isinstance(strip.get_animation(), Crossfade)
+    assert not strip.paused()
+    time.sleep(0.05)
+    assert list(strip.pixels()) == [BLUE, BLUE]
+    # The crossfade isn't saved up for a later animation
+    assert strip.crossfade is None
+    strip.close()
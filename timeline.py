@@ -0,0 +1,154 @@
+"""
+Declarative animations: a timeline of keyframes, each a color or pattern at a brightness, held for a while and then
+eased into the next. Keyframe frames are built once when a timeline is compiled, and every frame in between is a blend
+of two of them, so drawing never goes back to the JSON. A looping timeline is periodic, so Animation records its first
+cycle into the frame cache and later cycles are replayed.
+
+Also holds Crossfade, which blends from one running animation into the next instead of cutting between them.
+"""
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from colors import brightness_table, translate_color
+from FrameBuffer import FrameBuffer
+from patterns import pattern_key, compile_pattern
+
+# Use the vectorized blend when NumPy is installed, and the pure-Python one otherwise
+try:
+    import np_animations as animations
+except ImportError:
+    import animations
+
+"""
+Easing curves, taking how far through a transition it is (0-1) to how far the colors should have moved
+"""
+EASINGS = {
+    'linear': lambda t: t,
+    'ease_in': lambda t: t * t,
+    'ease_out': lambda t: t * (2 - t),
+    'ease_in_out': lambda t: 2 * t * t if t < 0.5 else 1 - 2 * (1 - t) * (1 - t),
+    'step': lambda t: 1.0 if t >= 1 else 0.0
+}
+
+class Timeline():
+    def __init__(self, frames, segments, period, key):
+        # The frame of every keyframe, at its brightness
+        self.frames = frames
+        # (first frame, hold frames, transition frames, keyframe index, next keyframe index, easing) for each keyframe
+        self.segments = segments
+        self.starts = [segment[0] for segment in segments]
+        # Frames in one pass of the timeline, or None when it plays once and then stays on its last keyframe
+        self.period = period
+        self.key = key
+        self.length = segments[-1][0] + segments[-1][1] + segments[-1][2]
+
+    """
+    Draw frame number `frame` of the timeline into a FrameBuffer
+    """
+    def render(self, frame, buffer):
+        if self.period is not None:
+            frame %= self.period
+        elif frame >= self.length:
+            buffer.load(self.frames[self.segments[-1][3]])
+            return
+
+        start, hold, transition, current, following, easing = self.segments[bisect_right(self.starts, frame) - 1]
+        step = frame - start - hold
+        if step < 0 or transition == 0:
+            buffer.load(self.frames[current])
+            return
+        weight = int(round(EASINGS[easing]((step + 1) / float(transition)) * 256))
+        animations.blend(self.frames[current], self.frames[following], weight, buffer)
+
+"""
+A hashable copy of a list of keyframe payloads, used as its cache key
+"""
+def timeline_key(keyframes):
+    key = []
+    for keyframe in keyframes:
+        content = ('color', keyframe['color']) if 'color' in keyframe else ('pattern', pattern_key(keyframe['pattern']))
+        key.append((content, keyframe.get('brightness', 255), keyframe.get('duration', 0), keyframe.get('hold', 0), keyframe.get('easing', 'linear')))
+    return tuple(key)
+
+"""
+Compile a list of keyframe payloads for a strip of num_leds pixels drawing a frame every interval milliseconds.
+Each keyframe is held for `hold` milliseconds and then eased into the next over `duration` milliseconds. Looping
+timelines ease from the last keyframe back into the first
+"""
+def compile_timeline(keyframes, num_leds, interval, loop=True):
+    return _compile(timeline_key(keyframes), num_leds, interval, loop)
+
+@lru_cache(maxsize=16)
+def _compile(key, num_leds, interval, loop):
+    frames = []
+    segments = []
+    start = 0
+    for index, (content, brightness, duration, hold, easing) in enumerate(key):
+        frames.append(_keyframe_frame(content, brightness, num_leds))
+        hold, transition = _to_frames(hold, interval), _to_frames(duration, interval)
+        following = index + 1
+        if following == len(key):
+            if not loop:
+                transition = 0
+            following = 0
+        segments.append((start, hold, transition, index, following, easing))
+        start += hold + transition
+
+    # A looping timeline that takes no time at all is just its first keyframe. Every keyframe would start on frame 0,
+    # and the lookup in render takes the last keyframe starting on a frame, so keep only the first
+    if loop and start == 0:
+        segments = [(0, 1, 0, 0, 0, segments[0][5])]
+        start = 1
+    period = start if loop else None
+    return Timeline(frames, segments, period, ('timeline', key, interval, loop))
+
+def _keyframe_frame(content, brightness, num_leds):
+    buffer = FrameBuffer(num_leds)
+    kind, value = content
+    if kind == 'color':
+        buffer.fill(translate_color(value))
+    else:
+        compile_pattern([{'color': color, 'start': first, 'end': last} for color, first, last in value], num_leds).apply(buffer)
+    frame = array('I')
+    frame.frombytes(buffer.pixels.tobytes().translate(brightness_table(brightness)))
+    return frame
+
+def _to_frames(milliseconds, interval):
+    if interval <= 0:
+        return 0
+    return int(round(milliseconds / float(interval)))
+
+"""
+Blends from the frames of a running animation into a new one over duration milliseconds, then carries on drawing the
+new animation. Both keep moving during the blend: the old one carries on from the frame it had reached
+"""
+class Crossfade():
+    def __init__(self, previous, previous_frame, animation, duration):
+        self.previous = previous
+        self.previous_frame = previous_frame
+        self.animation = animation
+        self.duration = duration
+
+        # Stands in for the new animation everywhere else
+        self.name = animation.name
+        self.params = animation.params
+        self.interval = animation.interval
+        self.period = None
+        self.blendable = True
+
+    def begin(self, buffer):
+        self.frames = max(_to_frames(self.duration, self.interval), 1)
+        # The blend starts from whatever is showing now
+        self.start = FrameBuffer(len(buffer))
+        self.start.load(buffer.pixels)
+        self.end = FrameBuffer(len(buffer))
+        self.animation.begin(self.end)
+
+    def draw(self, frame, buffer):
+        if frame >= self.frames:
+            self.animation.draw(frame, buffer)
+            return
+        if self.previous.interval > 0:
+            self.previous.draw(self.previous_frame + int(frame * self.interval / float(self.previous.interval)), self.start)
+        self.animation.draw(frame, self.end)
+        animations.blend(self.start.pixels, self.end.pixels, (frame + 1) * 256 // self.frames, buffer)